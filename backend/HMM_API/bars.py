@@ -0,0 +1,237 @@
+# Shared bar store for HMM_API workers.
+#
+# Each (symbol, interval) history lives in one .npy file under HMM_BAR_DIR
+# (tmpfs at /dev/shm by default) holding a float64 array of shape (6, n + 1):
+#
+#   column 0      header: [format version, requested start, fetched at, n, 0, 0]
+#   columns 1..n  bars, one row per field: ts, Open, High, Low, Close, Volume
+#
+# Workers np.load() it with mmap_mode="r", so every worker reads the same
+# physical pages as zero-copy NumPy views and memory per container stays flat
+# as workers are added. Writers replace the file atomically (write + rename);
+# readers holding the old mapping keep a consistent snapshot. A per-key file
+# lock ensures only one process downloads a given history at a time, and the
+# refresher process (refresher.py) keeps hot symbols current.
+#
+# Request handlers pass allow_stale=True: when a stored history has gone
+# stale and the source cannot refresh it (an error, a deadline overrun, or
+# an open circuit breaker, see sources.py), or another worker is already
+# downloading it, they get the stored bars back with stale=True instead of
+# an error or a wait, and a background refresh is attempted.
+
+import fcntl
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+BAR_DIR = os.environ.get("HMM_BAR_DIR") or ("/dev/shm/hmm_bars" if os.path.isdir("/dev/shm") else "/tmp/hmm_bars")
+HOT_SYMBOLS = [s.strip().upper() for s in os.environ.get("HMM_HOT_SYMBOLS", "SPY,QQQ,DIA,IWM").split(",") if s.strip()]
+HOT_INTERVALS = [i.strip() for i in os.environ.get("HMM_HOT_INTERVALS", "1d").split(",") if i.strip()]
+HOT_START = os.environ.get("HMM_HOT_START", "2015-01-01")
+MAX_AGE = float(os.environ.get("HMM_BAR_MAX_AGE", "900"))
+
+INTERVAL_SECONDS = {
+    "1m": 60, "2m": 120, "5m": 300, "15m": 900, "30m": 1800, "60m": 3600, "90m": 5400,
+    "1h": 3600, "1d": 86400, "5d": 5 * 86400, "1wk": 7 * 86400, "1mo": 30 * 86400, "3mo": 90 * 86400,
+}
+
+# How far back Yahoo serves each intraday interval, in days
+INTRADAY_LOOKBACK = {"1m": 7, "2m": 60, "5m": 60, "15m": 60, "30m": 60, "60m": 730, "90m": 60, "1h": 730}
+
+# pandas rules for building coarser bars from finer ones. Intraday bins are
+# offset by 30 minutes so they line up with Yahoo's bars from the 9:30 open.
+RESAMPLE_RULES = {
+    "5m": "5min", "15m": "15min", "30m": "30min", "60m": "60min", "1h": "60min", "90m": "90min",
+    "1d": "1D", "1wk": "W-FRI", "1mo": "MS",
+}
+OHLCV_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+Bars = namedtuple("Bars", ["ts", "open", "high", "low", "close", "volume", "requested_start", "fetched_at", "stale"],
+                  defaults=[False])
+
+_mapped = {}  # path -> (inode, mtime_ns, array); avoids re-mapping an unchanged file
+_revalidating = set()  # (symbol, interval) with a background refresh in flight in this process
+_revalidating_lock = threading.Lock()
+
+
+def bar_path(symbol: str, interval: str) -> str:
+    return os.path.join(BAR_DIR, f"{symbol.upper()}_{interval}.npy")
+
+
+def max_age(interval: str) -> float:
+    # Intraday data goes stale after one bar; daily and slower after MAX_AGE
+    return min(MAX_AGE, INTERVAL_SECONDS.get(interval, MAX_AGE))
+
+
+def read_bars(symbol: str, interval: str) -> Optional[Bars]:
+    path = bar_path(symbol, interval)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    cached = _mapped.get(path)
+    if cached and cached[0] == st.st_ino and cached[1] == st.st_mtime_ns:
+        arr = cached[2]
+    else:
+        arr = np.load(path, mmap_mode="r")
+        _mapped[path] = (st.st_ino, st.st_mtime_ns, arr)
+    header = arr[:, 0]
+    if int(header[0]) != FORMAT_VERSION:
+        return None
+    body = arr[:, 1:]
+    return Bars(body[0], body[1], body[2], body[3], body[4], body[5], float(header[1]), float(header[2]))
+
+
+def write_bars(symbol: str, interval: str, df, requested_start: float):
+    import pandas as pd
+
+    os.makedirs(BAR_DIR, exist_ok=True)
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        # Keep exchange wall-clock time, as the plots have always shown it
+        index = index.tz_localize(None)
+    n = len(df)
+    arr = np.zeros((6, n + 1), dtype=np.float64)
+    arr[:, 0] = [FORMAT_VERSION, requested_start, time.time(), n, 0, 0]
+    arr[0, 1:] = ((index - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)).to_numpy()
+    for row, field in enumerate(FIELDS, start=1):
+        arr[row, 1:] = df[field].to_numpy(dtype=np.float64) if field in df else np.nan
+
+    path = bar_path(symbol, interval)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def symbol_lock(symbol: str, interval: str, wait: bool = True):
+    # Yields whether the lock is held; with wait=False it is not waited for
+    os.makedirs(BAR_DIR, exist_ok=True)
+    with open(bar_path(symbol, interval) + ".lock", "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def usable(bars: Optional[Bars], start_ts: float, interval: str, fresh_after: Optional[float] = None) -> bool:
+    # fresh_after additionally requires a fetch made after that time (e.g. a bar close)
+    return (bars is not None and bars.requested_start <= start_ts
+            and time.time() - bars.fetched_at <= max_age(interval)
+            and (fresh_after is None or bars.fetched_at >= fresh_after))
+
+
+def get_bars(symbol: str, interval: str, start_ts: float,
+             fetch: Callable[[str, str, str], "object"], fresh_after: Optional[float] = None,
+             allow_stale: bool = False) -> Optional[Bars]:
+    bars = read_bars(symbol, interval)
+    if usable(bars, start_ts, interval, fresh_after):
+        return bars
+    # Bars that cover the request, to fall back on when they cannot be refreshed
+    stale = bars if allow_stale and bars is not None and bars.requested_start <= start_ts else None
+    with symbol_lock(symbol, interval, wait=stale is None) as locked:
+        if not locked:
+            # Another worker is downloading it; its refresh is the revalidation
+            return stale._replace(stale=True)
+        # Another worker may have fetched it while this one waited for the lock
+        bars = read_bars(symbol, interval)
+        if usable(bars, start_ts, interval, fresh_after):
+            return bars
+        if bars is not None:
+            start_ts = min(start_ts, bars.requested_start)
+        try:
+            df = fetch(symbol, interval, format_date(start_ts))
+        except Exception as e:
+            if stale is None:
+                raise
+            print(f"serving stale {symbol} {interval}: {e}")
+            revalidate(symbol, interval, start_ts, fetch, getattr(e, "retry_after", 5.0))
+            return stale._replace(stale=True)
+        if df is None or df.empty:
+            return None
+        write_bars(symbol, interval, df, start_ts)
+    return read_bars(symbol, interval)
+
+
+def revalidate(symbol: str, interval: str, start_ts: float, fetch, delay: float = 0.0):
+    # One background refresh per key and process, after the breaker's retry delay
+    key = (symbol.upper(), interval)
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def run():
+        try:
+            time.sleep(delay)
+            get_bars(symbol, interval, start_ts, fetch)
+        except Exception as e:
+            print(f"background refresh {symbol} {interval} failed: {e}")
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(key)
+
+    threading.Thread(target=run, name=f"revalidate-{symbol}-{interval}", daemon=True).start()
+
+
+def slice_from(bars: Bars, start_ts: float) -> Bars:
+    i = int(np.searchsorted(bars.ts, start_ts, side="left"))
+    return bars._replace(**{f: getattr(bars, f)[i:] for f in ["ts", "open", "high", "low", "close", "volume"]})
+
+
+def to_frame(bars: Bars):
+    # The regime pipeline mutates its frame, so this is the one place data is copied
+    import pandas as pd
+
+    index = pd.to_datetime(np.asarray(bars.ts, dtype=np.int64), unit="s")
+    data = {"Close": bars.close, "High": bars.high, "Low": bars.low, "Open": bars.open, "Volume": bars.volume}
+    return pd.DataFrame({k: np.array(v) for k, v in data.items()}, index=index)
+
+
+def resample_frame(df, interval: str):
+    # OHLCV bars at a coarser interval, in one vectorised pass over a to_frame() frame
+    rule = RESAMPLE_RULES[interval]
+    offset = "30min" if INTERVAL_SECONDS[interval] < 86400 else None
+    out = df.resample(rule, offset=offset).agg(OHLCV_AGG)
+    # Bins with no trading (nights, weekends, holidays) come out empty
+    return out.dropna(subset=["Close"])
+
+
+def download(symbol: str, interval: str, start: str):
+    import pandas as pd
+    import yfinance as yf
+
+    if interval in INTRADAY_LOOKBACK:
+        # Yahoo rejects intraday requests that start beyond its history limit
+        earliest = format_date(time.time() - (INTRADAY_LOOKBACK[interval] - 1) * 86400)
+        start = max(start, earliest)
+    df = yf.download(symbol, interval = interval, start=start) # incl - excl
+    if df is None:
+        print("df returned None")
+        return pd.DataFrame()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.droplevel(1)
+    return df
+
+
+def format_date(ts: float) -> str:
+    return (datetime(1970, 1, 1) + timedelta(seconds=ts)).strftime('%Y-%m-%d')
+
+
+def start_timestamp(start: str, lookback_days: int = 200) -> float:
+    start_dt = datetime.strptime(start, '%Y-%m-%d') - timedelta(lookback_days)
+    return (start_dt - datetime(1970, 1, 1)).total_seconds()
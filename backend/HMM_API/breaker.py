@@ -0,0 +1,183 @@
+# Circuit breaker for an upstream on the request path (yfinance, see sources.py).
+#
+# Every call through a breaker is timed. A call that raises, overruns its
+# deadline or takes longer than slow_seconds counts as a failure. Once
+# failures make up failure_ratio of the last `window` calls (and there have
+# been at least min_calls), the breaker opens: calls fail fast with
+# BreakerOpen for open_seconds instead of tying up a worker on an upstream
+# that is down or stalled. After that, one probe call at a time is let
+# through (half-open); a success closes the breaker, a failure opens it again
+# for twice as long, up to max_open_seconds.
+#
+# State is per process, but a trip is also written to <shared_dir>/<name>.breaker,
+# so the other workers (and refresher.py) open theirs without first paying
+# for their own failures.
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class BreakerOpen(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, window: int = 20, min_calls: int = 5, failure_ratio: float = 0.5,
+                 slow_seconds: float = 20.0, open_seconds: float = 30.0, max_open_seconds: float = 300.0,
+                 shared_dir: Optional[str] = None):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.shared_path = os.path.join(shared_dir, f"{name}.breaker") if shared_dir else None
+        self.lock = threading.Lock()
+        self.outcomes = deque(maxlen=window)  # True for a failed call
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.backoff = open_seconds
+        self.probing = False
+        self.shared = (None, 0.0)  # (mtime_ns, open_until) of the shared file
+        self.stats = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "trips": 0}
+        self.last_error: Optional[str] = None
+
+    # ------------------------
+    # Shared trip file
+    # ------------------------
+    def _shared_open_until(self) -> float:
+        if self.shared_path is None:
+            return 0.0
+        try:
+            st = os.stat(self.shared_path)
+        except FileNotFoundError:
+            return 0.0
+        if self.shared[0] != st.st_mtime_ns:
+            try:
+                with open(self.shared_path) as f:
+                    self.shared = (st.st_mtime_ns, float(f.read().strip() or 0))
+            except (OSError, ValueError):
+                return 0.0
+        return self.shared[1]
+
+    def _publish(self, open_until: float):
+        if self.shared_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.shared_path), exist_ok=True)
+            tmp = f"{self.shared_path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                f.write(repr(open_until))
+            os.replace(tmp, self.shared_path)
+        except OSError as e:
+            print(f"{self.name} breaker: could not share state: {e}")
+
+    # ------------------------
+    # Calls
+    # ------------------------
+    def _admit(self) -> bool:
+        # True when the call is the half-open probe; raises BreakerOpen to reject
+        now = time.time()
+        with self.lock:
+            if self.state == CLOSED:
+                shared_until = self._shared_open_until()
+                if shared_until > now:
+                    # Tripped by another process
+                    self.state, self.open_until = OPEN, shared_until
+            if self.state == OPEN and now >= self.open_until:
+                self.state = HALF_OPEN
+            if self.state == OPEN or (self.state == HALF_OPEN and self.probing):
+                self.stats["rejected"] += 1
+                raise BreakerOpen(self.name, max(self.open_until - now, 1.0))
+            if self.state == HALF_OPEN:
+                self.probing = True
+                return True
+            return False
+
+    def _record(self, failed: bool, probe: bool, error: Optional[str] = None):
+        now = time.time()
+        with self.lock:
+            self.stats["calls"] += 1
+            if failed:
+                self.stats["failures"] += 1
+                self.last_error = error
+            if probe:
+                self.probing = False
+                if failed:
+                    self.backoff = min(self.backoff * 2, self.max_open_seconds)
+                    self._trip(now)
+                else:
+                    self.state, self.backoff = CLOSED, self.open_seconds
+                    self.outcomes.clear()
+                    self._publish(0.0)
+                return
+            self.outcomes.append(failed)
+            if (self.state == CLOSED and len(self.outcomes) >= self.min_calls
+                    and sum(self.outcomes) >= self.failure_ratio * len(self.outcomes)):
+                self._trip(now)
+
+    def _trip(self, now: float):
+        self.state, self.open_until = OPEN, now + self.backoff
+        self.stats["trips"] += 1
+        self.outcomes.clear()
+        print(f"{self.name} circuit open for {self.backoff:.0f}s: {self.last_error}")
+        self._publish(self.open_until)
+
+    def call(self, fn, *args, deadline: Optional[float] = None, **kwargs):
+        # fn(*args, **kwargs) through the breaker. With a deadline, fn runs in a
+        # daemon thread and the caller stops waiting after `deadline` seconds
+        # (the thread is left to finish on its own).
+        probe = self._admit()
+        started = time.monotonic()
+        try:
+            result = run_with_deadline(fn, args, kwargs, deadline, self.name)
+        except Exception as e:
+            self._record(True, probe, f"{type(e).__name__}: {e}")
+            raise
+        elapsed = time.monotonic() - started
+        slow = elapsed > self.slow_seconds
+        if slow:
+            self.stats["slow"] += 1
+        self._record(slow, probe, f"slow call ({elapsed:.1f}s)" if slow else None)
+        return result
+
+    def retry_after(self) -> float:
+        # Seconds until calls are let through again (0 when closed)
+        with self.lock:
+            return max(self.open_until - time.time(), 0.0) if self.state == OPEN else 0.0
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {"state": self.state, "retry_after": round(max(self.open_until - time.time(), 0.0), 1)
+                    if self.state == OPEN else 0.0,
+                    "window_calls": len(self.outcomes), "window_failures": sum(self.outcomes),
+                    "slow_seconds": self.slow_seconds, "last_error": self.last_error, **self.stats}
+
+
+def run_with_deadline(fn, args, kwargs, deadline: Optional[float], name: str):
+    if deadline is None:
+        return fn(*args, **kwargs)
+    box = {}
+
+    def target():
+        try:
+            box["value"] = fn(*args, **kwargs)
+        except BaseException as e:
+            box["error"] = e
+
+    thread = threading.Thread(target=target, name=f"{name}-call", daemon=True)
+    thread.start()
+    thread.join(deadline)
+    if thread.is_alive():
+        raise TimeoutError(f"{name} did not answer within {deadline:g}s")
+    if "error" in box:
+        raise box["error"]
+    return box["value"]
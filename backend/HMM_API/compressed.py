@@ -0,0 +1,73 @@
+# Content codings for stored response bodies.
+#
+# results.save() writes a compressed copy of each body next to it, once per
+# coding in HMM_COMPRESS_CODINGS, so a popular figure is compressed once by
+# whoever fitted it (usually scheduler.py) and then served as stored bytes.
+# Bodies under HMM_COMPRESS_MIN_BYTES are only stored as they are. brotli
+# and zstandard are optional; codings whose library is missing are skipped.
+
+import gzip
+import os
+from typing import List, Optional
+
+MIN_BYTES = int(os.environ.get("HMM_COMPRESS_MIN_BYTES", "1024"))
+LEVELS = {
+    "gzip": int(os.environ.get("HMM_GZIP_LEVEL", "6")),
+    "br": int(os.environ.get("HMM_BROTLI_LEVEL", "9")),
+    "zstd": int(os.environ.get("HMM_ZSTD_LEVEL", "12")),
+}
+
+
+def _available(coding: str) -> bool:
+    try:
+        if coding == "br":
+            import brotli  # noqa: F401
+        elif coding == "zstd":
+            import zstandard  # noqa: F401
+        return coding in LEVELS
+    except ImportError:
+        return False
+
+
+# Server preference order: the first one the client accepts is used
+CODINGS: List[str] = [c.strip() for c in os.environ.get("HMM_COMPRESS_CODINGS", "zstd,br,gzip").split(",")
+                      if c.strip() and _available(c.strip())]
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "gzip":
+        # mtime=0 keeps the bytes identical across processes
+        return gzip.compress(body, compresslevel=LEVELS["gzip"], mtime=0)
+    if coding == "br":
+        import brotli
+        return brotli.compress(body, quality=LEVELS["br"])
+    if coding == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=LEVELS["zstd"]).compress(body)
+    raise ValueError(f"unsupported coding {coding!r}")
+
+
+def choose(accept_encoding: Optional[str]) -> Optional[str]:
+    # Preferred coding the client accepts (q > 0), or None for identity
+    if not accept_encoding or not CODINGS:
+        return None
+    accepted, wildcard = {}, None
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        name = name.strip().lower()
+        if name == "*":
+            wildcard = q
+        elif name:
+            accepted[name] = q
+    for coding in CODINGS:
+        if accepted.get(coding, wildcard if wildcard is not None else 0.0) > 0:
+            return coding
+    return None
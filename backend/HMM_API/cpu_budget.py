@@ -0,0 +1,201 @@
+# CPU budget for the native thread pools used by regime fits.
+#
+# KMeans (OpenMP), StandardScaler and hmmlearn (NumPy/SciPy BLAS) each start
+# one thread per visible core by default. Every gunicorn worker and every
+# precompute process does the same, so a few concurrent fits on a shared host
+# run dozens of busy threads against a small CFS quota and spend their time
+# context switching and being throttled.
+#
+# The budget is the container's CPU quota (cgroup v2 cpu.max or v1
+# cpu.cfs_quota_us), capped by the CPU affinity mask, or HMM_CPU_BUDGET. It is
+# split evenly between the processes that fit regimes (HMM_CPU_PROCESSES,
+# default: web workers plus precompute and job workers). Each fit runs with
+# HMM_JOB_THREADS native threads (default 1: the fits work on a single return
+# series, where BLAS threading is overhead), and a process runs at most
+# threads // job_threads fits at once; further fits wait for a slot.
+#
+# Importing this module exports OMP/OpenBLAS/MKL thread counts, so it must be
+# imported before numpy. threadpoolctl (a scikit-learn dependency) enforces
+# the same limit on libraries that were already loaded, e.g. in a preloading
+# gunicorn master.
+
+import math
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                   "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+
+def cgroup_cpus() -> Optional[float]:
+    # CPUs granted by the cgroup quota, or None when unlimited or unknown
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def visible_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def total_cpus() -> int:
+    if os.environ.get("HMM_CPU_BUDGET"):
+        return max(1, int(os.environ["HMM_CPU_BUDGET"]))
+    quota = cgroup_cpus()
+    cpus = visible_cpus()
+    if quota is not None:
+        cpus = min(cpus, math.floor(quota))
+    return max(1, cpus)
+
+
+def fit_processes() -> int:
+    if os.environ.get("HMM_CPU_PROCESSES"):
+        return max(1, int(os.environ["HMM_CPU_PROCESSES"]))
+    processes = int(os.environ.get("WEB_CONCURRENCY", "4"))
+    if os.environ.get("HMM_PRECOMPUTE", "1") == "1":
+        processes += precompute_workers()
+    processes += job_workers()
+    return max(1, processes)
+
+
+def precompute_workers() -> int:
+    return int(os.environ.get("HMM_PRECOMPUTE_WORKERS", str(max(1, total_cpus() // 2))))
+
+
+def job_workers() -> int:
+    # jobworker.py processes started by gunicorn (see gunicorn.conf.py)
+    return max(0, int(os.environ.get("HMM_JOB_WORKERS", "1")))
+
+
+class CpuBudget:
+    def __init__(self, cpus: int, processes: int, job_threads: int):
+        self.cpus = cpus
+        self.processes = processes
+        self.process_threads = max(1, cpus // processes)
+        self.job_threads = max(1, min(job_threads, self.process_threads))
+        self.max_jobs = max(1, self.process_threads // self.job_threads)
+        self.slots = threading.BoundedSemaphore(self.max_jobs)
+        self.lock = threading.Lock()
+        self.stats: Dict[str, dict] = {}
+        self.running = 0
+        self.waiting = 0
+        self._limiter = None
+        self._applied_pid = None
+
+    def export_env(self):
+        # Read by OpenMP/BLAS when they load; explicit settings win
+        for name in THREAD_ENV_VARS:
+            os.environ.setdefault(name, str(self.job_threads))
+
+    def apply(self):
+        # Caps pools already loaded in this process. Called again after a fork,
+        # since gunicorn workers inherit the master's libraries, not its calls.
+        if self._applied_pid == os.getpid():
+            return
+        self._applied_pid = os.getpid()
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:  # the environment variables still apply
+            return
+        self._limiter = threadpool_limits(limits=self.job_threads)
+
+    @contextmanager
+    def job(self, kind: str):
+        # One fit: waits for a slot, then records wall, wait and CPU time
+        self.apply()
+        queued = time.monotonic()
+        with self.lock:
+            self.waiting += 1
+        self.slots.acquire()
+        started = time.monotonic()
+        cpu_started = thread_cpu_seconds()
+        with self.lock:
+            self.waiting -= 1
+            self.running += 1
+        try:
+            yield
+        finally:
+            cpu = thread_cpu_seconds() - cpu_started
+            native = native_threads()
+            with self.lock:
+                self.running -= 1
+                s = self.stats.setdefault(kind, {"jobs": 0, "wait_seconds": 0.0, "wall_seconds": 0.0,
+                                                 "cpu_seconds": 0.0, "max_native_threads": 0})
+                s["jobs"] += 1
+                s["wait_seconds"] += started - queued
+                s["wall_seconds"] += time.monotonic() - started
+                s["cpu_seconds"] += cpu
+                s["max_native_threads"] = max(s["max_native_threads"], native)
+            self.slots.release()
+
+    def metrics(self) -> dict:
+        with self.lock:
+            jobs = {kind: {**s, "threads": self.job_threads,
+                           "avg_wall_seconds": s["wall_seconds"] / s["jobs"] if s["jobs"] else 0.0}
+                    for kind, s in self.stats.items()}
+            running, waiting = self.running, self.waiting
+        return {
+            "cpus": self.cpus,
+            "processes": self.processes,
+            "process_threads": self.process_threads,
+            "job_threads": self.job_threads,
+            "max_concurrent_jobs": self.max_jobs,
+            "running_jobs": running,
+            "waiting_jobs": waiting,
+            "native_threads": native_threads(),
+            "thread_pools": thread_pools(),
+            "jobs": jobs,
+        }
+
+
+def thread_cpu_seconds() -> float:
+    # CPU time of the calling thread; native pool threads show up in native_threads
+    try:
+        usage = resource.getrusage(resource.RUSAGE_THREAD)
+        return usage.ru_utime + usage.ru_stime
+    except (AttributeError, ValueError):
+        return time.thread_time()
+
+
+def native_threads() -> int:
+    # OS threads in this process, pool threads included
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return threading.active_count()
+
+
+def thread_pools():
+    try:
+        from threadpoolctl import threadpool_info
+    except ImportError:
+        return []
+    return [{"api": p.get("internal_api"), "num_threads": p.get("num_threads")} for p in threadpool_info()]
+
+
+budget = CpuBudget(total_cpus(), fit_processes(), int(os.environ.get("HMM_JOB_THREADS", "1")))
+budget.export_env()
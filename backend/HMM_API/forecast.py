@@ -0,0 +1,132 @@
+# Monte Carlo regime forecasts from a fitted model.
+#
+# init_hmm stores what the simulation needs with every fit (see
+# model_params): the transition matrix, the Gaussian emissions in the scaled
+# return space it was fitted on, the scaler that maps them back to returns,
+# and the posterior over states at the last bar. Forecasts never refit.
+#
+# Paths start from a state drawn from that posterior and walk the transition
+# matrix; each step draws a return from the state's emission. Staying in the
+# current regime is measured on the paths that start in it. All paths
+# advance together, so a step is a few array operations over every path, and
+# the per-horizon statistics are reductions over the path axis. Returns are
+# those of the smoothed close (SG_Close) the model is fitted on.
+
+import zlib
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+DEFAULT_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+
+def model_params(model, scaler, posteriors: np.ndarray, regimes: np.ndarray) -> dict:
+    # JSON-ready parameters of a fitted GaussianHMM (1-D observations)
+    return {
+        "transmat": model.transmat_.tolist(),
+        "means": model.means_[:, 0].tolist(),
+        "stds": np.sqrt(model.covars_[:, 0, 0]).tolist(),
+        "scaler_mean": float(scaler.mean_[0]),
+        "scaler_scale": float(scaler.scale_[0]),
+        "last_posterior": posteriors[-1].tolist(),
+        "last_regime": int(regimes[-1]),
+    }
+
+
+def simulate(params: dict, paths: int, horizon: int, rng: np.random.Generator):
+    # (start, states, returns): each path's state at the last bar (paths,),
+    # then the state and return of each future bar (horizon, paths). Paths
+    # run along the contiguous axis, so every step and every per-horizon
+    # reduction works on contiguous rows.
+    transmat = np.asarray(params["transmat"])
+    cum = transmat.cumsum(axis=1)
+    cum[:, -1] = 1.0  # rows that sum to 1 - eps must still cover every draw
+    # Thresholds per column, gathered per path: cheaper than cum[current]
+    thresholds = [np.ascontiguousarray(cum[:, j]) for j in range(cum.shape[1] - 1)]
+    start = np.asarray(params["last_posterior"]).cumsum()
+    start[-1] = 1.0
+
+    u = rng.random((horizon + 1, paths))
+    states = np.empty((horizon, paths), dtype=np.intp)
+    current = initial = np.searchsorted(start, u[0], side="right")
+    for h in range(horizon):
+        # Inverse-CDF draw of the next state from each path's transition row
+        draw = u[h + 1]
+        nxt = (draw >= thresholds[0][current]).astype(np.intp)
+        for column in thresholds[1:]:
+            nxt += draw >= column[current]
+        states[h] = current = nxt
+
+    means = np.asarray(params["means"]) * params["scaler_scale"] + params["scaler_mean"]
+    stds = np.asarray(params["stds"]) * params["scaler_scale"]
+    returns = means[states] + stds[states] * rng.standard_normal((horizon, paths))
+    return initial, states, returns
+
+
+def row_quantiles(values: np.ndarray, quantiles: Sequence[float]) -> np.ndarray:
+    # np.quantile's linear method per row, from one sort along the contiguous axis
+    ordered = np.sort(values, axis=1)
+    pos = np.asarray(quantiles) * (values.shape[1] - 1)
+    lo = np.floor(pos).astype(int)
+    hi = np.minimum(lo + 1, values.shape[1] - 1)
+    frac = pos - lo
+    return (ordered[:, lo] * (1 - frac) + ordered[:, hi] * frac).T
+
+
+def summarize(params: dict, labels: Sequence[str], initial: np.ndarray, states: np.ndarray,
+              returns: np.ndarray, quantiles: Sequence[float]) -> dict:
+    current = params["last_regime"]
+    p_self = params["transmat"][current][current]
+    # Of the paths that start in the current regime, those still in it at
+    # every bar up to h. Paths entering it later never stayed.
+    stayed = np.logical_and.accumulate(states[:, initial == current] == current, axis=0)
+    if stayed.shape[1]:
+        stay = stayed.mean(axis=1)
+        simulated_duration = round(float(stayed.sum(axis=0).mean()), 2)
+    else:
+        # No path drew the current regime as its start: the fitted self-transition
+        stay = p_self ** np.arange(1, states.shape[0] + 1)
+        simulated_duration = None
+    cumulative = np.cumprod(1.0 + returns, axis=0) - 1.0
+    q = row_quantiles(cumulative, quantiles)
+    return {
+        "curr_regime": labels[current],
+        "stay_probability": rounded(stay),
+        "leave_probability": round(float(1.0 - stay[-1]), 4),
+        "regime_probabilities": {labels[s]: rounded((states == s).mean(axis=1))
+                                 for s in range(len(labels))},
+        "expected_duration": {
+            # Remaining bars in the current regime: geometric from the fitted
+            # self-transition, and as simulated (capped at the horizon)
+            "model": round(p_self / (1.0 - p_self), 2) if p_self < 1 else None,
+            "simulated": simulated_duration,
+        },
+        "expected_return": rounded(cumulative.mean(axis=1)),
+        "return_quantiles": {f"{p:g}": rounded(row) for p, row in zip(quantiles, q)},
+    }
+
+
+def forecast(params: dict, labels: Sequence[str], symbol: str, paths: int, horizon: int,
+             seed: int, quantiles: Sequence[float] = DEFAULT_QUANTILES) -> dict:
+    # Seeded per symbol, so a batch gives each symbol its own reproducible draws
+    rng = np.random.default_rng([seed, zlib.crc32(symbol.upper().encode())])
+    initial, states, returns = simulate(params, paths, horizon, rng)
+    return summarize(params, labels, initial, states, returns, quantiles)
+
+
+def rounded(values: np.ndarray) -> List[float]:
+    return np.round(values, 4).tolist()
+
+
+def parse_quantiles(raw: str) -> List[float]:
+    try:
+        values = sorted({float(v) for v in raw.split(",") if v.strip()})
+    except ValueError:
+        raise ValueError(f"quantiles must be numbers, got {raw!r}")
+    if not values or not all(0 < v < 1 for v in values):
+        raise ValueError("quantiles must be between 0 and 1")
+    return values
+
+
+def regime_names(regime_labels: Dict[int, tuple]) -> List[str]:
+    return [regime_labels[s][0] for s in sorted(regime_labels)]
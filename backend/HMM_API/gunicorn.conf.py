@@ -0,0 +1,42 @@
+# Gunicorn settings for the HMM API.
+#
+# GUNICORN_PRELOAD=1 imports the app once in the master; main.py then imports
+# the heavy scientific stack there too, so workers fork with it already loaded
+# and share those pages copy-on-write. Fits and thread pools only ever start
+# inside workers (see warm_up in main.py).
+#
+# HMM_BAR_REFRESHER=1 (default) also starts refresher.py next to the workers,
+# the single process that keeps hot symbols current in the shared bar store.
+# HMM_PRECOMPUTE=1 (default) likewise starts scheduler.py, which fits regimes
+# for the configured universe on bar closes so requests are served from the
+# shared result store.
+#
+# HMM_JOB_WORKERS (default 1) jobworker.py processes run /api/jobs fits from
+# the shared job queue (see jobs.py); 0 leaves jobs queued for workers run
+# elsewhere against the same HMM_JOB_DB.
+import os
+import subprocess
+import sys
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8081')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+
+children = []
+
+
+def when_ready(server):
+    here = os.path.dirname(os.path.abspath(__file__))
+    if os.environ.get("HMM_BAR_REFRESHER", "1") == "1":
+        children.append(subprocess.Popen([sys.executable, "refresher.py"], cwd=here))
+    if os.environ.get("HMM_PRECOMPUTE", "1") == "1":
+        children.append(subprocess.Popen([sys.executable, "scheduler.py"], cwd=here))
+    for _ in range(max(0, int(os.environ.get("HMM_JOB_WORKERS", "1")))):
+        children.append(subprocess.Popen([sys.executable, "jobworker.py"], cwd=here))
+
+
+def on_exit(server):
+    for child in children:
+        if child.poll() is None:
+            child.terminate()
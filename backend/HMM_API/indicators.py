@@ -0,0 +1,262 @@
+# Technical indicators for /api/indicators, computed from the shared bar store.
+#
+# A request names indicators as specs such as "sma:50", "ema:20", "rsi:14",
+# "atr:14", "bb:20:2" (Bollinger: window, width in standard deviations) or
+# "sg:15:3" (Savitzky-Golay smoothed close: window, polynomial order, the
+# SG_Close series the regime fit uses). Every indicator is a vectorised NumPy
+# pass over the bar arrays; recursive ones (EMA, RSI's and ATR's Wilder
+# smoothing) run as a first-order IIR filter through scipy.signal.lfilter.
+#
+# Results are memoized per (symbol, interval, spec) in each worker. When the
+# bar store grows, only the new bars are computed, seeded from the memoized
+# tail; the last memoized bar is always recomputed, since a forming intraday
+# (or same-day daily) bar is revised in place. A changed history (a
+# re-download from an earlier start, or rewritten closes) recomputes fully.
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# name -> (parameter names, defaults)
+INDICATORS = {
+    "sma": (["window"], [20]),
+    "ema": (["window"], [20]),
+    "rsi": (["window"], [14]),
+    "atr": (["window"], [14]),
+    "bb": (["window", "width"], [20, 2.0]),
+    "sg": (["window", "polyorder"], [15, 3]),
+}
+MAX_WINDOW = 1000
+
+
+def parse_spec(spec: str) -> Tuple[str, tuple]:
+    # "bb:20:2" -> ("bb", (20, 2.0)); missing parameters take the defaults
+    name, *args = [part.strip() for part in spec.strip().lower().split(":")]
+    if name not in INDICATORS:
+        raise ValueError(f"unknown indicator {name!r}, expected one of {', '.join(INDICATORS)}")
+    names, defaults = INDICATORS[name]
+    if len(args) > len(names):
+        raise ValueError(f"{name} takes at most {len(names)} parameters ({', '.join(names)})")
+    params = []
+    for i, default in enumerate(defaults):
+        raw = args[i] if i < len(args) and args[i] else None
+        try:
+            value = type(default)(raw) if raw is not None else default
+        except ValueError:
+            raise ValueError(f"{name} {names[i]} must be a number, got {raw!r}")
+        params.append(value)
+    window = params[0]
+    if not 2 <= window <= MAX_WINDOW:
+        raise ValueError(f"{name} window must be between 2 and {MAX_WINDOW}")
+    if name == "bb" and params[1] <= 0:
+        raise ValueError("bb width must be positive")
+    if name == "sg" and not (window % 2 == 1 and 0 <= params[1] < window):
+        raise ValueError("sg window must be odd and polyorder below it")
+    return name, tuple(params)
+
+
+def series_name(name: str, params: tuple) -> str:
+    return "_".join([name] + [f"{p:g}" for p in params])
+
+
+# ------------------------
+# Kernels
+# ------------------------
+# Each kernel returns {output: values for bars[start:]} plus hidden state
+# columns (prefixed "_"), given the full arrays and, when start > 0, the
+# memoized outputs for bars[:start].
+
+def _windows(x: np.ndarray, window: int, start: int) -> Tuple[np.ndarray, int]:
+    # Trailing windows ending at each bar from max(start, window - 1)
+    first = max(start, window - 1)
+    if first >= len(x):
+        return np.empty((0, window)), first
+    return np.lib.stride_tricks.sliding_window_view(x[first - window + 1:], window), first
+
+
+def _pad(values: np.ndarray, first: int, start: int, n: int) -> np.ndarray:
+    out = np.full(n - start, np.nan)
+    out[first - start:] = values
+    return out
+
+
+def _smooth(x: np.ndarray, alpha: float, seed: float) -> np.ndarray:
+    # y[i] = alpha * x[i] + (1 - alpha) * y[i - 1], with y[-1] = seed
+    from scipy.signal import lfilter
+
+    if len(x) == 0:
+        return x
+    y, _ = lfilter([alpha], [1.0, alpha - 1.0], x, zi=[(1.0 - alpha) * seed])
+    return y
+
+
+def sma(arrays, start, prev, window):
+    close = arrays["close"]
+    w, first = _windows(close, window, start)
+    return {"": _pad(w.mean(axis=1), first, start, len(close))}
+
+
+def ema(arrays, start, prev, window):
+    close = arrays["close"]
+    seed = prev[""][start - 1] if start else close[0]
+    return {"": _smooth(close[start:], 2.0 / (window + 1), seed)}
+
+
+def rsi(arrays, start, prev, window):
+    close = arrays["close"]
+    n = len(close)
+    lo = max(start, 1)
+    delta = close[lo:] - close[lo - 1:-1]
+    alpha = 1.0 / window
+    gain_seed = prev["_gain"][lo - 1] if start else 0.0
+    loss_seed = prev["_loss"][lo - 1] if start else 0.0
+    gain = _smooth(np.maximum(delta, 0.0), alpha, gain_seed)
+    loss = _smooth(np.maximum(-delta, 0.0), alpha, loss_seed)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+    values[np.arange(lo, n) < window] = np.nan
+    pad = lo - start
+    head = np.full(pad, np.nan)
+    return {"": np.concatenate([head, values]),
+            "_gain": np.concatenate([np.zeros(pad), gain]),
+            "_loss": np.concatenate([np.zeros(pad), loss])}
+
+
+def atr(arrays, start, prev, window):
+    high, low, close = arrays["high"], arrays["low"], arrays["close"]
+    n = len(close)
+    prev_close = np.concatenate([[close[0]], close[:-1]])[start:]
+    h, l = high[start:], low[start:]
+    true_range = np.maximum(h - l, np.maximum(np.abs(h - prev_close), np.abs(l - prev_close)))
+    seed = prev["_tr"][start - 1] if start else true_range[0] if len(true_range) else 0.0
+    smoothed = _smooth(true_range, 1.0 / window, seed)
+    values = smoothed.copy()
+    values[np.arange(start, n) < window - 1] = np.nan
+    return {"": values, "_tr": smoothed}
+
+
+def bb(arrays, start, prev, window, width):
+    close = arrays["close"]
+    w, first = _windows(close, window, start)
+    n = len(close)
+    mid, sd = w.mean(axis=1), w.std(axis=1)
+    return {"mid": _pad(mid, first, start, n),
+            "upper": _pad(mid + width * sd, first, start, n),
+            "lower": _pad(mid - width * sd, first, start, n)}
+
+
+def sg(arrays, start, prev, window, polyorder):
+    # Savitzky-Golay is centred: appending bars changes the last window // 2
+    # values, so the tail is refitted over a slice long enough to be exact
+    from scipy.signal import savgol_filter
+
+    close = arrays["close"]
+    n = len(close)
+    if n < window:
+        return {"": np.full(n - start, np.nan)}
+    if start:
+        start = max(0, start - window)
+    lo = max(0, start - window)
+    if n - lo < window:
+        lo = n - window
+    values = savgol_filter(close[lo:], window_length=window, polyorder=polyorder)
+    return {"": values[start - lo:], "_restart": np.array([start])}
+
+
+KERNELS = {"sma": sma, "ema": ema, "rsi": rsi, "atr": atr, "bb": bb, "sg": sg}
+
+
+def compute(arrays: Dict[str, np.ndarray], name: str, params: tuple,
+            prev: Optional[Dict[str, np.ndarray]] = None, start: int = 0) -> Dict[str, np.ndarray]:
+    # Full columns for every bar, reusing prev[:start] when extending
+    out = KERNELS[name](arrays, start, prev, *params)
+    restart = start
+    if "_restart" in out:
+        # The kernel moved its own restart point back (sg)
+        restart = int(out.pop("_restart")[0])
+    if not start or prev is None:
+        return out
+    return {key: np.concatenate([prev[key][:restart], values]) for key, values in out.items()}
+
+
+# ------------------------
+# Memo
+# ------------------------
+class IndicatorCache:
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (ts, close, columns)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.extended = 0
+        self.computed = 0
+
+    def get(self, key: tuple, ts: np.ndarray, arrays: Dict[str, np.ndarray],
+            name: str, params: tuple) -> Dict[str, np.ndarray]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        n = len(ts)
+        start = 0
+        if entry is not None:
+            old_ts, old_close, columns = entry
+            m = len(old_ts)
+            # The memo is kept only if the history up to its last settled bar is unchanged
+            if 2 <= m <= n and old_ts[0] == ts[0] and old_ts[m - 2] == ts[m - 2] \
+                    and old_close[0] == arrays["close"][0] and old_close[m - 2] == arrays["close"][m - 2]:
+                if m == n and old_ts[-1] == ts[-1] and old_close[-1] == arrays["close"][-1]:
+                    self.hits += 1
+                    return columns
+                start = m - 1
+        if start:
+            columns = compute(arrays, name, params, prev=entry[2], start=start)
+            self.extended += 1
+        else:
+            columns = compute(arrays, name, params)
+            self.computed += 1
+        with self.lock:
+            self.entries[key] = (np.array(ts), np.array(arrays["close"]), columns)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return columns
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "hits": self.hits,
+                "extended": self.extended, "computed": self.computed}
+
+
+def bar_arrays(bars) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    # Bars with a complete high/low/close; a missing print would poison every
+    # recursive indicator after it
+    ok = np.isfinite(bars.close) & np.isfinite(bars.high) & np.isfinite(bars.low)
+    if ok.all():
+        return bars.ts, {"close": bars.close, "high": bars.high, "low": bars.low}
+    return bars.ts[ok], {"close": bars.close[ok], "high": bars.high[ok], "low": bars.low[ok]}
+
+
+def indicator_series(cache: IndicatorCache, symbol: str, interval: str, bars,
+                     specs: List[Tuple[str, tuple]], from_ts: float) -> dict:
+    # {"timestamps", "close", "series": {name: values}} for bars from from_ts on,
+    # with NaN warm-up values as None
+    ts, arrays = bar_arrays(bars)
+    i = int(np.searchsorted(ts, from_ts, side="left"))
+    series = {}
+    for name, params in specs:
+        columns = cache.get((symbol.upper(), interval, name, params), ts, arrays, name, params)
+        base = series_name(name, params)
+        for key, values in columns.items():
+            if not key.startswith("_"):
+                series[base + ("_" + key if key else "")] = to_list(values[i:])
+    return {"timestamps": to_timestamps(ts[i:]), "close": to_list(arrays["close"][i:]), "series": series}
+
+
+def to_list(values: np.ndarray) -> list:
+    return [None if v != v else v for v in np.round(values, 4).tolist()]
+
+
+def to_timestamps(ts: np.ndarray) -> List[str]:
+    return np.datetime_as_string(np.asarray(ts, dtype="int64").astype("datetime64[s]")).tolist()
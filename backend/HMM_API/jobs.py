@@ -0,0 +1,165 @@
+# Durable queue of regime fit jobs for /api/jobs.
+#
+# Fits that can outlast an HTTP request (1m/5m bars over long ranges, or many
+# symbols at once) are submitted as jobs instead: a row in an SQLite table
+# (WAL mode, HMM_JOB_DB, default <HMM_RESULT_DIR>/jobs.db) that web workers
+# insert and poll, and job worker processes (jobworker.py) claim and run. A
+# claim is a single IMMEDIATE transaction, so any number of job workers can
+# share the queue, and the queue survives restarts.
+#
+# A running job rewrites its progress at least every HEARTBEAT_SECONDS; one
+# whose worker stopped doing so (killed, OOM, host restart) is put back in the
+# queue by the next claim, up to MAX_ATTEMPTS runs. Finished jobs record where
+# each symbol's result lives in the shared result store (results.py), where
+# /api/hmmplot reuses it too; job rows are purged after HMM_JOB_TTL.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import results
+
+JOB_DB = os.environ.get("HMM_JOB_DB") or os.path.join(results.RESULT_DIR, "jobs.db")
+HEARTBEAT_SECONDS = float(os.environ.get("HMM_JOB_HEARTBEAT", "10"))
+STALE_SECONDS = 6 * HEARTBEAT_SECONDS
+MAX_ATTEMPTS = int(os.environ.get("HMM_JOB_MAX_ATTEMPTS", "3"))
+JOB_TTL = float(os.environ.get("HMM_JOB_TTL", str(7 * 24 * 60 * 60)))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+_local = threading.local()
+
+
+class Cancelled(Exception):
+    pass
+
+
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(JOB_DB) or ".", exist_ok=True)
+        conn = sqlite3.connect(JOB_DB, timeout=10.0, isolation_level=None)
+        conn.execute("pragma journal_mode=wal")
+        conn.execute(
+            "create table if not exists jobs ("
+            "id text primary key, symbols text, interval text, start text, status text, "
+            "progress text, results text, error text, attempts integer default 0, worker text, "
+            "created_at real, started_at real, updated_at real, finished_at real)")
+        conn.execute("create index if not exists jobs_status on jobs (status, created_at)")
+        conn.row_factory = sqlite3.Row
+        _local.conn = conn
+    return conn
+
+
+def to_job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["symbols"] = json.loads(job["symbols"])
+    job["progress"] = json.loads(job["progress"]) if job["progress"] else None
+    job["results"] = json.loads(job["results"]) if job["results"] else None
+    return job
+
+
+def _select(where: str, args: tuple) -> Optional[dict]:
+    row = _conn().execute(f"select * from jobs where {where}", args).fetchone()
+    return to_job(row) if row is not None else None
+
+
+def get(job_id: str) -> Optional[dict]:
+    return _select("id = ?", (job_id,))
+
+
+def submit(symbols: List[str], interval: str, start: str, stored: Optional[Dict[str, dict]] = None) -> dict:
+    # An identical job still queued or running is returned instead of a new
+    # one. With `stored` (every symbol's result already current in the result
+    # store) the job is recorded as done straight away.
+    now = time.time()
+    encoded = json.dumps(symbols)
+    conn = _conn()
+    conn.execute("begin immediate")
+    try:
+        existing = _select("symbols = ? and interval = ? and start = ? and status in (?, ?)",
+                           (encoded, interval, start, *ACTIVE))
+        if existing is not None:
+            conn.execute("commit")
+            return existing
+        job_id = str(uuid.uuid4())
+        if stored is not None:
+            conn.execute(
+                "insert into jobs (id, symbols, interval, start, status, results, created_at, updated_at, finished_at) "
+                "values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, encoded, interval, start, DONE, json.dumps(stored), now, now, now))
+        else:
+            conn.execute(
+                "insert into jobs (id, symbols, interval, start, status, created_at, updated_at) "
+                "values (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, encoded, interval, start, QUEUED, now, now))
+        conn.execute("commit")
+    except BaseException:
+        conn.execute("rollback")
+        raise
+    return get(job_id)
+
+
+def claim(worker: str) -> Optional[dict]:
+    # Oldest queued job, marked running for this worker; first requeues (or
+    # fails, after MAX_ATTEMPTS) running jobs whose worker went quiet
+    now = time.time()
+    conn = _conn()
+    conn.execute("begin immediate")
+    try:
+        conn.execute("update jobs set status = ?, error = 'worker stopped responding', finished_at = ? "
+                     "where status = ? and updated_at < ? and attempts >= ?",
+                     (FAILED, now, RUNNING, now - STALE_SECONDS, MAX_ATTEMPTS))
+        conn.execute("update jobs set status = ?, worker = null where status = ? and updated_at < ?",
+                     (QUEUED, RUNNING, now - STALE_SECONDS))
+        job = _select("status = ? order by created_at limit 1", (QUEUED,))
+        if job is not None:
+            conn.execute("update jobs set status = ?, worker = ?, attempts = attempts + 1, "
+                         "started_at = ?, updated_at = ? where id = ?",
+                         (RUNNING, worker, now, now, job["id"]))
+        conn.execute("commit")
+    except BaseException:
+        conn.execute("rollback")
+        raise
+    return get(job["id"]) if job is not None else None
+
+
+def report(job_id: str, worker: str, progress: dict):
+    # Progress doubles as the heartbeat. Raises Cancelled when the job was
+    # cancelled, or taken over after this worker was presumed dead.
+    cur = _conn().execute("update jobs set progress = ?, updated_at = ? where id = ? and status = ? and worker = ?",
+                          (json.dumps(progress), time.time(), job_id, RUNNING, worker))
+    if cur.rowcount == 0:
+        raise Cancelled(job_id)
+
+
+def finish(job_id: str, worker: str, status: str, job_results: Optional[dict] = None, error: Optional[str] = None):
+    now = time.time()
+    _conn().execute("update jobs set status = ?, results = ?, error = ?, updated_at = ?, finished_at = ? "
+                    "where id = ? and status = ? and worker = ?",
+                    (status, json.dumps(job_results) if job_results is not None else None, error,
+                     now, now, job_id, RUNNING, worker))
+
+
+def cancel(job_id: str) -> bool:
+    # Queued jobs never start; a running one stops at its next progress report
+    now = time.time()
+    cur = _conn().execute("update jobs set status = ?, updated_at = ?, finished_at = ? where id = ? and status in (?, ?)",
+                          (CANCELLED, now, now, job_id, *ACTIVE))
+    return cur.rowcount > 0
+
+
+def purge():
+    _conn().execute("delete from jobs where status not in (?, ?) and finished_at < ?",
+                    (*ACTIVE, time.time() - JOB_TTL))
+
+
+def queued_ahead(job: dict) -> int:
+    row = _conn().execute("select count(*) from jobs where status = ? and created_at < ?",
+                          (QUEUED, job["created_at"])).fetchone()
+    return int(row[0])
@@ -0,0 +1,144 @@
+# Job worker for /api/jobs (see jobs.py).
+#
+# Claims queued fit jobs and runs them: first the bars of every symbol
+# (fetched into the shared bar store where missing or stale), then one regime
+# fit per symbol, stored in the shared result store like any /api/hmmplot
+# fit. Progress is written back to the job as it goes: symbols downloaded,
+# then the symbol being fitted with its EM iteration and log-likelihood. A
+# heartbeat thread keeps the job's progress fresh through long downloads and
+# fits, and stops the job when it is cancelled.
+#
+# gunicorn starts HMM_JOB_WORKERS of these (see gunicorn.conf.py); more can be
+# run by hand with `python jobworker.py`, each claiming its own jobs. They are
+# counted in the CPU budget's process split and run niced, so web workers stay
+# responsive while heavy fits run here.
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+# Before bars imports numpy (see cpu_budget.py)
+import cpu_budget
+import jobs
+import results
+
+POLL_SECONDS = float(os.environ.get("HMM_JOB_POLL", "1"))
+# EM iterations can be milliseconds apart; progress is written at most this often
+REPORT_SECONDS = 0.5
+PURGE_SECONDS = 60 * 60
+
+
+class Reporter:
+    def __init__(self, job: dict, worker: str):
+        self.job_id = job["id"]
+        self.worker = worker
+        self.progress = {"phase": "download", "symbols": len(job["symbols"]), "downloaded": 0, "fitted": 0,
+                         "symbol": None, "iteration": None, "max_iter": None, "log_likelihood": None}
+        self.sent = 0.0
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def update(self, force: bool = True, **changes):
+        if self.cancelled:
+            raise jobs.Cancelled(self.job_id)
+        with self.lock:
+            self.progress.update(changes)
+            now = time.monotonic()
+            if not force and now - self.sent < REPORT_SECONDS:
+                return
+            self.sent = now
+            jobs.report(self.job_id, self.worker, self.progress)
+
+    def em(self, iteration: int, max_iter: int, log_likelihood: float):
+        self.update(force=False, iteration=iteration, max_iter=max_iter, log_likelihood=round(log_likelihood, 4))
+
+    def heartbeat(self):
+        while not self.stopped.wait(jobs.HEARTBEAT_SECONDS):
+            try:
+                with self.lock:
+                    jobs.report(self.job_id, self.worker, self.progress)
+            except jobs.Cancelled:
+                # Seen by the job at its next update
+                self.cancelled = True
+                return
+            except Exception as e:
+                print(f"job {self.job_id} heartbeat failed: {e}")
+
+    def __enter__(self):
+        threading.Thread(target=self.heartbeat, name=f"heartbeat-{self.job_id}", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+
+
+def run(job: dict, worker: str):
+    import main
+
+    symbols, interval, start = job["symbols"], job["interval"], job["start"]
+    out, loaded = {}, {}
+    with Reporter(job, worker) as reporter:
+        reporter.update()
+        for i, symbol in enumerate(symbols):
+            reporter.update(symbol=symbol)
+            try:
+                data = main.load_bars(symbol, interval, start, allow_stale=False)
+            except Exception as e:
+                data, out[symbol] = None, {"status": jobs.FAILED, "error": f"download failed: {e}"}
+            if data is not None and len(data.ts) > 0:
+                loaded[symbol] = data
+            else:
+                out.setdefault(symbol, {"status": jobs.FAILED, "error": f"No data for {symbol}"})
+            reporter.update(downloaded=i + 1)
+
+        reporter.update(phase="fit", symbol=None)
+        for symbol, data in loaded.items():
+            reporter.update(symbol=symbol, iteration=0, max_iter=None, log_likelihood=None)
+            key, fp = results.result_key(symbol, interval, start), results.fingerprint(data)
+            try:
+                main.regime_body(symbol, interval, start, data, on_iteration=reporter.em)
+                out[symbol] = {"status": jobs.DONE, "key": key, "fingerprint": fp, "bars": len(data.ts)}
+            except jobs.Cancelled:
+                raise
+            except Exception as e:
+                out[symbol] = {"status": jobs.FAILED, "error": f"fit failed: {e}"}
+            reporter.update(fitted=reporter.progress["fitted"] + 1)
+        reporter.update(phase="done", symbol=None)
+
+    fitted = any(entry["status"] == jobs.DONE for entry in out.values())
+    jobs.finish(job["id"], worker, jobs.DONE if fitted else jobs.FAILED,
+                {symbol: out[symbol] for symbol in symbols}, None if fitted else "no symbol could be fitted")
+
+
+def main():
+    # Let gunicorn's terminate() stop the worker; an interrupted job is requeued
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    os.nice(int(os.environ.get("HMM_JOB_NICE", "5")))
+    cpu_budget.budget.apply()
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    purged = 0.0
+    while True:
+        if time.monotonic() - purged > PURGE_SECONDS:
+            jobs.purge()
+            purged = time.monotonic()
+        job = jobs.claim(worker)
+        if job is None:
+            time.sleep(POLL_SECONDS)
+            continue
+        started = time.monotonic()
+        try:
+            run(job, worker)
+            print(f"job {job['id']} ({len(job['symbols'])} {job['interval']} symbols) "
+                  f"finished in {time.monotonic() - started:.0f}s")
+        except jobs.Cancelled:
+            print(f"job {job['id']} cancelled")
+        except Exception as e:
+            print(f"job {job['id']} failed: {e}")
+            jobs.finish(job["id"], worker, jobs.FAILED, error=str(e))
+
+
+if __name__ == "__main__":
+    main()
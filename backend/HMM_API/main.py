@@ -1,19 +1,53 @@
-from fastapi import FastAPI, Query, Response
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Header, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-import yfinance as yf
-from scipy.signal import savgol_filter
-import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from hmmlearn import hmm
-import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
+import asyncio
+import importlib
 import json
+import os
+import threading
+import time
+import urllib.parse
+from typing import Optional
+# Before anything imports numpy: exports the per-fit thread limits (see cpu_budget.py)
+from cpu_budget import budget
+import bars
+import compressed
+import forecast
+import indicators
+import jobs
+import results
+import sources
+import universe
+from breaker import BreakerOpen
+from regime_index import RegimeIndex, regime_summary
+
+# yfinance, scipy, sklearn, hmmlearn, pandas and plotly are imported inside the
+# functions that use them: together they dominate startup time, and a worker
+# that has not served a plot yet should not pay for them.
+HEAVY_MODULES = ["numpy", "pandas", "scipy.signal", "sklearn.cluster",
+                 "sklearn.preprocessing", "hmmlearn.hmm", "plotly.graph_objects", "yfinance"]
+
+def preload_modules():
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+# With GUNICORN_PRELOAD=1 the master imports the app, so the heavy modules are
+# loaded once and shared copy-on-write by every forked worker. Only imports run
+# here: BLAS/OpenMP thread pools must not be started before the fork.
+if os.environ.get("GUNICORN_PRELOAD", "0") == "1":
+    preload_modules()
 
 app = FastAPI()
 
+# yfinance by default; local bar archives for offline replays (see sources.py)
+source = sources.create_source()
+
+# Latest regime per symbol for /api/screener, shared by workers through a log
+regime_index = RegimeIndex(results.RESULT_DIR)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -21,51 +55,144 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ------------------------
+# Upstream failures
+# ------------------------
+# Bars the source cannot refresh are served stale when stored ones cover the
+# request (see bars.get_bars); these answer requests with nothing to fall back on.
+@app.exception_handler(BreakerOpen)
+async def upstream_circuit_open(request, exc: BreakerOpen):
+    return JSONResponse(status_code=503, content={"detail": str(exc)},
+                        headers={"Retry-After": str(int(exc.retry_after))})
+
+@app.exception_handler(TimeoutError)
+async def upstream_timeout(request, exc: TimeoutError):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+def stale_headers(*datas):
+    # Marks a response built from bars the source could not refresh
+    stale = [d for d in datas if d is not None and d.stale]
+    if not stale:
+        return {}
+    return {"X-Data-Stale": "true", "X-Data-Age": str(int(time.time() - min(d.fetched_at for d in stale)))}
+
 @app.get("/api/hmmplot")
 def get_plot(
     symbol: str = Query(default="SPY"),
     interval: str = Query(default = "1d"),
-    start: str = Query(default = "2021-01-01")
+    start: str = Query(default = "2021-01-01"),
+    since: Optional[str] = Query(default=None, description="Bar timestamp the client already has (ISO or epoch seconds); returns a delta"),
+    if_none_match: Optional[str] = Header(default=None),
+    accept_encoding: Optional[str] = Header(default=None),
 ):
     print("API /api/hmmplot HIT!")
-    # df = pd.read_csv("temp_data.csv", index_col = 'Date', parse_dates = ['Date'])
-    df = init_historical_data(symbol, interval, start)
-    df = clean_data(df)
-    df = init_tech_indicators(df)    
-    df = init_savgol_filter(df)
-    df = init_hmm(df, 'SG_Close')
-    fig, regime_stats, curr_regime = plot_hmm(df)
+    # Local archives (e.g. temp_data.csv) are served with HMM_DATA_SOURCE=files, see sources.py
+    results.record_request(symbol, interval, start)
+    data = load_bars(symbol, interval, start)
+    if data is None or len(data.ts) == 0:
+        raise HTTPException(status_code=404, detail=f"No data for {symbol}")
+    key = results.result_key(symbol, interval, start)
+    fp = results.fingerprint(data)
+    # The ETag is known from the bars alone, so an unchanged plot costs no fit
+    # and no body, even when the stored result has been evicted
+    etag = results.etag(key, fp)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding", **stale_headers(data)}
+    if results.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if since is not None:
+        try:
+            since_ts = parse_cursor(since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        body = regime_delta(symbol, interval, start, data, since_ts)
+        return Response(content=body, media_type="application/json", headers=headers)
+    return stored_response(key, fp, lambda: regime_body(symbol, interval, start, data), accept_encoding, headers)
+
+def stored_response(key, fp, compute, accept_encoding, headers):
+    # Serves the stored compressed copy the client accepts, straight from disk;
+    # computes (and stores) the result first when there is none yet
+    coding = compressed.choose(accept_encoding)
+    body = results.load_encoded(key, fp, coding)
+    if body is None:
+        body = compute()
+        encoded = results.load_encoded(key, fp, coding)
+        if encoded is not None:
+            body = encoded
+        else:
+            coding = None
+    if coding is not None:
+        headers["Content-Encoding"] = coding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def regime_result(symbol, interval, start, fresh_after=None):
+    # Precomputes (scheduler.py) want current bars, never stale ones
+    data = load_bars(symbol, interval, start, fresh_after, allow_stale=False)
+    if data is None or len(data.ts) == 0:
+        raise HTTPException(status_code=404, detail=f"No data for {symbol}")
+    return regime_body(symbol, interval, start, data)
+
+def regime_body(symbol, interval, start, data, on_iteration=None):
+    # Response body for one plot. Served from the shared result store when it
+    # was computed (usually by scheduler.py) from the bars currently stored;
+    # otherwise fitted here and stored for the other workers.
+    key = results.result_key(symbol, interval, start)
+    fp = results.fingerprint(data)
+    cached = results.load(key, fp)
+    if cached is not None:
+        return cached[1]
+
+    df, regime_labels = fit_regimes(bars.to_frame(data), on_iteration=on_iteration)
+    fig, regime_stats, curr_regime = plot_hmm(df, regime_labels=regime_labels)
     fig_json = fig.to_json()
     if fig_json is None:
         fig_json = "{}"
-    fig_dict = json.loads(fig_json)
-    
-    return JSONResponse(
-        content={
-            "figure": fig_dict, 
-            "regime_stats": regime_stats,
-            "curr_regime": curr_regime
-    })
+
+    # The figure JSON is spliced in as-is rather than parsed and re-encoded
+    body = ('{"figure": ' + fig_json
+            + ', "regime_stats": ' + json.dumps(regime_stats, allow_nan=False)
+            + ', "curr_regime": ' + json.dumps(curr_regime) + '}').encode()
+    # The plotted series and regime runs, for since= deltas; saved first so a
+    # body on disk always has its series
+    results.save_series(key, fp, plot_series(df, regime_labels, regime_stats, curr_regime))
+    results.save(key, fp, body, codings=compressed.CODINGS)
+    results.save(key + ".model", fp, json.dumps({**df.attrs["hmm"], "labels": forecast.regime_names(regime_labels)}).encode())
+    regime_index.publish(symbol, interval, start, regime_summary(df, regime_labels, regime_stats, time.time()))
+    return body
+
+def fit_regimes(df, kind="plot", on_iteration=None):
+    # Runs in one of this process's fit slots, so concurrent requests queue
+    # rather than oversubscribe the CPU budget
+    with budget.job(kind):
+        df = clean_data(df)
+        df = init_tech_indicators(df)
+        df = init_savgol_filter(df)
+        df = init_hmm(df, 'SG_Close', on_iteration=on_iteration)
+        return df, label_regimes(df)
+
+def load_bars(symbol, interval, start, fresh_after=None, allow_stale=True):
+    # Served from the shared bar store; only fetched from the source when no worker has it yet
+    start_ts = bars.start_timestamp(start)
+    data = bars.get_bars(symbol, interval, start_ts, fetch=source.fetch, fresh_after=fresh_after,
+                         allow_stale=allow_stale)
+    if data is None:
+        print("df returned None")
+        return None
+    return bars.slice_from(data, start_ts)
 
 def init_historical_data(symbol, interval, start):
-    start_dt = datetime.strptime(start, '%Y-%m-%d')
-    adj_start = start_dt - timedelta(200)
-    start_str = adj_start.strftime('%Y-%m-%d')  
+    import pandas as pd
 
-    df = yf.download(symbol, interval = interval, start=start_str) # incl - excl 
-    
-    if df is None:
+    data = load_bars(symbol, interval, start)
+    if data is None:
         # Return empty dataframe or raise error
-        print("df returned None")
         return pd.DataFrame()
 
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.droplevel(1)
-
-    return df
+    return bars.to_frame(data)
 
 # helper functions
 def clean_data(df):
+    import pandas as pd
+
     df = df.copy()
 
     df = df.dropna()
@@ -96,6 +223,8 @@ def init_tech_indicators(df):
     return df
 
 def init_savgol_filter(df, window_length = 15, polyorder = 3):
+    from scipy.signal import savgol_filter
+
     df = df.copy()
     # --- APPLY SAVGOL FILTER TO SMOOTH CLOSE PRICES ---
     df['SG_Close'] = savgol_filter(df['Close'], window_length=window_length, polyorder=polyorder) 
@@ -103,8 +232,12 @@ def init_savgol_filter(df, window_length = 15, polyorder = 3):
     return df
 
 
-def init_hmm(df, filter_type = "SG_Close"):
-    
+def init_hmm(df, filter_type = "SG_Close", on_iteration=None):
+    import numpy as np
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+    from hmmlearn import hmm
+
     df = df.copy()
     
     returns_smooth = df[filter_type].pct_change().dropna().values.reshape(-1, 1)
@@ -129,15 +262,30 @@ def init_hmm(df, filter_type = "SG_Close"):
         for i in range(3)
     ])
 
+    if on_iteration is not None:
+        # on_iteration(iteration, n_iter, log_likelihood) after every EM step (job progress)
+        report = model.monitor_.report
+
+        def reporting(log_prob):
+            report(log_prob)
+            on_iteration(model.monitor_.iter, model.n_iter, float(log_prob))
+
+        model.monitor_.report = reporting
+
     # Fit HMM model
     model.fit(returns_scaled)
 
     # Predict regimes
     regimes = model.predict(returns_scaled)
+    posteriors = model.predict_proba(returns_scaled)
 
     # Align with returns index after pct_change
     df = df.loc[df.index[1:]].copy()
     df['Regime'] = regimes
+    # Posterior probability of the predicted regime at each bar
+    df['Regime_Prob'] = posteriors[np.arange(len(regimes)), regimes]
+    # Fitted parameters ride along with the frame, for /api/hmmplot/forecast
+    df.attrs["hmm"] = forecast.model_params(model, scaler, posteriors, regimes)
     # Show regime counts
     # print("Regime Count:")
     # print(df.shape)
@@ -146,10 +294,8 @@ def init_hmm(df, filter_type = "SG_Close"):
 
     return df
 
-def plot_hmm(df, filter_type="SG_Close"):
-    
-    if filter_type not in df.columns:
-        raise ValueError(f"{filter_type} column missing. Ensure it's present before plotting.")
+def label_regimes(df):
+    import numpy as np
 
     # Compute mean returns for each regime
     regime_sym = {}
@@ -174,6 +320,16 @@ def plot_hmm(df, filter_type="SG_Close"):
     # Assign labels in order
     labels = [('Bearish', 'Red'), ('Neutral', 'Blue'), ('Bullish', 'Green')]
     regime_labels = {regime: label for (regime, _), label in zip(sorted_regimes, labels)}
+    return regime_labels
+
+def plot_hmm(df, filter_type="SG_Close", regime_labels=None):
+    import plotly.graph_objects as go
+
+    if filter_type not in df.columns:
+        raise ValueError(f"{filter_type} column missing. Ensure it's present before plotting.")
+
+    if regime_labels is None:
+        regime_labels = label_regimes(df)
 
     # print(regime_labels)
     curr_regime = regime_labels[df['Regime'].iloc[-1]][0]
@@ -206,37 +362,38 @@ def plot_hmm(df, filter_type="SG_Close"):
         opacity=0.6
     ))
 
-    # Add vrects for regime segments (no annotations)
+    # Add vrects for regime segments (no annotations). Built as plain shape
+    # dicts and set in one call: add_vrect re-validates every existing shape,
+    # which is quadratic in the number of regime switches.
+    shapes = []
+    def add_segment(start_idx, end_idx, regime):
+        shapes.append(dict(
+            type="rect",
+            xref="x",
+            yref="y domain",
+            x0=df.index[start_idx],
+            x1=df.index[end_idx] + timedelta(days=1),  # fix gap
+            y0=0,
+            y1=1,
+            fillcolor=regime_labels[regime][1].lower(),
+            opacity=0.3,
+            layer="below",
+            line_width=0,
+        ))
+
     current_regime = None
     start_idx = None
     for i, regime in enumerate(df['Regime']):
         if regime != current_regime:
             if current_regime is not None:
-                start_date = df.index[start_idx]
-                end_date = df.index[i - 1] + timedelta(days=1)  # fix gap
-                fig.add_vrect(
-                    x0=start_date,
-                    x1=end_date,
-                    fillcolor=regime_labels[current_regime][1].lower(),
-                    opacity=0.3,
-                    layer="below",
-                    line_width=0,
-                )
+                add_segment(start_idx, i - 1, current_regime)
             current_regime = regime
             start_idx = i
 
     # Last segment
     if current_regime is not None and start_idx is not None:
-        start_date = df.index[start_idx]
-        end_date = df.index[-1] + timedelta(days=1)  # fix gap
-        fig.add_vrect(
-            x0=start_date,
-            x1=end_date,
-            fillcolor=regime_labels[current_regime][1].lower(),
-            opacity=0.3,
-            layer="below",
-            line_width=0,
-        )
+        add_segment(start_idx, len(df) - 1, current_regime)
+    fig.update_layout(shapes=shapes)
 
 
     # Add dummy traces for regime legend entries
@@ -268,16 +425,554 @@ def plot_hmm(df, filter_type="SG_Close"):
         )
     )
 
+    regime_stats = segment_stats(df, regime_labels)
+    # print("Label -> (Mean Time Span, # of Segments)")
+    print(regime_stats)
+
+    return fig, regime_stats, curr_regime
+
+def segment_stats(df, regime_labels):
     df = df.copy()
     df['Segment'] = (df['Regime'] != df['Regime'].shift()).cumsum()
     segment_lengths = df.groupby(['Segment', 'Regime']).size().reset_index(name='Length')
-    
+
     regime_stats = {}
     for regime, (label, color) in regime_labels.items():
         seg_length = segment_lengths[segment_lengths['Regime'] == regime]['Length']
-        regime_stats[label] = (seg_length.mean(), len(seg_length))
-    # print("Label -> (Mean Time Span, # of Segments)")
-    print(regime_stats)
-
-    return fig, regime_stats, curr_regime
-
+        # No runs of a regime: a null mean, as JSON has no NaN
+        regime_stats[label] = (float(seg_length.mean()) if len(seg_length) else None, len(seg_length))
+    return regime_stats
+
+
+# ------------------------
+# Deltas
+# ------------------------
+# /api/hmmplot?since=<last bar the client has> returns the bars from the
+# cursor on (the cursor bar included, as a forming bar is revised in place)
+# and the regime runs from wherever the labelling changed. A refit can
+# relabel history, so the labelling the client saw (found by its last bar in
+# the series history, see results.save_series) is compared run by run with
+# the current one; when that version is no longer known every run is sent.
+# Clients replace their runs that end at or after runs_from.
+def plot_series(df, regime_labels, regime_stats, curr_regime):
+    import numpy as np
+
+    ts = ((df.index - datetime(1970, 1, 1)) // timedelta(seconds=1)).to_numpy()
+    regimes = df['Regime'].to_numpy()
+    starts = np.concatenate([[0], np.flatnonzero(regimes[1:] != regimes[:-1]) + 1])
+    ends = np.concatenate([starts[1:] - 1, [len(regimes) - 1]])
+    runs = [[int(ts[a]), int(ts[b]), *regime_labels[regimes[a]]] for a, b in zip(starts, ends)]
+    return {
+        "ts": ts.tolist(),
+        "close": df['Close'].round(4).tolist(),
+        "avg50": df['Avg50'].round(4).tolist(),
+        "avg200": df['Avg200'].round(4).tolist(),
+        "runs": runs,
+        "regime_stats": regime_stats,
+        "curr_regime": curr_regime,
+    }
+
+def parse_cursor(since: str) -> float:
+    import pandas as pd
+
+    try:
+        return float(since)
+    except ValueError:
+        pass
+    try:
+        cursor = pd.Timestamp(since)
+    except ValueError:
+        raise ValueError(f"since must be an ISO timestamp or epoch seconds, got {since!r}")
+    if cursor.tzinfo is not None:
+        cursor = cursor.tz_localize(None)
+    return (cursor - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)
+
+def regime_delta(symbol, interval, start, data, since_ts):
+    import bisect
+
+    key = results.result_key(symbol, interval, start)
+    fp = results.fingerprint(data)
+    series = results.load_series(key, fp)
+    if series is None:
+        # Stored by regime_body with every fit
+        regime_body(symbol, interval, start, data)
+        series = results.load_series(key, fp)
+    ts, runs = series["ts"], series["runs"]
+
+    runs_from = changed_at = ts[0]
+    versions = series["history"] + [{"as_of": ts[-1], "runs": runs}]
+    seen = [v["runs"] for v in versions if v["as_of"] == since_ts]
+    if seen:
+        previous = seen[-1]
+        k = 0
+        while k < min(len(runs), len(previous)) and runs[k] == previous[k]:
+            k += 1
+        if k == len(runs):
+            runs_from = changed_at = ts[-1]
+        else:
+            runs_from = changed_at = runs[k][0]
+            if k < len(previous) and runs[k][0] == previous[k][0] and runs[k][2] == previous[k][2]:
+                # Same run, only its end moved: labels change after the shorter end
+                j = bisect.bisect_right(ts, min(runs[k][1], previous[k][1]))
+                changed_at = ts[min(j, len(ts) - 1)]
+        runs_from = min(runs_from, since_ts)
+    i = bisect.bisect_left(ts, since_ts)
+
+    iso = lambda t: (datetime(1970, 1, 1) + timedelta(seconds=t)).isoformat()
+    payload = {
+        "since": iso(since_ts),
+        "as_of": iso(ts[-1]),
+        "runs_from": iso(runs_from),
+        "relabelled": changed_at < since_ts,
+        "timestamps": [iso(t) for t in ts[i:]],
+        "close": series["close"][i:],
+        "avg50": series["avg50"][i:],
+        "avg200": series["avg200"][i:],
+        "runs": [[iso(a), iso(b), name, color] for a, b, name, color in runs if b >= runs_from],
+        "regime_stats": series["regime_stats"],
+        "curr_regime": series["curr_regime"],
+    }
+    return json.dumps(payload).encode()
+
+
+# ------------------------
+# Multi-timeframe
+# ------------------------
+# One download at the finest requested interval, resampled to the coarser ones
+# and fitted in parallel, instead of one full pipeline per interval. Yahoo only
+# serves short intraday histories, so a coarser interval whose resampled series
+# is too short for the 200-bar indicators falls back to its own bars.
+MIN_FIT_BARS = 260
+MULTI_INTERVALS = [i for i in bars.RESAMPLE_RULES if i != "60m"]
+
+@app.get("/api/hmmplot/multi")
+def get_multi_plot(
+    symbol: str = Query(default="SPY"),
+    intervals: str = Query(default="1d,1h,15m", description="Comma separated, e.g. 1d,1h,15m"),
+    start: str = Query(default="2021-01-01"),
+    accept_encoding: Optional[str] = Header(default=None),
+):
+    requested = {i.strip() for i in intervals.split(",") if i.strip()}
+    if not requested or not requested <= set(MULTI_INTERVALS):
+        raise HTTPException(status_code=400, detail=f"intervals must be among {', '.join(MULTI_INTERVALS)}")
+    requested = sorted(requested, key=bars.INTERVAL_SECONDS.get)
+    key, fp, body, stale = multi_regime_result(symbol, requested, start)
+    return stored_response(key, fp, lambda: body, accept_encoding, {"Vary": "Accept-Encoding", **stale})
+
+def multi_regime_result(symbol, intervals, start):
+    from concurrent.futures import ThreadPoolExecutor
+    import pandas as pd
+
+    base_interval = intervals[0]
+    base = load_bars(symbol, base_interval, start)
+    if base is None or len(base.ts) == 0:
+        raise HTTPException(status_code=404, detail=f"No data for {symbol}")
+
+    base_df = bars.to_frame(base)
+    frames, sources, fingerprints = {base_interval: base_df}, {base_interval: "downloaded"}, [results.fingerprint(base)]
+    loaded = [base]
+    for interval in intervals[1:]:
+        frame = bars.resample_frame(base_df, interval)
+        sources[interval] = "resampled"
+        if len(frame) < MIN_FIT_BARS:
+            own = load_bars(symbol, interval, start)
+            if own is not None and len(own.ts) > len(frame):
+                frame = bars.to_frame(own)
+                sources[interval] = "downloaded"
+                fingerprints.append(results.fingerprint(own))
+                loaded.append(own)
+        frames[interval] = frame
+
+    key = results.result_key(symbol, "multi-" + "-".join(intervals), start)
+    fp = "|".join(fingerprints)
+    stale = stale_headers(*loaded)
+    cached = results.load(key, fp)
+    if cached is not None:
+        return key, fp, cached[1], stale
+
+    def fit(interval):
+        df, regime_labels = fit_regimes(frames[interval], kind="multi")
+        names = df['Regime'].map(lambda r: regime_labels[r][0])
+        return interval, df, names, segment_stats(df, regime_labels)
+
+    usable_intervals = [i for i in intervals if len(frames[i]) >= MIN_FIT_BARS]
+    with ThreadPoolExecutor(max_workers=max(1, len(usable_intervals))) as pool:
+        fitted = list(pool.map(fit, usable_intervals))
+
+    # Every track is laid on the finest fitted timeline; a coarser regime holds
+    # until its next bar starts
+    axis = fitted[0][1].index if fitted else pd.DatetimeIndex([])
+    payload = {
+        "symbol": symbol.upper(),
+        "start": start,
+        "base_interval": base_interval,
+        "timestamps": [ts.isoformat() for ts in axis],
+        "close": fitted[0][1]['Close'].round(4).tolist() if fitted else [],
+        "intervals": {},
+        "tracks": {},
+    }
+    for interval in intervals:
+        payload["intervals"][interval] = {"source": sources[interval], "bars": len(frames[interval])}
+    for interval, df, names, regime_stats in fitted:
+        aligned = names.reindex(axis, method="ffill")
+        payload["tracks"][interval] = [n if isinstance(n, str) else None for n in aligned]
+        payload["intervals"][interval].update(curr_regime=names.iloc[-1], regime_stats=regime_stats)
+    for interval in intervals:
+        if interval not in payload["tracks"]:
+            payload["intervals"][interval]["error"] = f"fewer than {MIN_FIT_BARS} bars"
+
+    body = json.dumps(payload).encode()
+    results.save(key, fp, body, codings=compressed.CODINGS)
+    return key, fp, body, stale
+
+
+# ------------------------
+# Jobs
+# ------------------------
+# Fits too long for a request (intraday bars over long ranges, many symbols)
+# run as jobs in jobworker.py processes off a durable SQLite queue (see
+# jobs.py). Submitting returns the job at once; clients poll it or subscribe
+# to /events for progress, then fetch each symbol's stored plot body from
+# /result. A submission whose every result is already current in the result
+# store is answered as done without queueing anything.
+MAX_JOB_SYMBOLS = int(os.environ.get("HMM_JOB_MAX_SYMBOLS", "100"))
+JOB_EVENT_POLL = float(os.environ.get("HMM_JOB_EVENT_POLL", "0.5"))
+
+def job_status(job):
+    status = {k: job[k] for k in ("id", "status", "symbols", "interval", "start", "progress", "error",
+                                   "attempts", "created_at", "started_at", "finished_at")}
+    if job["status"] == jobs.QUEUED:
+        status["queued_ahead"] = jobs.queued_ahead(job)
+    status["results"] = {
+        symbol: {**{k: v for k, v in entry.items() if k not in ("key", "fingerprint")},
+                 **({"url": f"/api/jobs/{job['id']}/result?symbol={urllib.parse.quote(symbol, safe='')}"}
+                    if entry["status"] == jobs.DONE else {})}
+        for symbol, entry in (job["results"] or {}).items()
+    }
+    return status
+
+def stored_results(tickers, interval, start):
+    # Every symbol's current result, if all are already stored for the bars in
+    # the bar store; None as soon as one would need a download or a fit
+    start_ts = bars.start_timestamp(start)
+    stored = {}
+    for symbol in tickers:
+        data = bars.read_bars(symbol, interval)
+        if not bars.usable(data, start_ts, interval):
+            return None
+        data = bars.slice_from(data, start_ts)
+        key, fp = results.result_key(symbol, interval, start), results.fingerprint(data)
+        if len(data.ts) == 0 or results.load(key, fp) is None:
+            return None
+        stored[symbol] = {"status": jobs.DONE, "key": key, "fingerprint": fp, "bars": len(data.ts)}
+    return stored
+
+def find_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/jobs", status_code=202)
+def submit_job(
+    symbols: str = Query(default="SPY", description="Comma separated tickers"),
+    interval: str = Query(default="1d"),
+    start: str = Query(default="2021-01-01"),
+):
+    tickers = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    if not tickers or len(tickers) > MAX_JOB_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"symbols must list 1 to {MAX_JOB_SYMBOLS} tickers")
+    if interval not in bars.INTERVAL_SECONDS:
+        raise HTTPException(status_code=400, detail=f"interval must be one of {', '.join(bars.INTERVAL_SECONDS)}")
+    try:
+        bars.start_timestamp(start)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for symbol in tickers:
+        results.record_request(symbol, interval, start)
+    return job_status(jobs.submit(tickers, interval, start, stored_results(tickers, interval, start)))
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    return job_status(find_job(job_id))
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    # Server-sent events: a "progress" event whenever the job changes, then
+    # "end" once it has finished. Polls the queue, never the worker.
+    job = await run_in_threadpool(find_job, job_id)
+
+    async def stream():
+        nonlocal job
+        last, idle = None, 0.0
+        while True:
+            status = await run_in_threadpool(job_status, job)
+            payload = json.dumps(status)
+            if payload != last:
+                yield f"event: progress\ndata: {payload}\n\n"
+                last, idle = payload, 0.0
+            elif idle >= 15:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            if job["status"] not in jobs.ACTIVE:
+                yield f"event: end\ndata: {json.dumps({'status': job['status']})}\n\n"
+                return
+            await asyncio.sleep(JOB_EVENT_POLL)
+            idle += JOB_EVENT_POLL
+            job = await run_in_threadpool(jobs.get, job_id) or {**job, "status": jobs.CANCELLED}
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/jobs/{job_id}/result")
+def get_job_result(
+    job_id: str,
+    symbol: str = Query(...),
+    accept_encoding: Optional[str] = Header(default=None),
+):
+    # The stored /api/hmmplot body of one of the job's symbols
+    job = find_job(job_id)
+    entry = (job["results"] or {}).get(symbol.upper())
+    if entry is None:
+        if job["status"] in jobs.ACTIVE:
+            raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+        raise HTTPException(status_code=404, detail=f"{symbol.upper()} is not part of this job's results")
+    if entry["status"] != jobs.DONE:
+        raise HTTPException(status_code=422, detail=entry.get("error") or f"{symbol.upper()} was not fitted")
+    key, fp = entry["key"], entry["fingerprint"]
+
+    def newer():
+        # Replaced by a fit on newer bars: that one is served instead
+        cached = results.load(key)
+        if cached is None:
+            raise HTTPException(status_code=410, detail="Result expired, submit the job again")
+        headers["ETag"] = results.etag(key, cached[0].get("fingerprint", ""))
+        return cached[1]
+
+    headers = {"ETag": results.etag(key, fp), "Vary": "Accept-Encoding"}
+    return stored_response(key, fp, newer, accept_encoding, headers)
+
+@app.delete("/api/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = find_job(job_id)
+    if not jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return job_status(jobs.get(job_id))
+
+
+# ------------------------
+# Forecasts
+# ------------------------
+# Monte Carlo regime and return paths from the model stored with each fit
+# (see forecast.py). A batch only uses stored models, usually precomputed by
+# scheduler.py, and lists symbols without one as unfitted; a single-symbol
+# request fits on a miss, as /api/hmmplot does.
+MAX_FORECAST_SYMBOLS = int(os.environ.get("HMM_FORECAST_MAX_SYMBOLS", "500"))
+
+@app.get("/api/hmmplot/forecast")
+def get_forecast(
+    symbols: str = Query(default="SPY", description="Comma separated tickers"),
+    interval: str = Query(default="1d"),
+    start: str = Query(default="2021-01-01"),
+    paths: int = Query(default=10000, ge=100, le=100000),
+    horizon: int = Query(default=60, ge=1, le=500, description="Bars ahead"),
+    seed: int = Query(default=0, ge=0),
+    quantiles: str = Query(default="0.05,0.25,0.5,0.75,0.95"),
+):
+    tickers = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    if not tickers or len(tickers) > MAX_FORECAST_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"symbols must list 1 to {MAX_FORECAST_SYMBOLS} tickers")
+    try:
+        qs = forecast.parse_quantiles(quantiles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    found, unfitted, missing, unavailable = {}, [], [], []
+    for symbol in tickers:
+        try:
+            data = load_bars(symbol, interval, start)
+        except (BreakerOpen, TimeoutError):
+            # No stored bars and no reachable source: the batch goes on without it
+            if len(tickers) == 1:
+                raise
+            unavailable.append(symbol)
+            continue
+        if data is None or len(data.ts) == 0:
+            missing.append(symbol)
+            continue
+        key = results.result_key(symbol, interval, start)
+        fp = results.fingerprint(data)
+        stored = results.load(key + ".model", fp)
+        if stored is None and len(tickers) == 1:
+            regime_body(symbol, interval, start, data)
+            stored = results.load(key + ".model", fp)
+        if stored is None:
+            unfitted.append(symbol)
+            continue
+        params = json.loads(stored[1])
+        found[symbol] = {
+            "as_of": bars.format_date(float(data.ts[-1])),
+            "stale": bool(data.stale),
+            **forecast.forecast(params, params["labels"], symbol, paths, horizon, seed, qs),
+        }
+    if not found and len(tickers) == 1:
+        raise HTTPException(status_code=404, detail=f"No data for {tickers[0]}")
+    payload = {"interval": interval, "start": start, "paths": paths, "horizon": horizon, "seed": seed,
+               "symbols": found, "unfitted": unfitted, "missing": missing, "unavailable": unavailable}
+    return Response(content=json.dumps(payload).encode(), media_type="application/json")
+
+
+# ------------------------
+# Indicators
+# ------------------------
+# Indicator series for the charts, from the same shared bar store as the
+# regime fits. Memoized per (symbol, interval, indicator, params) in each
+# worker and extended bar by bar as the store is refreshed (see indicators.py).
+indicator_cache = indicators.IndicatorCache(int(os.environ.get("HMM_INDICATOR_CACHE_SIZE", "512")))
+MAX_INDICATOR_SYMBOLS = int(os.environ.get("HMM_INDICATOR_MAX_SYMBOLS", "50"))
+
+@app.get("/api/indicators")
+def get_indicators(
+    symbols: str = Query(default="SPY", description="Comma separated tickers"),
+    interval: str = Query(default="1d"),
+    start: str = Query(default="2021-01-01"),
+    indicators_: str = Query(default="sma:50,sma:200", alias="indicators",
+                             description="Comma separated, e.g. sma:50,ema:20,rsi:14,atr:14,bb:20:2,sg:15:3"),
+):
+    from concurrent.futures import ThreadPoolExecutor
+
+    tickers = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    if not tickers or len(tickers) > MAX_INDICATOR_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"symbols must list 1 to {MAX_INDICATOR_SYMBOLS} tickers")
+    try:
+        specs = list(dict.fromkeys(indicators.parse_spec(spec) for spec in indicators_.split(",") if spec.strip()))
+        from_ts = bars.start_timestamp(start, 0)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not specs:
+        raise HTTPException(status_code=400, detail="indicators must name at least one indicator")
+
+    # Enough history before start for the longest window to warm up
+    lookback = max(200, 2 * max(params[0] for _, params in specs))
+    start_ts = bars.start_timestamp(start, lookback)
+
+    def one(symbol):
+        try:
+            data = bars.get_bars(symbol, interval, start_ts, fetch=source.fetch, allow_stale=True)
+        except (BreakerOpen, TimeoutError) as e:
+            return symbol, e
+        if data is None or len(data.ts) == 0:
+            return symbol, None
+        series = indicators.indicator_series(indicator_cache, symbol, interval, data, specs, from_ts)
+        if data.stale:
+            stale.append(symbol)
+        return symbol, series
+
+    stale = []
+    with ThreadPoolExecutor(max_workers=min(8, len(tickers))) as pool:
+        computed = dict(pool.map(one, tickers))
+    unavailable = [symbol for symbol, series in computed.items() if isinstance(series, Exception)]
+    found = {symbol: series for symbol, series in computed.items()
+             if series is not None and symbol not in unavailable}
+    if not found:
+        if unavailable:
+            raise computed[unavailable[0]]
+        raise HTTPException(status_code=404, detail=f"No data for {', '.join(tickers)}")
+    payload = {
+        "interval": interval,
+        "start": start,
+        "indicators": [indicators.series_name(name, params) for name, params in specs],
+        "symbols": found,
+        "missing": [symbol for symbol in tickers if symbol not in found and symbol not in unavailable],
+        "unavailable": unavailable,
+        "stale": sorted(stale),
+    }
+    return Response(content=json.dumps(payload).encode(), media_type="application/json")
+
+
+# ------------------------
+# Screener
+# ------------------------
+# Answers "which symbols just switched regime" from the in-memory regime index
+# (regime_index.py) instead of one /api/hmmplot call per symbol. Entries come
+# from completed fits, so the universe is whatever scheduler.py precomputes.
+@app.get("/api/screener")
+def screener(
+    interval: str = Query(default="1d"),
+    start: str = Query(default="2021-01-01"),
+    regime: Optional[str] = Query(default=None, description="Bearish, Neutral or Bullish"),
+    previous_regime: Optional[str] = Query(default=None),
+    max_bars_in_regime: Optional[int] = Query(default=None, ge=1, description="e.g. 3 for switched in the last 3 bars"),
+    min_probability: Optional[float] = Query(default=None, ge=0, le=1),
+    symbols: Optional[str] = Query(default=None, description="Comma separated tickers"),
+    index: Optional[str] = Query(default=None, description="sp500, nd100 or djia"),
+    sort: str = Query(default="bars_in_regime"),
+    descending: bool = Query(default=False),
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    members = None
+    if symbols:
+        members = {s.strip().upper() for s in symbols.split(",") if s.strip()}
+    if index:
+        try:
+            index_set = universe.index_members(index)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Index members unavailable: {e}")
+        members = index_set if members is None else members & index_set
+    try:
+        return regime_index.screen(interval, start, regime=regime, previous_regime=previous_regime,
+                                   max_bars_in_regime=max_bars_in_regime, min_probability=min_probability,
+                                   symbols=members, sort=sort, descending=descending, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ------------------------
+# Readiness
+# ------------------------
+# /health answers as soon as the process is up; /ready turns 200 once this
+# worker has imported the heavy modules and run one small fit, so the first
+# real request does not pay for imports or BLAS/OpenMP pool start-up.
+readiness = {"modules": False, "model": False, "error": None}
+
+def warm_up():
+    import numpy as np
+    import pandas as pd
+
+    try:
+        preload_modules()
+        budget.apply()
+        readiness["modules"] = True
+        rng = np.random.default_rng(0)
+        index = pd.date_range("2020-01-01", periods=300, freq="D")
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(index))))
+        df = pd.DataFrame({"Close": close}, index=index)
+        init_hmm(init_savgol_filter(df), "SG_Close")
+        readiness["model"] = True
+    except Exception as e:
+        readiness["error"] = str(e)
+
+@app.on_event("startup")
+def start_warm_up():
+    # Runs in each worker after the fork
+    if os.environ.get("HMM_WARM_UP", "1") == "1":
+        threading.Thread(target=warm_up, name="hmm-warm-up", daemon=True).start()
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    is_ready = readiness["modules"] and readiness["model"]
+    return JSONResponse(status_code=200 if is_ready else 503,
+                        content={"ready": is_ready, **readiness})
+
+@app.get("/metrics")
+def metrics():
+    # Per worker: the CPU budget, native thread pools and per-kind fit usage,
+    # and the state of the market data circuit breaker
+    return {"pid": os.getpid(), "cpu_budget": budget.metrics(), "indicator_cache": indicator_cache.stats(),
+            "breakers": {sources.yahoo_breaker.name: sources.yahoo_breaker.metrics()}}
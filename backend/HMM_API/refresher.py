@@ -0,0 +1,53 @@
+# Refresher for the shared bar store (see bars.py).
+#
+# Keeps HMM_HOT_SYMBOLS x HMM_HOT_INTERVALS current in HMM_BAR_DIR so workers
+# never download them on the request path. Started by gunicorn (see
+# gunicorn.conf.py) or by hand with `python refresher.py`; an exclusive lock on
+# the bar directory makes any second copy exit immediately.
+import fcntl
+import os
+import sys
+import time
+
+import bars
+import sources
+
+REFRESH_SECONDS = float(os.environ.get("HMM_REFRESH_SECONDS", "300"))
+
+source = sources.create_source()
+
+
+def refresh_once():
+    hot_start_ts = bars.start_timestamp(bars.HOT_START, lookback_days=0)
+    for symbol in bars.HOT_SYMBOLS:
+        for interval in bars.HOT_INTERVALS:
+            try:
+                with bars.symbol_lock(symbol, interval):
+                    # Never shrink a history a worker has already extended further back
+                    current = bars.read_bars(symbol, interval)
+                    start_ts = min(hot_start_ts, current.requested_start) if current else hot_start_ts
+                    start = bars.format_date(start_ts)
+                    df = source.fetch(symbol, interval, start)
+                    if df is not None and not df.empty:
+                        bars.write_bars(symbol, interval, df, start_ts)
+            except Exception as e:
+                print(f"refresh {symbol} {interval} failed: {e}")
+
+
+def main():
+    os.makedirs(bars.BAR_DIR, exist_ok=True)
+    lock = open(os.path.join(bars.BAR_DIR, "refresher.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print("bar refresher already running")
+        sys.exit(0)
+
+    while True:
+        started = time.monotonic()
+        refresh_once()
+        time.sleep(max(0.0, REFRESH_SECONDS - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# In-memory index of the latest regime state per (symbol, interval, start).
+#
+# Whoever completes a fit (a worker or a scheduler.py pool process) appends one
+# JSON line to an append-only log in the result directory. Each worker tails
+# that log and keeps the newest entry per key in memory, so screens are plain
+# filters and sorts over a few thousand dicts and never touch the models.
+#
+# Once compact_bytes have been appended since the last snapshot, the worker
+# that notices compacts the log the same way as the Sentiment API's index:
+# under an exclusive lock it reads the rest of the log, writes the newest
+# entry per key to a JSON snapshot and truncates the log to a new generation
+# header line. Writers append under the same lock. A worker that finds a
+# different header reloads from the snapshot and reads on from there; the
+# snapshot also records where the old generation ended, in case the
+# truncation never happened.
+
+import fcntl
+import json
+import os
+import threading
+from typing import Dict, Iterable, Optional
+
+SORT_FIELDS = ["symbol", "regime", "bars_in_regime", "since", "probability", "as_of", "computed_at"]
+HEADER_PREFIX = b"generation "
+
+
+def new_header() -> bytes:
+    return HEADER_PREFIX + os.urandom(8).hex().encode() + b"\n"
+
+
+def read_header(f) -> bytes:
+    # b"" for a log written before generation headers
+    f.seek(0)
+    line = f.readline()
+    return line if line.startswith(HEADER_PREFIX) and line.endswith(b"\n") else b""
+
+
+def regime_summary(df, regime_labels, regime_stats, computed_at: float):
+    # Index entry for a fitted frame (Regime and Regime_Prob columns, see init_hmm)
+    regimes = df['Regime'].to_numpy()
+    last = regimes[-1]
+    switches = (regimes != last).nonzero()[0]
+    start_i = int(switches[-1]) + 1 if len(switches) else 0
+    return {
+        "regime": regime_labels[last][0],
+        "previous_regime": regime_labels[regimes[start_i - 1]][0] if start_i else None,
+        "since": df.index[start_i].isoformat(),
+        "bars_in_regime": len(regimes) - start_i,
+        "probability": round(float(df['Regime_Prob'].iloc[-1]), 4),
+        "as_of": df.index[-1].isoformat(),
+        "computed_at": computed_at,
+        "regime_stats": {
+            label: {"mean_span": round(span, 2) if span is not None else None, "segments": int(count)}
+            for label, (span, count) in regime_stats.items()
+        },
+    }
+
+
+class RegimeIndex:
+    def __init__(self, directory: str, compact_bytes: int = 4 * 1024 * 1024):
+        self.log_path = os.path.join(directory, "regimes.log")
+        self.snapshot_path = os.path.join(directory, "regimes.snapshot.json")
+        self.compact_bytes = compact_bytes
+        self.entries: Dict[tuple, dict] = {}
+        self.header: Optional[bytes] = None  # generation of the log the entries were read from
+        self.offset = 0
+        self.snapshot_offset = 0
+        self.log_stat = (0, 0)  # (size, mtime_ns) at the last sync
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.log_path):
+            self._load_snapshot(b"")
+
+    def publish(self, symbol: str, interval: str, start: str, summary: dict):
+        entry = {"symbol": symbol.upper(), "interval": interval, "start": start, **summary}
+        data = (json.dumps(entry) + "\n").encode()
+        # A single O_APPEND write under the log lock: concurrent writers cannot
+        # interleave lines and a compaction cannot truncate them away
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size == 0:
+                data = new_header() + data
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        self.sync()
+
+    def sync(self):
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        with self.lock:
+            if (st.st_size, st.st_mtime_ns) == self.log_stat:
+                return
+            self.log_stat = (st.st_size, st.st_mtime_ns)
+            with open(self.log_path, "rb") as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                self._catch_up(f)
+            if self.offset - self.snapshot_offset >= self.compact_bytes:
+                self._compact()
+
+    def _catch_up(self, f):
+        # Reads the lines added since the last read; f is the log, locked
+        header = read_header(f)
+        if header != self.header:
+            # Compacted (or first read): the snapshot holds everything before the header
+            self._load_snapshot(header)
+        f.seek(self.offset)
+        data = f.read()
+        # Stop at the last complete line; a partial one is read next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                self._add(json.loads(line))
+            except ValueError:
+                continue
+        self.offset += end
+
+    def _add(self, entry: dict):
+        key = (entry["symbol"], entry["interval"], entry["start"])
+        current = self.entries.get(key)
+        if current is None or entry["computed_at"] >= current["computed_at"]:
+            self.entries[key] = entry
+
+    def _compact(self):
+        with open(self.log_path, "r+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self._catch_up(f)
+            if self.offset - self.snapshot_offset < self.compact_bytes:
+                return  # another worker compacted first
+            header = new_header()
+            # Valid for the new generation and, should the truncation not happen,
+            # for the end of the current one
+            snap = {"positions": [(header.decode(), len(header)), (self.header.decode(), self.offset)],
+                    "entries": list(self.entries.values())}
+            tmp = f"{self.snapshot_path}.{os.getpid()}"
+            with open(tmp, "w") as out:
+                json.dump(snap, out)
+            os.replace(tmp, self.snapshot_path)
+            f.truncate(0)
+            f.seek(0)
+            f.write(header)
+            f.flush()
+            self.header = header
+            self.offset = self.snapshot_offset = len(header)
+
+    def _load_snapshot(self, header: bytes):
+        # Entries as of the last compaction, and where to read the log with this header from
+        self.entries = {}
+        self.header = header
+        self.offset = self.snapshot_offset = len(header)
+        if not os.path.exists(self.snapshot_path):
+            return
+        with open(self.snapshot_path) as f:
+            snap = json.load(f)
+        for entry in snap["entries"]:
+            self._add(entry)
+        # A log started after the snapshot was written is read from its start
+        positions = {g.encode(): offset for g, offset in snap["positions"]}
+        self.offset = self.snapshot_offset = positions.get(header, len(header))
+
+    def screen(self, interval: str, start: str, regime: Optional[str] = None,
+               previous_regime: Optional[str] = None, max_bars_in_regime: Optional[int] = None,
+               min_probability: Optional[float] = None, symbols: Optional[Iterable[str]] = None,
+               sort: str = "bars_in_regime", descending: bool = False, limit: int = 100):
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"cannot sort by {sort!r}, expected one of {', '.join(SORT_FIELDS)}")
+        self.sync()
+        symbols = {s.upper() for s in symbols} if symbols is not None else None
+        # Regime names are matched case-insensitively: ?regime=bullish finds Bullish
+        regime = regime.casefold() if regime is not None else None
+        previous_regime = previous_regime.casefold() if previous_regime is not None else None
+        with self.lock:
+            matches = [
+                e for (symbol, e_interval, e_start), e in self.entries.items()
+                if e_interval == interval and e_start == start
+                and (symbols is None or symbol in symbols)
+                and (regime is None or e["regime"].casefold() == regime)
+                and (previous_regime is None or (e["previous_regime"] is not None
+                                                 and e["previous_regime"].casefold() == previous_regime))
+                and (max_bars_in_regime is None or e["bars_in_regime"] <= max_bars_in_regime)
+                and (min_probability is None or e["probability"] >= min_probability)
+            ]
+        matches.sort(key=lambda e: e[sort], reverse=descending)
+        return {"count": len(matches), "results": matches[:limit]}
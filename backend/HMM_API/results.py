@@ -0,0 +1,164 @@
+# Shared store of computed /api/hmmplot responses.
+#
+# Each (symbol, interval, start) result is one file under HMM_RESULT_DIR: a
+# single JSON header line (data fingerprint, computed_at) followed by the exact
+# response body. A result is reused only while its fingerprint matches the
+# bars currently in the shared bar store, so the body can be served as stored
+# bytes without re-fitting or re-serializing. Files are replaced atomically, so
+# workers and the precompute scheduler can share them.
+#
+# Bodies served to browsers are also stored in each HMM_COMPRESS_CODINGS
+# coding ("<key>.json.<coding>", same header line; see compressed.py), so hot
+# responses are sent as stored bytes without re-encoding.
+#
+# Next to each body, a ".series" file keeps the plotted series and regime runs
+# for /api/hmmplot?since= deltas, with the runs of the last few fits so a
+# client's cursor can be matched to the labelling it last saw.
+#
+# Requests are also counted here (decayed, in SQLite) so the scheduler can
+# precompute the most requested keys first.
+
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+import compressed
+
+# On disk rather than tmpfs: a full universe of figures is too large to pin in RAM,
+# and the page cache keeps the frequently served ones hot anyway
+RESULT_DIR = os.environ.get("HMM_RESULT_DIR", "/tmp/hmm_results")
+# Bump when the pipeline changes in a way that changes its output
+MODEL_VERSION = "3"
+# Earlier labellings kept per key for since= deltas
+SERIES_HISTORY = int(os.environ.get("HMM_SERIES_HISTORY", "8"))
+REQUEST_HALF_LIFE = float(os.environ.get("HMM_REQUEST_HALF_LIFE", str(24 * 60 * 60)))
+
+_local = threading.local()
+
+
+def result_key(symbol: str, interval: str, start: str) -> str:
+    return f"{symbol.upper()}_{interval}_{start}"
+
+
+def fingerprint(bars) -> str:
+    if len(bars.ts) == 0:
+        return f"{MODEL_VERSION}:0"
+    return f"{MODEL_VERSION}:{len(bars.ts)}:{int(bars.ts[0])}:{int(bars.ts[-1])}:{float(bars.close[-1]):.6f}"
+
+
+def etag(key: str, fp: str) -> str:
+    # Strong validator: the fingerprint covers the bars and MODEL_VERSION
+    return '"' + hashlib.blake2b(f"{key}|{fp}".encode(), digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], current: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == current:
+            return True
+    return False
+
+
+def _path(key: str, coding: Optional[str] = None) -> str:
+    return os.path.join(RESULT_DIR, f"{key}.json" + (f".{coding}" if coding else ""))
+
+
+def load(key: str, expected_fingerprint: Optional[str] = None, coding: Optional[str] = None):
+    # Returns (header, body bytes), or None when missing or computed from other data
+    try:
+        with open(_path(key, coding), "rb") as f:
+            header = json.loads(f.readline())
+            if expected_fingerprint is not None and header.get("fingerprint") != expected_fingerprint:
+                return None
+            return header, f.read()
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save(key: str, fp: str, body: bytes, codings: Iterable[str] = (), **extra):
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    header = json.dumps({"fingerprint": fp, "computed_at": time.time(), **extra}).encode() + b"\n"
+    # Compressed copies first, so a body on disk always has its current variants
+    if len(body) >= compressed.MIN_BYTES:
+        for coding in codings:
+            _write(_path(key, coding), header, compressed.compress(body, coding))
+    _write(_path(key), header, body)
+
+
+def _write(path: str, header: bytes, body: bytes):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(body)
+    os.replace(tmp, path)
+
+
+def load_encoded(key: str, fp: str, coding: Optional[str]):
+    # Stored body in the given coding, or None (identity requested, body too
+    # small to compress, or stored before the coding was enabled)
+    if coding is None:
+        return None
+    stored = load(key, fp, coding)
+    return stored[1] if stored is not None else None
+
+
+def save_series(key: str, fp: str, series: dict):
+    # Carries the previous fit's runs into the history, keyed by its last bar
+    previous = load(key + ".series")
+    history = []
+    if previous is not None:
+        old = json.loads(previous[1])
+        history = old.get("history", []) + [{"as_of": old["ts"][-1], "runs": old["runs"]}]
+    series = {**series, "history": history[-SERIES_HISTORY:]}
+    save(key + ".series", fp, json.dumps(series).encode())
+
+
+def load_series(key: str, fp: str) -> Optional[dict]:
+    stored = load(key + ".series", fp)
+    return json.loads(stored[1]) if stored is not None else None
+
+
+# ------------------------
+# Request frequency
+# ------------------------
+def _conn():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(RESULT_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(RESULT_DIR, "requests.db"), timeout=5.0, isolation_level=None)
+        conn.execute("pragma journal_mode=wal")
+        conn.execute(
+            "create table if not exists requests ("
+            "symbol text, interval text, start text, score real, updated real, "
+            "primary key (symbol, interval, start))")
+        _local.conn = conn
+    return conn
+
+
+def record_request(symbol: str, interval: str, start: str):
+    now = time.time()
+    decay = math.log(2) / REQUEST_HALF_LIFE
+    try:
+        _conn().execute(
+            "insert into requests (symbol, interval, start, score, updated) values (?, ?, ?, 1, ?) "
+            "on conflict (symbol, interval, start) do update set "
+            "score = score * exp(-(? - updated) * ?) + 1, updated = ?",
+            (symbol.upper(), interval, start, now, now, decay, now))
+    except sqlite3.Error as e:
+        # Counting is best effort; never fail a plot request over it
+        print(f"request count failed: {e}")
+
+
+def request_scores():
+    # {(symbol, interval, start): decayed request count as of now}
+    now = time.time()
+    decay = math.log(2) / REQUEST_HALF_LIFE
+    rows = _conn().execute("select symbol, interval, start, score, updated from requests").fetchall()
+    return {(s, i, st): score * math.exp(-(now - updated) * decay) for s, i, st, score, updated in rows}
@@ -0,0 +1,149 @@
+# Precompute scheduler for /api/hmmplot (see results.py).
+#
+# Fits regimes on bar-close boundaries instead of in the user's request: daily
+# intervals shortly after the US close, intraday intervals on each interval
+# tick during market hours. The universe is HMM_HOT_SYMBOLS, HMM_UNIVERSE and,
+# when Supabase is configured, every ticker in the watchlist, sp500_tickers,
+# nd100_tickers and djia_tickers tables. Jobs are ordered by recent request
+# frequency and run on a small, niced process pool; each one refreshes the
+# bars and stores the response body, which every worker then serves as-is.
+#
+# Intraday intervals are only precomputed for keys users actually request (the
+# HMM_PRECOMPUTE_INTRADAY_TOP most requested). Started by gunicorn (see
+# gunicorn.conf.py) or by hand with `python scheduler.py`; an exclusive lock
+# makes any second copy exit immediately.
+import fcntl
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from datetime import time as dtime
+from zoneinfo import ZoneInfo
+
+# Before bars imports numpy (see cpu_budget.py)
+import cpu_budget
+import bars
+import results
+import universe
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+DAY = 24 * 60 * 60
+
+INTERVALS = [i.strip() for i in os.environ.get("HMM_PRECOMPUTE_INTERVALS", "1d,1h").split(",") if i.strip()]
+START = os.environ.get("HMM_PRECOMPUTE_START", "2021-01-01")
+# Counted in the CPU budget's process split, so web workers leave room for these
+WORKERS = cpu_budget.precompute_workers()
+# yfinance needs a few minutes after a close before the final bar settles
+CLOSE_DELAY = float(os.environ.get("HMM_CLOSE_DELAY", "600"))
+INTRADAY_TOP = int(os.environ.get("HMM_PRECOMPUTE_INTRADAY_TOP", "50"))
+
+
+def load_universe():
+    symbols = set(bars.HOT_SYMBOLS)
+    symbols.update(s.strip().upper() for s in os.environ.get("HMM_UNIVERSE", "").split(",") if s.strip())
+    if not universe.configured():
+        return sorted(symbols)
+    try:
+        for table in universe.UNIVERSE_TABLES:
+            symbols.update(universe.table_tickers(table))
+    except Exception as e:
+        print(f"universe load failed, using configured symbols only: {e}")
+    return sorted(symbols)
+
+
+def next_boundary(interval: str, now: float) -> float:
+    # First bar close after now: the session close for daily and slower
+    # intervals, otherwise the next interval tick counted from the open.
+    # Exchange holidays are not skipped; those runs find unchanged bars and
+    # reuse the stored results.
+    step = bars.INTERVAL_SECONDS.get(interval, DAY)
+    day = datetime.fromtimestamp(now, MARKET_TZ).date()
+    while True:
+        if day.weekday() < 5:
+            open_ts = datetime.combine(day, MARKET_OPEN, MARKET_TZ).timestamp()
+            close_ts = datetime.combine(day, MARKET_CLOSE, MARKET_TZ).timestamp()
+            if step < DAY and now < close_ts:
+                tick = open_ts + (max(0.0, now - open_ts) // step + 1) * step
+                return min(tick, close_ts)
+            if now < close_ts:
+                return close_ts
+        day += timedelta(days=1)
+
+
+def plan_jobs(interval: str, symbols):
+    # [(symbol, start)], most requested first
+    scores = {}
+    for (symbol, requested_interval, start), score in results.request_scores().items():
+        if requested_interval == interval:
+            scores[(symbol, start)] = score
+    if bars.INTERVAL_SECONDS.get(interval, DAY) < DAY:
+        return sorted(scores, key=scores.get, reverse=True)[:INTRADAY_TOP]
+    for symbol in symbols:
+        scores.setdefault((symbol, START), 0.0)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def init_worker():
+    # Fits are background work; requests being served on this host come first
+    os.nice(10)
+    cpu_budget.budget.apply()
+
+
+def precompute(symbol: str, interval: str, start: str, fresh_after):
+    import main
+    main.regime_result(symbol, interval, start, fresh_after=fresh_after)
+
+
+def run_cycle(pool, interval: str, symbols, fresh_after=None):
+    jobs = plan_jobs(interval, symbols)
+    started = time.monotonic()
+    # The pool takes submissions in order, so the most requested run first
+    futures = {pool.submit(precompute, symbol, interval, start, fresh_after): symbol for symbol, start in jobs}
+    failed = 0
+    for future in as_completed(futures):
+        try:
+            future.result()
+        except Exception as e:
+            failed += 1
+            print(f"precompute {futures[future]} {interval} failed: {e}")
+    print(f"precomputed {len(jobs) - failed}/{len(jobs)} {interval} regimes in {time.monotonic() - started:.0f}s")
+
+
+def main():
+    os.makedirs(results.RESULT_DIR, exist_ok=True)
+    lock = open(os.path.join(results.RESULT_DIR, "scheduler.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print("precompute scheduler already running")
+        sys.exit(0)
+
+    # Let gunicorn's terminate() drop queued jobs rather than wait for them
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    symbols = load_universe()
+    pool = ProcessPoolExecutor(max_workers=WORKERS, initializer=init_worker)
+    try:
+        if os.environ.get("HMM_PRECOMPUTE_ON_START", "1") == "1":
+            # Fill a cold result store; anything already current is a cache hit
+            for interval in INTERVALS:
+                run_cycle(pool, interval, symbols)
+
+        due = {interval: next_boundary(interval, time.time()) for interval in INTERVALS}
+        while True:
+            interval = min(due, key=due.get)
+            boundary = due[interval]
+            time.sleep(max(0.0, boundary + CLOSE_DELAY - time.time()))
+            symbols = load_universe()
+            # Only bars fetched after the close contain the bar that just closed
+            run_cycle(pool, interval, symbols, fresh_after=boundary)
+            due[interval] = next_boundary(interval, max(time.time(), boundary + 1))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
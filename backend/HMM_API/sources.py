@@ -0,0 +1,197 @@
+# Bar sources behind the shared bar store (bars.get_bars).
+#
+# HMM_DATA_SOURCE selects where missing or stale histories come from:
+#
+#   yahoo  (default) yfinance downloads
+#   files  local archives in HMM_DATA_DIR, for deterministic replays, load
+#          tests and backtests without network access
+#
+# A file source looks for <SYMBOL>_<interval>.parquet, .csv or .npy (and bare
+# <SYMBOL>.<ext> for daily bars). Only the time column and OHLCV are read, rows
+# before the requested start (and after HMM_DATA_END, to replay "as of" a
+# date) are dropped, and files are read in CHUNK_ROWS batches so a long
+# intraday archive is never loaded whole. Parquet filters are pushed down to
+# row-group statistics; .npy files in the bar store's own layout are memory
+# mapped and sliced by binary search.
+#
+# Yahoo downloads go through a circuit breaker (see breaker.py) with a hard
+# HMM_YAHOO_DEADLINE, so a stalled yf.download cannot hold a worker (or the
+# symbol's download lock) indefinitely; while the breaker is open, fetches
+# fail fast with BreakerOpen and bars.get_bars serves stored bars marked stale.
+# yfinance reports HTTP errors as an empty frame, indistinguishable from an
+# unknown symbol, so only raised errors, deadline overruns and slow calls
+# count against it.
+
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+import bars
+from breaker import CircuitBreaker
+
+TIME_COLUMNS = ["Date", "Datetime", "date", "datetime", "timestamp", "ts"]
+CHUNK_ROWS = int(os.environ.get("HMM_DATA_CHUNK_ROWS", "65536"))
+EXTENSIONS = [".parquet", ".csv", ".npy"]
+
+
+def to_seconds(values) -> np.ndarray:
+    # Naive wall-clock epoch seconds, the bar store's time convention
+    import pandas as pd
+
+    index = pd.DatetimeIndex(pd.to_datetime(values))
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return ((index - pd.Timestamp("1970-01-01")) // pd.Timedelta(seconds=1)).to_numpy()
+
+
+YAHOO_DEADLINE = float(os.environ.get("HMM_YAHOO_DEADLINE", "45"))
+
+yahoo_breaker = CircuitBreaker(
+    "yfinance",
+    slow_seconds=float(os.environ.get("HMM_YAHOO_SLOW_SECONDS", "20")),
+    open_seconds=float(os.environ.get("HMM_YAHOO_OPEN_SECONDS", "30")),
+    shared_dir=bars.BAR_DIR,
+)
+
+
+class YahooSource:
+    name = "yahoo"
+
+    def fetch(self, symbol: str, interval: str, start: str):
+        return yahoo_breaker.call(bars.download, symbol, interval, start, deadline=YAHOO_DEADLINE)
+
+
+class FileSource:
+    name = "files"
+
+    def __init__(self, directory: str, end: Optional[str] = None):
+        self.directory = directory
+        self.end_ts = float(to_seconds([end])[0]) if end else None
+
+    def find(self, symbol: str, interval: str) -> Optional[str]:
+        names = [f"{symbol.upper()}_{interval}"] + ([symbol.upper()] if interval == "1d" else [])
+        for name in names:
+            for ext in EXTENSIONS:
+                path = os.path.join(self.directory, name + ext)
+                if os.path.exists(path):
+                    return path
+        return None
+
+    def fetch(self, symbol: str, interval: str, start: str):
+        import pandas as pd
+
+        path = self.find(symbol, interval)
+        if path is None:
+            print(f"no local bars for {symbol} {interval} in {self.directory}")
+            return pd.DataFrame()
+        start_ts = float(to_seconds([start])[0])
+        ext = os.path.splitext(path)[1]
+        if ext == ".npy":
+            ts, columns = self._read_npy(path, start_ts)
+        else:
+            read = self._read_parquet if ext == ".parquet" else self._read_csv
+            ts, columns = self._collect(read(path, start_ts), start_ts)
+        index = pd.to_datetime(ts.astype(np.int64), unit="s")
+        return pd.DataFrame(columns, index=index)
+
+    def _collect(self, chunks, start_ts: float):
+        # Keeps only in-range rows of each chunk, then joins the survivors
+        kept_ts, kept = [], {field: [] for field in bars.FIELDS}
+        for ts, columns in chunks:
+            mask = ts >= start_ts
+            if self.end_ts is not None:
+                mask &= ts <= self.end_ts
+            kept_ts.append(ts[mask])
+            for field in bars.FIELDS:
+                kept[field].append(columns[field][mask] if field in columns else np.full(mask.sum(), np.nan))
+        if not kept_ts:
+            return np.empty(0), {field: np.empty(0) for field in bars.FIELDS}
+        ts = np.concatenate(kept_ts)
+        order = np.argsort(ts, kind="stable")
+        return ts[order], {field: np.concatenate(v)[order] for field, v in kept.items()}
+
+    def _read_parquet(self, path: str, start_ts: float):
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(path, format="parquet")
+        time_col = time_column(dataset.schema.names)
+        columns = [time_col] + [f for f in bars.FIELDS if f in dataset.schema.names]
+        filters = self._pushdown(dataset.schema.field(time_col).type, time_col, start_ts)
+        for batch in dataset.to_batches(columns=columns, filter=filters, batch_size=CHUNK_ROWS):
+            ts = to_seconds(batch.column(time_col).to_pandas())
+            yield ts, {f: batch.column(f).to_numpy(zero_copy_only=False).astype(np.float64) for f in columns[1:]}
+
+    def _pushdown(self, arrow_type, time_col: str, start_ts: float):
+        # Filter expression for the time range, when the column type allows one
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        def scalar(ts):
+            value = datetime(1970, 1, 1) + timedelta(seconds=ts)
+            if pa.types.is_timestamp(arrow_type):
+                if arrow_type.tz is not None:
+                    # Stored as instants, not wall-clock; filtered after conversion instead
+                    return None
+                return pa.scalar(value, type=arrow_type)
+            if pa.types.is_date(arrow_type):
+                return pa.scalar(value.date(), type=arrow_type)
+            return None
+
+        low = scalar(start_ts)
+        if low is None:
+            return None
+        expr = ds.field(time_col) >= low
+        if self.end_ts is not None:
+            expr &= ds.field(time_col) <= scalar(self.end_ts)
+        return expr
+
+    def _read_csv(self, path: str, start_ts: float):
+        with open(path) as f:
+            header = [c.strip() for c in f.readline().split(",")]
+        time_col = time_column(header)
+        columns = [time_col] + [f for f in bars.FIELDS if f in header]
+        try:
+            import pyarrow.csv as pcsv
+        except ImportError:
+            pcsv = None
+
+        if pcsv is not None:
+            reader = pcsv.open_csv(
+                path,
+                read_options=pcsv.ReadOptions(block_size=CHUNK_ROWS * 128),
+                convert_options=pcsv.ConvertOptions(include_columns=columns),
+            )
+            for batch in reader:
+                ts = to_seconds(batch.column(time_col).to_pandas())
+                yield ts, {f: batch.column(f).to_numpy(zero_copy_only=False).astype(np.float64) for f in columns[1:]}
+        else:
+            import pandas as pd
+
+            for chunk in pd.read_csv(path, usecols=columns, chunksize=CHUNK_ROWS):
+                yield to_seconds(chunk[time_col]), {f: chunk[f].to_numpy(dtype=np.float64) for f in columns[1:]}
+
+    def _read_npy(self, path: str, start_ts: float):
+        # The bar store's own (6, n + 1) layout; only the sliced pages are read
+        arr = np.load(path, mmap_mode="r")
+        body = arr[:, 1:]
+        lo = int(np.searchsorted(body[0], start_ts, side="left"))
+        hi = int(np.searchsorted(body[0], self.end_ts, side="right")) if self.end_ts is not None else body.shape[1]
+        return np.array(body[0, lo:hi]), {f: np.array(body[row, lo:hi]) for row, f in enumerate(bars.FIELDS, start=1)}
+
+
+def time_column(names) -> str:
+    for name in TIME_COLUMNS:
+        if name in names:
+            return name
+    raise ValueError(f"no time column among {names}, expected one of {', '.join(TIME_COLUMNS)}")
+
+
+def create_source():
+    kind = os.environ.get("HMM_DATA_SOURCE", "yahoo")
+    if kind == "yahoo":
+        return YahooSource()
+    if kind == "files":
+        return FileSource(os.environ.get("HMM_DATA_DIR", "data"), end=os.environ.get("HMM_DATA_END"))
+    raise RuntimeError(f"unknown HMM_DATA_SOURCE {kind!r}, expected yahoo or files")
@@ -0,0 +1,58 @@
+# Ticker lists from Supabase (see backend/db/supabase-schema.sql).
+#
+# Used by the precompute scheduler to pick what to fit and by the screener to
+# restrict a screen to an index. Supabase is optional: without credentials
+# every list is empty and callers fall back to configured symbols.
+import os
+import threading
+import time
+
+INDEX_TABLES = {"sp500": "sp500_tickers", "nd100": "nd100_tickers", "djia": "djia_tickers"}
+UNIVERSE_TABLES = ["watchlist", *INDEX_TABLES.values()]
+TTL = float(os.environ.get("HMM_UNIVERSE_TTL", str(6 * 60 * 60)))
+
+_client = None
+_cache = {}  # table -> (loaded at, tickers)
+_lock = threading.Lock()
+
+
+def _supabase():
+    # Built on first use so a preloading gunicorn master never holds a client
+    global _client
+    if _client is None:
+        from supabase import create_client
+        url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
+        key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not key:
+            raise RuntimeError("Supabase environment variables not set")
+        _client = create_client(url, key)
+    return _client
+
+
+def configured() -> bool:
+    return bool(os.environ.get("NEXT_PUBLIC_SUPABASE_URL") and os.environ.get("SUPABASE_SERVICE_ROLE_KEY"))
+
+
+def table_tickers(table: str):
+    with _lock:
+        cached = _cache.get(table)
+        if cached and time.time() - cached[0] < TTL:
+            return cached[1]
+    tickers = set()
+    offset = 0
+    while True:
+        # PostgREST caps each response at 1000 rows
+        rows = _supabase().table(table).select("ticker").range(offset, offset + 999).execute().data or []
+        tickers.update(r["ticker"].strip().upper() for r in rows if r.get("ticker"))
+        if len(rows) < 1000:
+            break
+        offset += 1000
+    with _lock:
+        _cache[table] = (time.time(), tickers)
+    return tickers
+
+
+def index_members(name: str):
+    if name not in INDEX_TABLES:
+        raise ValueError(f"unknown index {name!r}, expected one of {', '.join(INDEX_TABLES)}")
+    return table_tickers(INDEX_TABLES[name])
@@ -0,0 +1,149 @@
+# API key authentication and per-key rate limiting.
+#
+# Keys are loaded once at startup and held only as SHA-256 digests. Each key
+# gets two token buckets: requests per minute and headlines per minute. Both
+# are checked before any inference or Supabase I/O. Buckets live in a SQLite
+# file by default so every gunicorn worker on the host shares the same counts;
+# an in-process store is used when no path is configured.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import Header, HTTPException
+
+from telemetry import stage
+
+
+def hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def load_key_hashes() -> Set[str]:
+    # SENTIMENT_API_KEY (legacy single key) and SENTIMENT_API_KEYS are plaintext,
+    # comma separated; SENTIMENT_API_KEY_HASHES holds pre-hashed sha256 hex digests
+    hashes = set()
+    plain = [os.environ.get("SENTIMENT_API_KEY", "")] + os.environ.get("SENTIMENT_API_KEYS", "").split(",")
+    hashes.update(hash_key(k.strip()) for k in plain if k.strip())
+    hashes.update(h.strip().lower() for h in os.environ.get("SENTIMENT_API_KEY_HASHES", "").split(",") if h.strip())
+    return hashes
+
+
+# ------------------------
+# Token bucket stores
+# ------------------------
+class MemoryBuckets:
+    def __init__(self):
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self.lock = threading.Lock()
+
+    def take(self, name: str, cost: float, rate: float, capacity: float) -> float:
+        # Returns 0 when the tokens were taken, otherwise seconds until they would be
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(name, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self.buckets[name] = (tokens - cost, now)
+                return 0.0
+            self.buckets[name] = (tokens, now)
+            return (cost - tokens) / rate
+
+
+class SqliteBuckets:
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        self._conn().execute(
+            "create table if not exists buckets (name text primary key, tokens real, updated real)")
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("pragma journal_mode=wal")
+            self.local.conn = conn
+        return conn
+
+    def take(self, name: str, cost: float, rate: float, capacity: float) -> float:
+        # Wall-clock time, since the monotonic clock is not shared between processes
+        now = time.time()
+        conn = self._conn()
+        conn.execute("begin immediate")
+        try:
+            row = conn.execute("select tokens, updated from buckets where name = ?", (name,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            conn.execute("insert or replace into buckets (name, tokens, updated) values (?, ?, ?)",
+                         (name, tokens, now))
+            conn.execute("commit")
+        except Exception:
+            conn.execute("rollback")
+            raise
+        return wait
+
+
+# ------------------------
+# Limiter
+# ------------------------
+class RateLimiter:
+    def __init__(self, buckets, requests_per_min: float, headlines_per_min: float):
+        self.buckets = buckets
+        self.requests_per_min = requests_per_min
+        self.headlines_per_min = headlines_per_min
+
+    def _take(self, name: str, cost: float, per_min: float, what: str):
+        if per_min <= 0:
+            return
+        if cost > per_min:
+            raise HTTPException(status_code=429, detail=f"{what} limit is {per_min:g} per minute")
+        wait = self.buckets.take(name, cost, per_min / 60.0, per_min)
+        if wait:
+            raise HTTPException(status_code=429, detail=f"{what} rate limit exceeded",
+                                headers={"Retry-After": str(int(wait) + 1)})
+
+    def take_request(self, key_id: str):
+        self._take(f"req:{key_id}", 1, self.requests_per_min, "Request")
+
+    def take_headlines(self, key_id: str, n: int):
+        self._take(f"hl:{key_id}", n, self.headlines_per_min, "Headline")
+
+
+def create_limiter() -> RateLimiter:
+    path = os.environ.get("SENTIMENT_RATE_LIMIT_DB", "/tmp/sentiment_ratelimit.db")
+    buckets = SqliteBuckets(path) if path else MemoryBuckets()
+    return RateLimiter(
+        buckets,
+        requests_per_min=float(os.environ.get("SENTIMENT_RATE_REQUESTS_PER_MIN", "120")),
+        headlines_per_min=float(os.environ.get("SENTIMENT_RATE_HEADLINES_PER_MIN", "5000")),
+    )
+
+
+VALID_KEY_HASHES = load_key_hashes()
+limiter: Optional[RateLimiter] = None
+
+
+def check_api_key(x_api_key: str = Header(...)) -> str:
+    # FastAPI dependency: returns a key id (digest prefix) used to name the buckets
+    global limiter
+    with stage("auth"):
+        digest = hash_key(x_api_key)
+        if digest not in VALID_KEY_HASHES:
+            raise HTTPException(status_code=401, detail="Invalid API Key")
+        if limiter is None:
+            limiter = create_limiter()
+    key_id = digest[:16]
+    with stage("rate_limit"):
+        limiter.take_request(key_id)
+    return key_id
+
+
+def charge_headlines(key_id: str, n: int):
+    with stage("rate_limit"):
+        limiter.take_headlines(key_id, n)
@@ -0,0 +1,134 @@
+# Encoded response bytes for stored sentiment results.
+#
+# A result never changes under its id (an update writes a new id), so the
+# serialized body of each (id, view) and its compressed forms are cached per
+# worker and a repeated GET is answered from bytes: no JSON encoding and no
+# compression after the first request for that coding. The coding follows
+# the client's Accept-Encoding; bodies under SENTIMENT_COMPRESS_MIN_BYTES are
+# sent as they are. brotli and zstandard are optional.
+
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+MIN_BYTES = int(os.environ.get("SENTIMENT_COMPRESS_MIN_BYTES", "1024"))
+LEVELS = {
+    "gzip": int(os.environ.get("SENTIMENT_GZIP_LEVEL", "6")),
+    "br": int(os.environ.get("SENTIMENT_BROTLI_LEVEL", "5")),
+    "zstd": int(os.environ.get("SENTIMENT_ZSTD_LEVEL", "6")),
+}
+
+
+def _available(coding: str) -> bool:
+    try:
+        if coding == "br":
+            import brotli  # noqa: F401
+        elif coding == "zstd":
+            import zstandard  # noqa: F401
+        return coding in LEVELS
+    except ImportError:
+        return False
+
+
+# Server preference order: the first one the client accepts is used
+CODINGS: List[str] = [c.strip() for c in os.environ.get("SENTIMENT_COMPRESS_CODINGS", "zstd,br,gzip").split(",")
+                      if c.strip() and _available(c.strip())]
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "gzip":
+        # mtime=0 keeps the bytes identical across processes
+        return gzip.compress(body, compresslevel=LEVELS["gzip"], mtime=0)
+    if coding == "br":
+        import brotli
+        return brotli.compress(body, quality=LEVELS["br"])
+    if coding == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=LEVELS["zstd"]).compress(body)
+    raise ValueError(f"unsupported coding {coding!r}")
+
+
+def choose(accept_encoding: Optional[str]) -> Optional[str]:
+    # Preferred coding the client accepts (q > 0), or None for identity
+    if not accept_encoding or not CODINGS:
+        return None
+    accepted, wildcard = {}, None
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        name = name.strip().lower()
+        if name == "*":
+            wildcard = q
+        elif name:
+            accepted[name] = q
+    for coding in CODINGS:
+        if accepted.get(coding, wildcard if wildcard is not None else 0.0) > 0:
+            return coding
+    return None
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: "OrderedDict[tuple, bytes]" = OrderedDict()  # (id, view, coding) -> bytes
+        self.lock = threading.Lock()
+        # Served from bytes as they are / after encoding or compressing
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: tuple) -> Optional[bytes]:
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def _set(self, key: tuple, body: bytes):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def encoded(self, id: str, view: str, encode: Callable[[], bytes],
+                accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        # (body, content coding or None) for one view of one stored result
+        coding = choose(accept_encoding)
+        if coding is not None:
+            body = self._get((id, view, coding))
+            if body is not None:
+                self.hits += 1
+                return body, coding
+        raw = self._get((id, view, None))
+        if raw is None:
+            self.misses += 1
+            raw = encode()
+            self._set((id, view, None), raw)
+        elif coding is None or len(raw) < MIN_BYTES:
+            self.hits += 1
+        else:
+            self.misses += 1  # encoded before, but not yet in this coding
+        if coding is None or len(raw) < MIN_BYTES:
+            return raw, None
+        body = compress(raw, coding)
+        self._set((id, view, coding), body)
+        return body, coding
+
+    def discard(self, id: str):
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == id]:
+                self.size -= len(self.entries.pop(key))
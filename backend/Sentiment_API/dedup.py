@@ -0,0 +1,165 @@
+# Near-duplicate headline detection in front of inference.
+#
+# Syndicated feeds repeat a story with small wording changes ("Apple stock
+# jumps after record iPhone sales" / "Apple shares jump after record iPhone
+# sales"). Headlines are normalized to a token set (lowercase, light plural
+# stripping, synonyms folded, direction words mapped to up/down), MinHash
+# signatures over those sets are bucketed by LSH bands to find candidates, and
+# a candidate only counts as a duplicate when the exact Jaccard similarity of
+# the token sets reaches the threshold and both headlines point the same way.
+# The direction check keeps "jumps" and "slumps" apart however similar the
+# rest of the headline is.
+#
+# Within a request, the first headline of each cluster is the representative
+# that gets scored. Across requests, recently scored representatives are kept
+# in a bounded per-process index, so a re-syndicated story is answered without
+# a model call at all.
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"a", "an", "the", "of", "to", "in", "on", "for", "and", "as", "at", "by", "is", "are", "its", "s"}
+SYNONYMS = {"shares": "stock", "share": "stock", "stocks": "stock", "equity": "stock", "inc": "", "corp": "", "co": ""}
+UP = {"jump", "jumps", "jumped", "rise", "rises", "rose", "surge", "surges", "surged", "soar", "soars", "soared",
+      "gain", "gains", "gained", "rally", "rallies", "rallied", "climb", "climbs", "climbed", "up", "higher",
+      "beat", "beats", "upgrade", "upgrades", "upgraded", "boost", "boosts", "raises", "raised"}
+DOWN = {"fall", "falls", "fell", "drop", "drops", "dropped", "slump", "slumps", "slumped", "plunge", "plunges",
+        "plunged", "sink", "sinks", "sank", "tumble", "tumbles", "tumbled", "slide", "slides", "slid", "decline",
+        "declines", "declined", "down", "lower", "miss", "misses", "missed", "downgrade", "downgrades",
+        "downgraded", "cut", "cuts", "loss", "losses", "worry", "worries", "probe", "lawsuit"}
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(1)
+_A = _rng.integers(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+
+def normalize(headline: str) -> Tuple[frozenset, int]:
+    # (token set, direction): direction is +1/-1 by majority of up/down words, else 0
+    tokens, direction = set(), 0
+    for word in WORD.findall(headline.lower()):
+        word = SYNONYMS.get(word, word)
+        if not word or word in STOPWORDS:
+            continue
+        if word in UP:
+            direction += 1
+            word = "+up"
+        elif word in DOWN:
+            direction -= 1
+            word = "-down"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.add(word)
+    return frozenset(tokens), (direction > 0) - (direction < 0)
+
+
+def signature(tokens: frozenset) -> np.ndarray:
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(t.encode(), digest_size=4).digest(), "little") for t in tokens),
+        dtype=np.uint64, count=len(tokens))
+    # a * x + b stays below 2**64 for 32-bit a, x and b
+    return ((_A[None, :] * hashes[:, None] + _B[None, :]) % PRIME).min(axis=0)
+
+
+def band_keys(sig: np.ndarray) -> List[bytes]:
+    return [bytes([b]) + sig[b * ROWS:(b + 1) * ROWS].tobytes() for b in range(BANDS)]
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+class LSHIndex:
+    def __init__(self, threshold: float, capacity: Optional[int] = None):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (tokens, direction, keys, payload)
+        self.buckets: Dict[bytes, set] = {}
+        self.lock = threading.Lock()
+
+    def query(self, tokens: frozenset, direction: int, keys: List[bytes]):
+        # Best (key, payload) at or above the threshold, or None
+        with self.lock:
+            candidates = set()
+            for k in keys:
+                candidates.update(self.buckets.get(k, ()))
+            best, best_sim = None, self.threshold
+            for key in candidates:
+                c_tokens, c_direction, _, payload = self.entries[key]
+                if c_direction != direction:
+                    continue
+                sim = jaccard(tokens, c_tokens)
+                if sim >= best_sim:
+                    best, best_sim = (key, payload), sim
+            if best is not None and self.capacity:
+                self.entries.move_to_end(best[0])
+            return best
+
+    def add(self, key: str, tokens: frozenset, direction: int, keys: List[bytes], payload=None):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return
+            self.entries[key] = (tokens, direction, keys, payload)
+            for k in keys:
+                self.buckets.setdefault(k, set()).add(key)
+            while self.capacity and len(self.entries) > self.capacity:
+                old, (_, _, old_keys, _) = self.entries.popitem(last=False)
+                for k in old_keys:
+                    bucket = self.buckets.get(k)
+                    if bucket is not None:
+                        bucket.discard(old)
+                        if not bucket:
+                            del self.buckets[k]
+
+
+class NearDuplicates:
+    def __init__(self, threshold: float = 0.8, recent: int = 50000):
+        self.threshold = threshold
+        self.recent = LSHIndex(threshold, capacity=recent) if recent else None
+
+    def plan(self, headlines: List[str]):
+        # Returns (representatives to score, {headline: representative}, {headline: recent (label, score)}).
+        # A headline that matches a recently scored one maps to that headline
+        # and its score; the rest map to the first headline of their cluster.
+        local = LSHIndex(self.threshold)
+        reps, rep_of, recalled = [], {}, {}
+        for h in headlines:
+            tokens, direction = normalize(h)
+            if len(tokens) < 3:
+                # Too short to judge similarity; always scored on its own
+                reps.append(h)
+                rep_of[h] = h
+                continue
+            keys = band_keys(signature(tokens))
+            hit = self.recent.query(tokens, direction, keys) if self.recent else None
+            if hit is not None:
+                rep_of[h] = hit[0]
+                recalled[hit[0]] = hit[1]
+                continue
+            match = local.query(tokens, direction, keys)
+            if match is not None:
+                rep_of[h] = match[0]
+                continue
+            local.add(h, tokens, direction, keys)
+            reps.append(h)
+            rep_of[h] = h
+        return reps, rep_of, recalled
+
+    def remember(self, scores: Dict[str, tuple], reps: List[str]):
+        # Adds freshly scored representatives to the cross-request index
+        if self.recent is None:
+            return
+        for h in reps:
+            tokens, direction = normalize(h)
+            if len(tokens) >= 3 and h in scores:
+                self.recent.add(h, tokens, direction, band_keys(signature(tokens)), payload=scores[h])
@@ -0,0 +1,12 @@
+# Gunicorn settings for the Sentiment API.
+#
+# GUNICORN_PRELOAD=1 imports the app once in the master and forks workers from
+# it, so module import cost is paid once per container instead of once per
+# worker. Clients, pools and background threads are all created lazily or in
+# the per-worker startup hook, so nothing fork-unsafe exists in the master.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
@@ -42,32 +42,16 @@
 #   }
 # }
 
-# -- Sentiment Analysis Table
-# create table if not exists sentiment_results (
-#     id text primary key,                       -- cryptographic id generated in FastAPI
-#     ticker text not null,                      -- stock ticker
-#     model_used text not null,                  -- sentiment model used
-#     headlines jsonb not null,                  -- array of input headlines
-#     items jsonb not null,                      -- structured items returned by model
-#     summary jsonb not null,                    -- sentiment summary
-#     created_at timestamptz default now()
-# );
-
-# -- Ensure that ticker + model_used is unique (only one record per pair)
-# create unique index if not exists sentiment_results_ticker_model_idx
-#     on sentiment_results (ticker, model_used);
+# -- Sentiment Analysis Tables
+# sentiment_scores (one row per headline per day, keyed by headline hash) and
+# sentiment_requests (summary + ordered headline hashes), both partitioned by
+# day, with put_sentiment_results / get_sentiment_result: see
+# backend/db/supabase-schema.sql
 
 # Supabase Scheduler:
 
-# create or replace function clean_old_sentiment_results()
-# returns void language plpgsql as $$
-# begin
-#   delete from sentiment_results
-#   where created_at < now() - interval '1 day';
-# end;
-# $$;
-
-# select cron.schedule('0 0 * * *', 'select clean_old_sentiment_results();');
+# select cron.schedule('sentiment-partitions', '5 0 * * *', 'select sentiment_maintain_partitions();');
+# -- creates upcoming day partitions and drops expired ones (replaces clean_old_sentiment_results)
 
 # Render:
 
@@ -83,18 +67,60 @@
 # | Operation  | Endpoint                       | Notes                                     |
 # | ---------- | ------------------------------ | ----------------------------------------- |
 # | **Create** | `POST /api/sentiment`          | Analyze and store sentiment, returns UUID |
+# | **Stream** | `POST /api/sentiment/stream`   | Same as create, NDJSON items then summary |
+# | **Bulk**   | `POST /api/sentiment/bulk`     | Many tickers, pooled inference, one write |
 # | **Read**   | `GET /api/sentiment/{uuid}`    | Retrieve stored summary by UUID           |
+# | **Latest** | `GET /api/sentiment/latest`    | Latest summary for `?ticker=`, cached     |
+# | **Index**  | `GET /api/sentiment/index`     | Decayed 1h/1d/7d index for `?ticker=`     |
 # | **Update** | `PUT /api/sentiment/{uuid}`    | Update metadata, i.e headlines or model   |
 # | **Delete** | `DELETE /api/sentiment/{uuid}` | Delete a stored summary                   |
 
-from fastapi import FastAPI, HTTPException, Header, Body
+from fastapi import FastAPI, HTTPException, Body, Query, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from collections import Counter, defaultdict
+from typing import List, Dict, Optional, Literal
+import numpy as np
 import uuid
-from supabase import create_client, Client
+import importlib
+import itertools
+import json
 import os
+import threading
+import time
 import requests
+from store import create_store, LABELS
+from auth import check_api_key, charge_headlines
+from sentiment_index import SentimentIndex, parse_window
+from dedup import NearDuplicates
+from compressed import ResponseCache
+from breaker import CircuitBreaker, BreakerOpen
+from telemetry import SIZE_BUCKETS, TelemetryMiddleware, TimedRoute, stage, trace_headers
+from telemetry import metrics as telemetry_metrics
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+# supabase (and psycopg for a local Postgres store) is imported on first use:
+# it is the bulk of the startup cost left once numpy and requests are loaded.
+HEAVY_MODULES = ["supabase", "psycopg"]
+
+def preload_modules():
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:  # optional: only the configured store needs it
+            pass
+
+# With GUNICORN_PRELOAD=1 the master imports the app, so the heavy modules are
+# loaded once and shared copy-on-write by every forked worker. Only imports run
+# here: clients and pools are created lazily, after the fork.
+if os.environ.get("GUNICORN_PRELOAD", "0") == "1":
+    preload_modules()
 
 # ------------------------
 # Supabase client setup
@@ -102,34 +128,109 @@ import requests
 SUPABASE_URL = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 HF_API_TOKEN = os.environ.get("HF_API_TOKEN")
-VALID_SENTIMENT_API_KEY = os.environ.get("SENTIMENT_API_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Supabase environment variables not set")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def create_supabase():
+    # Imported and built on first use: keeps the supabase import off the startup
+    # path and the client out of a preloading gunicorn master
+    from supabase import create_client
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise RuntimeError("Supabase environment variables not set")
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# Writes are queued and flushed in batches off the request path (see store.py)
+store = create_store(create_supabase)
+# Headlines scored in the last day by any worker are reused from the store;
+# SENTIMENT_REUSE_SCORES=0 skips the lookup
+REUSE_SCORES = os.environ.get("SENTIMENT_REUSE_SCORES", "1") == "1"
+
+# Serialized and compressed bodies of stored results, per worker (see compressed.py)
+response_cache = ResponseCache(int(os.environ.get("SENTIMENT_RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024))))
+
+# Rolling per-ticker index, shared by workers through an append-only log
+sentiment_index = SentimentIndex(os.environ.get("SENTIMENT_INDEX_DIR", "/tmp/sentiment_index"))
 
 # ------------------------
 # Hugging Face API client
 # ------------------------
-HF_API_URL = "https://api-inference.huggingface.co/models/ProsusAI/finbert"
-if not HF_API_TOKEN:
-    raise RuntimeError("HF_API_TOKEN not set in environment variables")
+# Overridable so load tests can point at a local stand-in (see backend/loadtest)
+HF_API_URL = os.environ.get("HF_API_URL", "https://api-inference.huggingface.co/models/ProsusAI/finbert")
 headers = {"Authorization": f"Bearer {HF_API_TOKEN}"}
+HF_BATCH_SIZE = int(os.environ.get("HF_BATCH_SIZE", "32"))
+
+# Near-duplicate headlines share one model call (see dedup.py); SENTIMENT_DEDUP=0 disables
+dedup = None
+if os.environ.get("SENTIMENT_DEDUP", "1") == "1":
+    dedup = NearDuplicates(threshold=float(os.environ.get("SENTIMENT_DEDUP_THRESHOLD", "0.8")),
+                           recent=int(os.environ.get("SENTIMENT_DEDUP_RECENT", "50000")))
+
+# Calls are bounded by HF_TIMEOUT and go through a circuit breaker (see
+# breaker.py): while HF is down, slow or loading the model, requests that need
+# inference fail fast with a 503 and Retry-After instead of each holding a
+# worker, and POST /api/sentiment answers from the ticker's latest stored
+# result, marked stale, while a background refresh retries (see below).
+HF_TIMEOUT = float(os.environ.get("HF_TIMEOUT", "15"))
+hf_breaker = CircuitBreaker(
+    "huggingface",
+    slow_seconds=float(os.environ.get("HF_SLOW_SECONDS", "10")),
+    open_seconds=float(os.environ.get("HF_OPEN_SECONDS", "30")),
+    shared_dir=os.environ.get("SENTIMENT_BREAKER_DIR", "/tmp/sentiment_breakers"),
+)
+
+def post_huggingface(headlines: List[str]):
+    # The request's trace id travels as a traceparent (see telemetry.py)
+    response = requests.post(HF_API_URL, headers={**headers, **trace_headers()}, json={"inputs": headlines},
+                             timeout=(3.05, HF_TIMEOUT))
+    telemetry_metrics.inc("upstream_responses", upstream="huggingface", status=str(response.status_code))
+    if response.status_code >= 500 or response.status_code == 429:
+        # Outages, overload and model loading count against the breaker
+        raise requests.HTTPError(f"{response.status_code} {response.text[:200]}", response=response)
+    return response
 
 def query_huggingface(headlines: List[str]):
-    response = requests.post(HF_API_URL, headers=headers, json={"inputs": headlines})
+    if not HF_API_TOKEN:
+        raise HTTPException(status_code=500, detail="HF_API_TOKEN not set in environment variables")
+    try:
+        response = hf_breaker.call(post_huggingface, headlines)
+    except BreakerOpen as e:
+        telemetry_metrics.inc("upstream_rejected", upstream="huggingface")
+        raise HTTPException(status_code=503, detail="Sentiment model unavailable, retry later",
+                            headers={"Retry-After": str(int(e.retry_after))})
+    except requests.RequestException as e:
+        if e.response is None:
+            # Timeouts and connection errors; answered calls are counted by status
+            telemetry_metrics.inc("upstream_errors", upstream="huggingface", error=type(e).__name__)
+        raise HTTPException(status_code=503, detail=f"HuggingFace API unavailable: {e}",
+                            headers={"Retry-After": str(int(max(hf_breaker.retry_after(), 1)))})
     if response.status_code != 200:
         raise HTTPException(status_code=500, detail=f"HuggingFace API error: {response.text}")
     return response.json()
 
+def parse_predictions(preds, n: int):
+    # HF returns one list of label scores per input; older responses came back as
+    # a single list holding the top label of every input.
+    if len(preds) == n and all(isinstance(p, list) for p in preds):
+        tops = [max(p, key=lambda x: x["score"]) for p in preds]
+    else:
+        tops = preds[0]
+        if not isinstance(tops, list):
+            tops = [tops]
+    return [(p["label"].lower(), float(p["score"])) for p in tops]
+
+def score_batches(headlines: List[str], batch_size: int = HF_BATCH_SIZE):
+    # Yields (offset, [(label, score), ...]) as each inference batch completes
+    for start in range(0, len(headlines), batch_size):
+        batch = headlines[start:start + batch_size]
+        telemetry_metrics.observe("inference_batch_size", len(batch), buckets=SIZE_BUCKETS)
+        with stage("inference"):
+            preds = query_huggingface(batch)
+        yield start, parse_predictions(preds, len(batch))
+
 # ------------------------
 # API Key validation
 # ------------------------
-VALID_API_KEYS = {VALID_SENTIMENT_API_KEY}
-
-def check_api_key(x_api_key: str = Header(...)):
-    if x_api_key not in VALID_API_KEYS:
-        raise HTTPException(status_code=401, detail="Invalid API Key")
+# check_api_key (auth.py) is a dependency: it validates the hashed key and takes
+# a request token before the endpoint body runs; charge_headlines takes headline
+# tokens before inference.
 
 # ------------------------
 # FastAPI setup
@@ -150,6 +251,9 @@ Analyze financial news headlines with **FinBERT**.
 """
 )
 
+# Routes declared below time their framework work (see telemetry.py)
+app.router.route_class = TimedRoute
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # adjust in production
@@ -157,6 +261,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last, so it is outermost: Server-Timing covers CORS and errors too
+app.add_middleware(TelemetryMiddleware)
 
 # ------------------------
 # Pydantic models
@@ -173,18 +279,64 @@ class SentimentRequest(BaseModel):
     )
     min_confidence: Optional[float] = Field(0.7, description="Minimum score for high-confidence predictions", example=0.7)
 
+class SentimentGroup(BaseModel):
+    ticker: str = Field(..., example="AAPL")
+    headlines: List[str] = Field(..., example=["Apple stock jumps after record iPhone sales"])
+
+class BulkSentimentRequest(BaseModel):
+    groups: List[SentimentGroup] = Field(..., description="One entry per ticker")
+    min_confidence: Optional[float] = Field(0.7, description="Minimum score for high-confidence predictions", example=0.7)
+
 class SentimentItem(BaseModel):
     headline: str = Field(..., example="Apple stock jumps after record iPhone sales")
     label: str = Field(..., example="positive")
     score: float = Field(..., example=0.93)
     high_confidence: bool = Field(..., example=True)
     model_used: str = Field("finbert-tone", example="finbert-tone")
+    cluster_size: int = Field(1, description="Distinct headlines in the request that shared this headline's model call", example=1)
 
 class SentimentSummary(BaseModel):
     counts: Dict[str, int] = Field(..., example={"positive": 1, "neutral": 0, "negative": 1})
     percentages: Dict[str, float] = Field(..., example={"positive": 50.0, "neutral": 0.0, "negative": 50.0})
     total: int = Field(..., example=2)
 
+class SentimentLatest(BaseModel):
+    id: str = Field(..., example="d1f3e8a0-8b2c-4e9b-b1f2-7a9c5d6e4f12")
+    ticker: str = Field(..., example="AAPL")
+    model_used: str = Field("finbert-tone", example="finbert-tone")
+    summary: SentimentSummary
+    min_confidence: float = Field(..., example=0.7)
+    created_at: Optional[str] = Field(None, example="2025-09-10 12:46:37.325673+00")
+
+class BulkSentimentResult(BaseModel):
+    id: str = Field(..., example="d1f3e8a0-8b2c-4e9b-b1f2-7a9c5d6e4f12")
+    ticker: str = Field(..., example="AAPL")
+    model_used: str = Field("finbert-tone", example="finbert-tone")
+    summary: SentimentSummary
+
+class BulkSentimentResponse(BaseModel):
+    results: List[BulkSentimentResult]
+    min_confidence: float = Field(..., example=0.7)
+    total_headlines: int = Field(..., example=3)
+    unique_headlines: int = Field(..., example=2)
+    scored_headlines: int = Field(..., description="Headlines sent to the model after near-duplicate clustering", example=2)
+
+class SentimentIndexWindow(BaseModel):
+    counts: Dict[str, float] = Field(..., example={"positive": 3.41, "neutral": 1.02, "negative": 0.87})
+    percentages: Dict[str, float] = Field(..., example={"positive": 64.9, "neutral": 19.4, "negative": 16.6})
+    mean_score: float = Field(..., description="Decayed mean of +score (positive) / -score (negative)", example=0.41)
+    weight: float = Field(..., description="Decayed number of headlines in the window", example=5.3)
+
+class SentimentIndexSnapshot(BaseModel):
+    as_of: float = Field(..., example=1757508397.3)
+    windows: Optional[Dict[str, SentimentIndexWindow]]
+
+class SentimentIndexResponse(BaseModel):
+    ticker: str = Field(..., example="AAPL")
+    as_of: float = Field(..., example=1758113197.3)
+    windows: Dict[str, SentimentIndexWindow]
+    compare: Optional[SentimentIndexSnapshot] = None
+
 class SentimentResponse(BaseModel):
     id: str = Field(..., example="d1f3e8a0-8b2c-4e9b-b1f2-7a9c5d6e4f12")
     ticker: str = Field(..., example="AAPL")
@@ -203,30 +355,209 @@ class SentimentResponse(BaseModel):
 # ------------------------
 # Helper function
 # ------------------------
-def analyze_headlines(headlines: List[str], min_confidence: float = 0.7):
-    preds = query_huggingface(headlines)
-    items = []
-    pred_list = preds[0]
-    if not isinstance(pred_list, list):
-        pred_list = [pred_list]
-    for i, p in enumerate(pred_list):
-        score = float(p["score"])
-        items.append({
-            "headline": headlines[i],
-            "label": p["label"].lower(),
-            "score": score,
-            "high_confidence": score >= min_confidence,
-    })
-        
-    counts = {"positive":0, "neutral":0, "negative":0}
-    for item in items:
-        if item["high_confidence"]:
-            counts[item["label"]] += 1
+LABEL_IDS = {label: i for i, label in enumerate(LABELS)}
+
+def summarize(counts: Dict[str, int]):
     total = sum(counts.values()) or 1
     percentages = {k: round(v*100/total,1) for k,v in counts.items()}
-    summary = {"counts": counts, "percentages": percentages, "total": total}
+    return {"counts": counts, "percentages": percentages, "total": total}
+
+def score_arrays(headlines: List[str], scores: Dict[str, tuple]):
+    pairs = [scores[h] for h in headlines]
+    label_ids = np.fromiter((LABEL_IDS[label] for label, _ in pairs), dtype=np.int8, count=len(pairs))
+    score_arr = np.fromiter((score for _, score in pairs), dtype=np.float64, count=len(pairs))
+    return label_ids, score_arr
+
+def summarize_arrays(label_ids: np.ndarray, score_arr: np.ndarray, min_confidence: float):
+    high = score_arr >= min_confidence
+    counts = np.bincount(label_ids[high], minlength=len(LABELS))
+    total = int(counts.sum()) or 1
+    percentages = np.round(counts * 100 / total, 1)
+    summary = {"counts": dict(zip(LABELS, counts.tolist())),
+               "percentages": dict(zip(LABELS, percentages.tolist())),
+               "total": total}
+    return high, summary
+
+def build_result(headlines: List[str], scores: Dict[str, tuple], min_confidence: float = 0.7,
+                 cluster_sizes: Optional[Dict[str, int]] = None):
+    # Thresholding and the summary only need stored (label, score) pairs, no inference
+    with stage("summarize"):
+        label_ids, score_arr = score_arrays(headlines, scores)
+        high, summary = summarize_arrays(label_ids, score_arr, min_confidence)
+        sizes = cluster_sizes or {}
+        items = [
+            {"headline": h, "label": LABELS[l], "score": sc, "high_confidence": hc, "model_used": "finbert-tone",
+             "cluster_size": sizes.get(h, 1)}
+            for h, l, sc, hc in zip(headlines, label_ids.tolist(), score_arr.tolist(), high.tolist())
+        ]
     return items, summary
 
+def compact_record(record: dict):
+    # Columnar view of a record: item columns are index-aligned with headlines,
+    # so headline text is sent once
+    items = record["items"]
+    return {
+        "id": record["id"],
+        "ticker": record["ticker"],
+        "model_used": record["model_used"],
+        "min_confidence": record["min_confidence"],
+        "summary": record["summary"],
+        "headlines": record["headlines"],
+        "labels": LABELS,
+        "label_ids": [LABEL_IDS[it["label"]] for it in items],
+        "scores": [it["score"] for it in items],
+        "high_confidence": [it["high_confidence"] for it in items],
+        "cluster_sizes": [it.get("cluster_size", 1) for it in items],
+    }
+
+def index_items(ticker: str, items: List[dict]):
+    with stage("index"):
+        sentiment_index.record(ticker, [it["headline"] for it in items],
+                               [it["label"] for it in items], [it["score"] for it in items])
+
+def encode_json(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, separators=(",", ":")).encode()
+
+def encoded_response(id: str, view: str, content, accept_encoding: Optional[str] = None):
+    # Stored results are immutable under their id, so each view is encoded and
+    # compressed once per worker and then served from bytes
+    with stage("encode"):
+        body, coding = response_cache.encoded(id, view, lambda: encode_json(content()), accept_encoding)
+    headers = {"Vary": "Accept-Encoding"}
+    if coding is not None:
+        headers["Content-Encoding"] = coding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def render(record: dict, format: str = "full", accept_encoding: Optional[str] = None):
+    # Records are built here or read back from the store, so response_model
+    # re-validation is skipped and the body is encoded directly
+    return encoded_response(record["id"], format,
+                            lambda: compact_record(record) if format == "compact" else record, accept_encoding)
+
+def iter_scores(headlines: List[str], known: Optional[Dict[str, tuple]] = None):
+    # Only headlines without a known (label, score) are sent to the model, and of
+    # those only one representative per near-duplicate cluster. Yields lists of
+    # (headline, (label, score), cluster size) as scores become available: known
+    # and recalled ones first, then those of each inference batch. Returns the
+    # number of headlines sent to the model.
+    known = known or {}
+    missing = list(dict.fromkeys(h for h in headlines if h not in known))
+    if dedup is None:
+        to_score, rep_of, rep_scores = missing, {h: h for h in missing}, {}
+    else:
+        with stage("dedup"):
+            to_score, rep_of, rep_scores = dedup.plan(missing)
+    members = Counter(rep_of.values())
+    waiting = defaultdict(list)  # representative -> the missing headlines it scores
+    for h in missing:
+        waiting[rep_of[h]].append(h)
+
+    ready = [(h, known[h], 1) for h in dict.fromkeys(headlines) if h in known]
+    for r, pred in rep_scores.items():
+        ready += [(h, pred, members[r]) for h in waiting.pop(r, ())]
+    yield ready
+    for start, preds in score_batches(to_score):
+        ready = []
+        for i, pred in enumerate(preds):
+            r = to_score[start + i]
+            rep_scores[r] = pred
+            ready += [(h, pred, members[r]) for h in waiting.pop(r, ())]
+        yield ready
+    if dedup is not None:
+        with stage("dedup"):
+            dedup.remember(rep_scores, to_score)
+    # Distinct headlines by where their score came from
+    telemetry_metrics.inc("headlines", len(set(headlines)) - len(missing), source="known")
+    telemetry_metrics.inc("headlines", len(missing) - len(to_score), source="near_duplicate")
+    telemetry_metrics.inc("headlines", len(to_score), source="model")
+    return len(to_score)
+
+def score_headlines(headlines: List[str], known: Optional[Dict[str, tuple]] = None):
+    # ({headline: (label, score)}, {headline: cluster size}, number scored)
+    scores, cluster_sizes = {}, {}
+    chunks = iter_scores(headlines, known)
+    while True:
+        try:
+            ready = next(chunks)
+        except StopIteration as done:
+            return scores, cluster_sizes, done.value
+        for h, pred, size in ready:
+            scores[h] = pred
+            cluster_sizes[h] = size
+
+def stored_scores(headlines: List[str]) -> Dict[str, tuple]:
+    if not REUSE_SCORES:
+        return {}
+    with stage("score_lookup"):
+        return store.known_scores("finbert-tone", headlines)
+
+def analyze_headlines(headlines: List[str], min_confidence: float = 0.7, known: Optional[Dict[str, tuple]] = None):
+    scores, cluster_sizes, _ = score_headlines(headlines, known)
+    return build_result(headlines, scores, min_confidence, cluster_sizes)
+
+# ------------------------
+# Stale fallback
+# ------------------------
+# A create that cannot be scored (inference unavailable) is answered with the
+# ticker's latest stored result, marked with X-Data-Stale, and its headlines
+# are queued here. One thread per worker retries them once the breaker lets
+# calls through again and stores the result, so the next reader of the ticker
+# gets fresh scores. Only the latest request per ticker is kept.
+MAX_PENDING_REFRESH = int(os.environ.get("SENTIMENT_MAX_PENDING_REFRESH", "1000"))
+pending_refresh: Dict[str, tuple] = {}  # ticker -> (headlines, min_confidence)
+refresh_lock = threading.Lock()
+refresh_worker: Optional[threading.Thread] = None
+
+def stale_record(ticker: str) -> Optional[dict]:
+    with stage("store_read"):
+        latest = store.latest(ticker, "finbert-tone")
+        return store.get(latest["id"]) if latest is not None else None
+
+def stale_result(ticker: str, format: str, accept_encoding: Optional[str]):
+    record = stale_record(ticker)
+    if record is None:
+        return None
+    response = render(record, format, accept_encoding)
+    response.headers["X-Data-Stale"] = "true"
+    return response
+
+def schedule_refresh(ticker: str, headlines: List[str], min_confidence: float):
+    global refresh_worker
+    with refresh_lock:
+        if ticker not in pending_refresh and len(pending_refresh) >= MAX_PENDING_REFRESH:
+            return
+        pending_refresh[ticker] = (list(headlines), min_confidence)
+        if refresh_worker is None or not refresh_worker.is_alive():
+            refresh_worker = threading.Thread(target=refresh_stale, name="sentiment-refresh", daemon=True)
+            refresh_worker.start()
+
+def refresh_stale():
+    while True:
+        time.sleep(max(hf_breaker.retry_after(), 1.0))
+        with refresh_lock:
+            if not pending_refresh:
+                return
+            ticker, request = next(iter(pending_refresh.items()))
+        headlines, min_confidence = request
+        try:
+            items, summary = analyze_headlines(headlines, min_confidence, known=stored_scores(headlines))
+        except HTTPException as e:
+            if e.status_code == 503:
+                telemetry_metrics.inc("retries", operation="stale_refresh")
+                continue  # still unavailable: wait for the breaker again
+            items = None
+            print(f"stale refresh for {ticker} dropped: {e.detail}")
+        with refresh_lock:
+            if pending_refresh.get(ticker) == request:
+                del pending_refresh[ticker]
+        if items is not None:
+            store.put({"id": str(uuid.uuid4()), "ticker": ticker, "model_used": "finbert-tone",
+                       "headlines": headlines, "items": items, "summary": summary,
+                       "min_confidence": min_confidence})
+            index_items(ticker, items)
+
 # ------------------------
 # CRUD Endpoints
 # ------------------------
@@ -282,20 +613,303 @@ def create_sentiment(
         ],
         "min_confidence": 0.7
     }),
-    x_api_key: str = Header(...)
+    format: Literal["full", "compact"] = Query("full", description="`compact` returns columnar item arrays without repeated headline text"),
+    accept_encoding: Optional[str] = Header(None),
+    key_id: str = Depends(check_api_key)
 ):
-    check_api_key(x_api_key)
     if not body.headlines or not body.ticker:
         raise HTTPException(status_code=400, detail="headlines and ticker are required")
+    charge_headlines(key_id, len(body.headlines))
     
-    items, summary = analyze_headlines(body.headlines, body.min_confidence)
+    try:
+        items, summary = analyze_headlines(body.headlines, body.min_confidence, known=stored_scores(body.headlines))
+    except HTTPException as e:
+        if e.status_code != 503:
+            raise
+        stale = stale_result(body.ticker, format, accept_encoding)
+        if stale is None:
+            raise
+        schedule_refresh(body.ticker, body.headlines, body.min_confidence)
+        return stale
     new_id = str(uuid.uuid4())
     record = {"id": new_id, "ticker": body.ticker, "model_used":"finbert-tone",
               "headlines": body.headlines, "items": items, "summary": summary,
               "min_confidence": body.min_confidence}
     
-    supabase.table("sentiment_results").insert(record).execute()
-    return record
+    with stage("store_put"):
+        store.put(record)
+    index_items(body.ticker, items)
+    return render(record, format, accept_encoding)
+
+
+@app.post(
+    "/api/sentiment/stream",
+    summary="Analyze headlines and stream results as NDJSON",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "One JSON object per line: an `item` per headline as soon as its score is known "
+                           "(stored or near-duplicate scores first, then per inference batch), then a final `summary`",
+            "content": {
+                "application/x-ndjson": {
+                    "example": (
+                        '{"type": "item", "index": 0, "headline": "Apple stock jumps after record iPhone sales", '
+                        '"label": "positive", "score": 0.93, "high_confidence": true, "model_used": "finbert-tone", "cluster_size": 1}\n'
+                        '{"type": "summary", "id": "d1f3e8a0-8b2c-4e9b-b1f2-7a9c5d6e4f12", "ticker": "AAPL", '
+                        '"model_used": "finbert-tone", "min_confidence": 0.7, '
+                        '"summary": {"counts": {"positive": 1, "neutral": 0, "negative": 0}, '
+                        '"percentages": {"positive": 100.0, "neutral": 0.0, "negative": 0.0}, "total": 1}}\n'
+                    )
+                }
+            },
+        }
+    }
+)
+def stream_sentiment(
+    body: SentimentRequest = Body(..., example={
+        "ticker": "AAPL",
+        "headlines": [
+            "Apple stock jumps after record iPhone sales",
+            "Investors worry about Apple supply chain issues"
+        ],
+        "min_confidence": 0.7
+    }),
+    key_id: str = Depends(check_api_key)
+):
+    if not body.headlines or not body.ticker:
+        raise HTTPException(status_code=400, detail="headlines and ticker are required")
+    charge_headlines(key_id, len(body.headlines))
+
+    # Same pipeline as POST /api/sentiment: stored scores and near-duplicates
+    # first, then inference batches, each line sent as soon as its score is known
+    min_confidence = body.min_confidence
+    chunks = iter_scores(body.headlines, stored_scores(body.headlines))
+    # Known scores and the first inference batch are taken here, so a model that
+    # is unavailable can still be answered with a status code (or stale data)
+    first = []
+    try:
+        first.append(next(chunks))
+        first.append(next(chunks))
+    except StopIteration:
+        pass
+    except HTTPException as e:
+        if e.status_code != 503:
+            raise
+        stale = stale_record(body.ticker)
+        if stale is None:
+            raise
+        schedule_refresh(body.ticker, body.headlines, min_confidence)
+        return StreamingResponse(record_lines(stale, stale=True), media_type="application/x-ndjson",
+                                 headers={"X-Data-Stale": "true"})
+
+    positions = defaultdict(list)
+    for i, h in enumerate(body.headlines):
+        positions[h].append(i)
+    record = {"id": str(uuid.uuid4()), "ticker": body.ticker, "model_used": "finbert-tone",
+              "headlines": body.headlines, "items": [], "summary": None,
+              "min_confidence": min_confidence}
+
+    def lines():
+        scores, cluster_sizes = {}, {}
+        try:
+            for ready in itertools.chain(first, chunks):
+                for h, (label, score), size in ready:
+                    scores[h], cluster_sizes[h] = (label, score), size
+                    item = {"headline": h, "label": label, "score": score, "high_confidence": score >= min_confidence,
+                            "model_used": "finbert-tone", "cluster_size": size}
+                    for index in positions[h]:
+                        yield json.dumps({"type": "item", "index": index, **item}) + "\n"
+        except HTTPException as e:
+            # Headers are already sent, so errors travel in-band
+            yield json.dumps({"type": "error", "detail": e.detail}) + "\n"
+            return
+        record["items"], record["summary"] = build_result(body.headlines, scores, min_confidence, cluster_sizes)
+        yield summary_line(record)
+
+    def persist():
+        # Runs after the stream closes; skipped when scoring failed part-way
+        if record["summary"] is not None:
+            store.put(record)
+            index_items(body.ticker, record["items"])
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             background=BackgroundTask(persist))
+
+def summary_line(record: dict, **extra) -> str:
+    return json.dumps({"type": "summary", "id": record["id"], "ticker": record["ticker"],
+                       "model_used": record["model_used"], "min_confidence": record["min_confidence"],
+                       "summary": record["summary"], **extra}) + "\n"
+
+def record_lines(record: dict, stale: bool = False):
+    # A stored record in the stream's shape, in headline order
+    for index, item in enumerate(record["items"]):
+        yield json.dumps({"type": "item", "index": index, **item}) + "\n"
+    yield summary_line(record, **({"stale": True} if stale else {}))
+
+
+@app.post(
+    "/api/sentiment/bulk",
+    response_model=BulkSentimentResponse,
+    summary="Analyze headlines for many tickers in one call",
+    responses={
+        200: {
+            "description": "Per-ticker summaries; full records are stored and readable by id",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "results": [
+                            {
+                                "id": "d1f3e8a0-8b2c-4e9b-b1f2-7a9c5d6e4f12",
+                                "ticker": "AAPL",
+                                "model_used": "finbert-tone",
+                                "summary": {
+                                    "counts": {"positive": 1, "neutral": 0, "negative": 0},
+                                    "percentages": {"positive": 100.0, "neutral": 0.0, "negative": 0.0},
+                                    "total": 1
+                                }
+                            },
+                            {
+                                "id": "f7a4c9b2-3d1e-4c8a-9f4b-2d7c9e1f6b5a",
+                                "ticker": "MSFT",
+                                "model_used": "finbert-tone",
+                                "summary": {
+                                    "counts": {"positive": 1, "neutral": 0, "negative": 1},
+                                    "percentages": {"positive": 50.0, "neutral": 0.0, "negative": 50.0},
+                                    "total": 2
+                                }
+                            }
+                        ],
+                        "min_confidence": 0.7,
+                        "total_headlines": 3,
+                        "unique_headlines": 2
+                    }
+                }
+            }
+        }
+    }
+)
+def create_bulk_sentiment(
+    body: BulkSentimentRequest = Body(..., example={
+        "groups": [
+            {"ticker": "AAPL", "headlines": ["Tech stocks rally as Apple and Microsoft beat estimates"]},
+            {"ticker": "MSFT", "headlines": [
+                "Tech stocks rally as Apple and Microsoft beat estimates",
+                "Microsoft faces antitrust probe in the EU"
+            ]}
+        ],
+        "min_confidence": 0.7
+    }),
+    key_id: str = Depends(check_api_key)
+):
+    if not body.groups or any(not g.ticker or not g.headlines for g in body.groups):
+        raise HTTPException(status_code=400, detail="every group needs a ticker and headlines")
+    tickers = [g.ticker for g in body.groups]
+    if len(set(tickers)) != len(tickers):
+        raise HTTPException(status_code=400, detail="each ticker may appear only once")
+    charge_headlines(key_id, sum(len(g.headlines) for g in body.groups))
+
+    # One pooled, deduplicated set of inference batches across every ticker
+    all_headlines = [h for g in body.groups for h in g.headlines]
+    scores, cluster_sizes, scored = score_headlines(all_headlines, stored_scores(all_headlines))
+
+    records = []
+    for g in body.groups:
+        items, summary = build_result(g.headlines, scores, body.min_confidence, cluster_sizes)
+        index_items(g.ticker, items)
+        records.append({"id": str(uuid.uuid4()), "ticker": g.ticker, "model_used": "finbert-tone",
+                        "headlines": g.headlines, "items": items, "summary": summary,
+                        "min_confidence": body.min_confidence})
+
+    # Queued as a single unit, so it lands as one multi-row upsert
+    with stage("store_put"):
+        store.put_many(records)
+    return {
+        "results": [{k: r[k] for k in ("id", "ticker", "model_used", "summary")} for r in records],
+        "min_confidence": body.min_confidence,
+        "total_headlines": len(all_headlines),
+        "unique_headlines": len(scores),
+        "scored_headlines": scored,
+    }
+
+
+@app.get(
+    "/api/sentiment/index",
+    response_model=SentimentIndexResponse,
+    summary="Rolling time-decayed sentiment index for a ticker",
+    responses={
+        200: {
+            "description": "Exponentially decayed counts and mean score over 1h/1d/7d, optionally vs. an earlier point",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "ticker": "AAPL",
+                        "as_of": 1758113197.3,
+                        "windows": {
+                            "1h": {"counts": {"positive": 0.9, "neutral": 0.0, "negative": 0.0},
+                                   "percentages": {"positive": 100.0, "neutral": 0.0, "negative": 0.0},
+                                   "mean_score": 0.88, "weight": 0.9},
+                            "1d": {"counts": {"positive": 3.41, "neutral": 1.02, "negative": 0.87},
+                                   "percentages": {"positive": 64.9, "neutral": 19.4, "negative": 16.6},
+                                   "mean_score": 0.41, "weight": 5.3},
+                            "7d": {"counts": {"positive": 10.2, "neutral": 6.1, "negative": 7.7},
+                                   "percentages": {"positive": 42.5, "neutral": 25.4, "negative": 32.1},
+                                   "mean_score": 0.07, "weight": 24.0}
+                        },
+                        "compare": {"as_of": 1757508397.3, "windows": None}
+                    }
+                }
+            }
+        }
+    }
+)
+def get_sentiment_index(
+    ticker: str,
+    compare: Optional[str] = Query(None, description="Also return the index as of this long ago, e.g. `7d`", example="7d"),
+    key_id: str = Depends(check_api_key)
+):
+    try:
+        offset = parse_window(compare) if compare else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = sentiment_index.query(ticker, compare=offset)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No sentiment indexed for ticker")
+    return result
+
+
+@app.get(
+    "/api/sentiment/latest",
+    response_model=SentimentLatest,
+    summary="Fetch the latest sentiment summary for a ticker",
+    responses={
+        200: {
+            "description": "Latest summary for the ticker, without headlines or items",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "id": "d1f3e8a0-8b2c-4e9b-b1f2-7a9c5d6e4f12",
+                        "ticker": "AAPL",
+                        "model_used": "finbert-tone",
+                        "summary": {
+                            "counts": {"positive": 1, "neutral": 0, "negative": 1},
+                            "percentages": {"positive": 50.0, "neutral": 0.0, "negative": 50.0},
+                            "total": 2
+                        },
+                        "min_confidence": 0.7,
+                        "created_at": "2025-09-10 12:46:37.325673+00"
+                    }
+                }
+            }
+        }
+    }
+)
+def get_latest_sentiment(ticker: str, accept_encoding: Optional[str] = Header(None),
+                         key_id: str = Depends(check_api_key)):
+    with stage("store_read"):
+        latest = store.latest(ticker, "finbert-tone")
+    if latest is None:
+        raise HTTPException(status_code=404, detail="Sentiment not found")
+    return encoded_response(latest["id"], "latest", lambda: latest, accept_encoding)
 
 
 @app.get(
@@ -343,13 +957,18 @@ def create_sentiment(
     }
 )
 
-def get_sentiment(id: str, x_api_key: str = Header(...)):
-    check_api_key(x_api_key)
-    existing = supabase.table("sentiment_results").select("*").eq("id", id).execute()
-    if not existing.data:
+def get_sentiment(
+    id: str,
+    format: Literal["full", "compact"] = Query("full", description="`compact` returns columnar item arrays without repeated headline text"),
+    accept_encoding: Optional[str] = Header(None),
+    key_id: str = Depends(check_api_key)
+):
+    with stage("store_read"):
+        existing = store.get(id)
+    if existing is None:
         raise HTTPException(status_code=404, detail="Sentiment not found")
     
-    return existing.data[0]
+    return render(existing, format, accept_encoding)
 
 
 @app.put(
@@ -401,22 +1020,32 @@ def update_sentiment(id: str, body: SentimentRequest = Body(..., example={
         "Supply chain issues continue to worry investors"
     ],
     "min_confidence": 0.7
-}), x_api_key: str = Header(...)):
-    check_api_key(x_api_key)
-    existing = supabase.table("sentiment_results").select("*").eq("id", id).execute()
-    if not existing.data:
+}), format: Literal["full", "compact"] = Query("full", description="`compact` returns columnar item arrays without repeated headline text"),
+    accept_encoding: Optional[str] = Header(None),
+    key_id: str = Depends(check_api_key)):
+    charge_headlines(key_id, len(body.headlines))
+    with stage("store_read"):
+        record = store.get(id)
+    if record is None:
         raise HTTPException(status_code=404, detail="Sentiment not found")
     
-    record = existing.data[0]
-    items, summary = analyze_headlines(body.headlines, body.min_confidence)
+    # Reuse stored scores: only new headlines hit the model, and a threshold-only
+    # change skips inference entirely
+    known = {item["headline"]: (item["label"], float(item["score"])) for item in record["items"]}
+    known.update(stored_scores([h for h in body.headlines if h not in known]))
+    items, summary = analyze_headlines(body.headlines, body.min_confidence, known=known)
     new_id = str(uuid.uuid4())
     updated = {"id": new_id, "ticker": record["ticker"], "model_used":"finbert-tone",
                "headlines": body.headlines, "items": items, "summary": summary,
                "min_confidence": body.min_confidence}
     
-    supabase.table("sentiment_results").delete().eq("id", id).execute()
-    supabase.table("sentiment_results").insert(updated).execute()
-    return updated
+    # The upsert on (ticker, model_used) replaces the old row, so no delete is
+    # needed; the old id stops resolving here at once, elsewhere once it lands
+    with stage("store_put"):
+        store.put(updated, replaces=id)
+    response_cache.discard(id)
+    index_items(record["ticker"], items)
+    return render(updated, format, accept_encoding)
 
 @app.delete(
     "/api/sentiment/{id}",
@@ -436,17 +1065,85 @@ def update_sentiment(id: str, body: SentimentRequest = Body(..., example={
         }
     }
 )
-def delete_sentiment(id: str, x_api_key: str = Header(...)):
-    check_api_key(x_api_key)
-    existing = supabase.table("sentiment_results").select("*").eq("id", id).execute()
-    if not existing.data:
+def delete_sentiment(id: str, key_id: str = Depends(check_api_key)):
+    response_cache.discard(id)
+    if not store.delete(id):
         raise HTTPException(status_code=404, detail="Sentiment not found")
-    supabase.table("sentiment_results").delete().eq("id", id).execute()
     return {"id": id, "detail": "Deleted successfully"}
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+def hit_ratio(hits: int, misses: int) -> float:
+    return round(hits / (hits + misses), 4) if hits + misses else 0.0
+
+telemetry_metrics.gauge("cache_hit_ratio", lambda: {
+    "response": hit_ratio(response_cache.hits, response_cache.misses),
+    "record": hit_ratio(store.cache.hits, store.cache.misses),
+    "latest": hit_ratio(store.latest_cache.hits, store.latest_cache.misses),
+})
+telemetry_metrics.gauge("cache_entries", lambda: {
+    "response": len(response_cache.entries), "record": len(store.cache.entries),
+    "latest": len(store.latest_cache.entries), "near_duplicate": len(dedup.recent.entries) if dedup and dedup.recent else 0,
+})
+telemetry_metrics.gauge("response_cache_bytes", lambda: {"": response_cache.size})
+telemetry_metrics.gauge("write_queue", lambda: {"pending_records": len(store.pending),
+                                                "queued_units": store.queue.qsize()})
+telemetry_metrics.gauge("pending_refresh", lambda: {"": len(pending_refresh)})
+telemetry_metrics.gauge("breaker_open", lambda: {hf_breaker.name: int(hf_breaker.metrics()["state"] != "closed")})
+
+@app.get("/metrics")
+def metrics(format: Literal["json", "prometheus"] = Query("json", description="`prometheus` returns the text exposition format")):
+    # Per worker: stage and request latency histograms, upstream, retry and
+    # headline counters, cache and queue gauges (see telemetry.py), the
+    # inference circuit breaker and queued stale refreshes
+    if format == "prometheus":
+        return PlainTextResponse(telemetry_metrics.prometheus(), media_type="text/plain; version=0.0.4")
+    return {"pid": os.getpid(), "breakers": {hf_breaker.name: hf_breaker.metrics()},
+            "pending_refresh": len(pending_refresh), **telemetry_metrics.snapshot()}
+
+# ------------------------
+# Readiness
+# ------------------------
+# /health only says the process is up. /ready turns 200 once this worker has
+# built its store client and the inference endpoint has answered (HF returns
+# 503 while the model is loading).
+readiness = {"store": False, "inference": False, "error": None}
+
+def warm_up(max_wait: float = 300.0):
+    deadline = time.monotonic() + max_wait
+    delay = 1.0
+    while time.monotonic() < deadline:
+        try:
+            if not readiness["store"]:
+                readiness["store"] = bool(store.warm())
+            if not readiness["inference"]:
+                parse_predictions(query_huggingface(["warm up"]), 1)
+                readiness["inference"] = True
+            readiness["error"] = None
+            return
+        except Exception as e:
+            readiness["error"] = str(getattr(e, "detail", e))
+            telemetry_metrics.inc("retries", operation="warm_up")
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+@app.on_event("startup")
+def start_warm_up():
+    # Runs in each worker after the fork, so nothing here is shared with the master
+    if os.environ.get("SENTIMENT_WARM_UP", "1") == "1":
+        threading.Thread(target=warm_up, name="sentiment-warm-up", daemon=True).start()
+
+@app.get("/ready")
+def ready():
+    is_ready = readiness["store"] and readiness["inference"]
+    return JSONResponse(status_code=200 if is_ready else 503,
+                        content={"ready": is_ready, **readiness})
+
+@app.on_event("shutdown")
+def flush_pending_writes():
+    store.flush()
     
 # uses the pick from two models methods
 # backend/sentiment_api.py
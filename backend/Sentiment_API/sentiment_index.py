@@ -0,0 +1,284 @@
+# Rolling, exponentially time-decayed sentiment index per ticker.
+#
+# Every newly scored headline is appended to an append-only log as a fixed
+# 37-byte record (time, ticker, headline hash, label id, score). Each worker
+# tails the same log and folds new records into its in-memory state, so all
+# workers converge without sharing memory. State per ticker and window is
+# [positive, neutral, negative, signed score sum, total weight], decayed by
+# exp(-dt / window) and updated incrementally as records arrive.
+#
+# Hourly checkpoints of that state answer "now vs. last week" without
+# re-reading history.
+#
+# Every snapshot_every records the worker that notices compacts the log: under
+# an exclusive lock it folds in the rest of the log, writes the state to a
+# JSON snapshot and truncates the log to a new generation header. Writers
+# append under the same lock, so no record lands between the two. A worker
+# that finds a different header reloads its state from the snapshot, which
+# covers everything up to the truncation, and reads on from there. The
+# snapshot also records where the old generation ended, so a compaction cut
+# short before the truncation neither loses nor replays records.
+
+import fcntl
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+WINDOWS = {"1h": 60 * 60, "1d": 24 * 60 * 60, "7d": 7 * 24 * 60 * 60}
+TAUS = np.array(list(WINDOWS.values()), dtype=np.float64)
+LABELS = ["positive", "neutral", "negative"]
+CHECKPOINT_EVERY = 60 * 60
+CHECKPOINT_RETENTION = 8 * 24 * 60 * 60
+SEEN_PER_TICKER = 4096
+
+RECORD = struct.Struct("<d16sQBf")
+MAGIC = b"SENTIDX1"
+HEADER_SIZE = len(MAGIC) + 8  # magic, then a random generation id
+RECORD_DTYPE = np.dtype([("ts", "<f8"), ("ticker", "S16"), ("hash", "<u8"), ("label", "u1"), ("score", "<f4")])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+def headline_hash(headline: str) -> int:
+    return int.from_bytes(hashlib.blake2b(headline.encode(), digest_size=8).digest(), "little")
+
+
+def new_header() -> bytes:
+    return MAGIC + os.urandom(8)
+
+
+def read_header(f) -> bytes:
+    # b"" for a log written before generation headers
+    f.seek(0)
+    head = f.read(HEADER_SIZE)
+    return head if len(head) == HEADER_SIZE and head.startswith(MAGIC) else b""
+
+
+class TickerState:
+    def __init__(self):
+        self.state = np.zeros((len(TAUS), 5))
+        self.last_ts = 0.0
+        self.checkpoints: List[tuple] = []  # (hour boundary ts, state at that instant)
+        self.seen: "OrderedDict[int, None]" = OrderedDict()
+
+    def value_at(self, ts: float):
+        # State decayed forward (or backward, for a slightly stale query) to ts
+        return self.state * np.exp(-(ts - self.last_ts) / TAUS)[:, None]
+
+    def checkpoint_before(self, ts: float):
+        for boundary, state in reversed(self.checkpoints):
+            if boundary <= ts:
+                return state * np.exp(-(ts - boundary) / TAUS)[:, None]
+        return None
+
+    def apply(self, ts: np.ndarray, label: np.ndarray, score: np.ndarray):
+        contrib = np.zeros((len(ts), 5))
+        contrib[np.arange(len(ts)), label] = 1.0
+        contrib[:, 3] = np.where(label == 0, score, np.where(label == 2, -score, 0.0))
+        contrib[:, 4] = 1.0
+
+        # Fold records in one hour bucket at a time so a checkpoint is taken
+        # each time an hour boundary is crossed
+        hours = np.floor(ts / CHECKPOINT_EVERY)
+        for hour in np.unique(hours):
+            mask = hours == hour
+            boundary = hour * CHECKPOINT_EVERY
+            if self.last_ts and boundary > self.last_ts:
+                self.checkpoints.append((boundary, self.value_at(boundary)))
+            t_end = max(float(ts[mask].max()), self.last_ts)
+            weights = np.exp(-(t_end - ts[mask])[:, None] / TAUS[None, :])
+            self.state = self.value_at(t_end) + weights.T @ contrib[mask]
+            self.last_ts = t_end
+
+        cutoff = self.last_ts - CHECKPOINT_RETENTION
+        while self.checkpoints and self.checkpoints[0][0] < cutoff:
+            self.checkpoints.pop(0)
+
+
+class SentimentIndex:
+    def __init__(self, directory: str, snapshot_every: int = 10000):
+        self.directory = directory
+        self.log_path = os.path.join(directory, "events.log")
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.snapshot_every = snapshot_every
+        self.tickers: Dict[str, TickerState] = {}
+        self.header: Optional[bytes] = None  # generation of the log the state was read from
+        self.offset = 0
+        self.snapshot_offset = 0
+        self.log_stat = (0, 0)  # (size, mtime_ns) at the last sync
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.log_path):
+            self._load_snapshot(b"")
+
+    def record(self, ticker: str, headlines: List[str], labels: List[str], scores: List[float],
+               ts: Optional[float] = None):
+        # Headlines already folded in for this ticker (e.g. on a feed refresh) are skipped
+        ts = time.time() if ts is None else ts
+        self.sync()
+        with self.lock:
+            seen = set(self.tickers[ticker].seen) if ticker in self.tickers else set()
+            buf = bytearray()
+            for headline, label, score in zip(headlines, labels, scores):
+                h = headline_hash(headline)
+                if h in seen:
+                    continue
+                seen.add(h)
+                buf += RECORD.pack(ts, ticker.encode()[:16], h, LABELS.index(label), score)
+        if buf:
+            # A single O_APPEND write under the log lock: concurrent writers cannot
+            # interleave records and a compaction cannot truncate them away
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                if os.fstat(fd).st_size == 0:
+                    buf = new_header() + buf
+                os.write(fd, bytes(buf))
+            finally:
+                os.close(fd)
+        self.sync()
+
+    def sync(self):
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        with self.lock:
+            if (st.st_size, st.st_mtime_ns) == self.log_stat:
+                return
+            self.log_stat = (st.st_size, st.st_mtime_ns)
+            with open(self.log_path, "rb") as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                self._catch_up(f)
+            if self.offset - self.snapshot_offset >= self.snapshot_every * RECORD.size:
+                self._compact()
+
+    def _catch_up(self, f):
+        # Folds in the records added since the last read; f is the log, locked
+        header = read_header(f)
+        if header != self.header:
+            # Compacted (or first read): the snapshot holds everything before the header
+            self._load_snapshot(header)
+        size = os.fstat(f.fileno()).st_size
+        usable = (size - self.offset) // RECORD.size * RECORD.size
+        if usable <= 0:
+            return
+        f.seek(self.offset)
+        self._apply(np.frombuffer(f.read(usable), dtype=RECORD_DTYPE))
+        self.offset += usable
+
+    def _compact(self):
+        with open(self.log_path, "r+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self._catch_up(f)
+            if self.offset - self.snapshot_offset < self.snapshot_every * RECORD.size:
+                return  # another worker compacted first
+            header = new_header()
+            # Valid for the new generation and, should the truncation not happen,
+            # for the end of the current one
+            self._write_snapshot([(header, HEADER_SIZE), (self.header, self.offset)])
+            f.truncate(0)
+            f.seek(0)
+            f.write(header)
+            f.flush()
+            self.header = header
+            self.offset = self.snapshot_offset = HEADER_SIZE
+
+    def _apply(self, records: np.ndarray):
+        for raw in np.unique(records["ticker"]):
+            rows = records[records["ticker"] == raw]
+            ticker = raw.decode()
+            ts_state = self.tickers.setdefault(ticker, TickerState())
+            ts_state.apply(rows["ts"].astype(np.float64), rows["label"].astype(np.intp),
+                           rows["score"].astype(np.float64))
+            for h in rows["hash"].tolist():
+                ts_state.seen[h] = None
+                ts_state.seen.move_to_end(h)
+            while len(ts_state.seen) > SEEN_PER_TICKER:
+                ts_state.seen.popitem(last=False)
+
+    def query(self, ticker: str, compare: Optional[float] = None, now: Optional[float] = None):
+        self.sync()
+        now = time.time() if now is None else now
+        with self.lock:
+            ts_state = self.tickers.get(ticker)
+            if ts_state is None:
+                return None
+            result = {"ticker": ticker, "as_of": now, "windows": describe(ts_state.value_at(now))}
+            if compare:
+                past = ts_state.checkpoint_before(now - compare)
+                result["compare"] = {
+                    "as_of": now - compare,
+                    "windows": describe(past) if past is not None else None,
+                }
+            return result
+
+    def _load_snapshot(self, header: bytes):
+        # State as of the last compaction, and where to read the log with this header from
+        self.tickers = {}
+        self.header = header
+        self.offset = self.snapshot_offset = len(header)
+        if not os.path.exists(self.snapshot_path):
+            return
+        with open(self.snapshot_path) as f:
+            snap = json.load(f)
+        if snap.get("windows") != list(WINDOWS):
+            return
+        for ticker, data in snap["tickers"].items():
+            ts_state = TickerState()
+            ts_state.state = np.array(data["state"])
+            ts_state.last_ts = data["last_ts"]
+            ts_state.checkpoints = [(b, np.array(s)) for b, s in data["checkpoints"]]
+            ts_state.seen = OrderedDict.fromkeys(data["seen"])
+            self.tickers[ticker] = ts_state
+        # Where the snapshot's state ends in each log generation it is valid for
+        # (snapshots from before generation headers hold a single offset). A log
+        # started after the snapshot was written is read from its start.
+        positions = {bytes.fromhex(g): offset for g, offset in snap.get("positions", [("", snap.get("offset", 0))])}
+        self.offset = self.snapshot_offset = positions.get(header, len(header))
+
+    def _write_snapshot(self, positions: List[tuple]):
+        snap = {
+            "windows": list(WINDOWS),
+            "positions": [(header.hex(), offset) for header, offset in positions],
+            "tickers": {
+                ticker: {
+                    "state": s.state.tolist(),
+                    "last_ts": s.last_ts,
+                    "checkpoints": [(b, st.tolist()) for b, st in s.checkpoints],
+                    "seen": list(s.seen),
+                }
+                for ticker, s in self.tickers.items()
+            },
+        }
+        tmp = f"{self.snapshot_path}.{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(snap, f)
+        os.replace(tmp, self.snapshot_path)
+
+
+def describe(state: np.ndarray):
+    windows = {}
+    for name, row in zip(WINDOWS, state):
+        weight = float(row[4])
+        counts = {label: round(float(v), 4) for label, v in zip(LABELS, row[:3])}
+        windows[name] = {
+            "counts": counts,
+            "percentages": {label: round(v * 100 / weight, 1) if weight else 0.0 for label, v in counts.items()},
+            "mean_score": round(float(row[3]) / weight, 4) if weight else 0.0,
+            "weight": round(weight, 4),
+        }
+    return windows
+
+
+def parse_window(value: str) -> float:
+    units = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+    if not value or value[-1] not in units or not value[:-1].isdigit():
+        raise ValueError(f"invalid window {value!r}, expected e.g. 1h, 1d or 7d")
+    return int(value[:-1]) * units[value[-1]]
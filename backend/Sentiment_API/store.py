@@ -0,0 +1,651 @@
+# Persistence for sentiment results (tables and functions in db/supabase-schema.sql).
+#
+# Writes go through a bounded write-behind queue drained by one background
+# thread: queued units (one or more records, never split) are coalesced into
+# one put_sentiment_results() call per batch, keeping one request row per
+# (ticker, model_used), and retried with backoff.
+# Reads go through an LRU + TTL cache, then records still waiting in the
+# queue, before hitting the backend. Every write replaces the row of its
+# (ticker, model_used), so once it lands the old ids are dropped from this
+# worker's cache and announced to the other workers through a shared
+# invalidation log (see SharedInvalidations), as are deletes.
+#
+# Records are stored normalized: each headline's (label, score) once per day in
+# sentiment_scores, keyed by a hash of its text, and a light sentiment_requests
+# row with the summary and the ordered hashes. Items are rebuilt on read, and
+# known_scores() lets a new request reuse any headline scored recently.
+#
+# Backends: Supabase (default), a local Postgres via psycopg, or in-memory.
+
+import fcntl
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional
+
+from telemetry import SIZE_BUCKETS, metrics, stage
+
+SCORES_TABLE = "sentiment_scores"
+REQUESTS_TABLE = "sentiment_requests"
+LATEST_COLUMNS = ["id", "ticker", "model_used", "summary", "min_confidence", "created_at"]
+LABELS = ["positive", "neutral", "negative"]
+LABEL_IDS = {label: i for i, label in enumerate(LABELS)}
+
+# Reads hide rows older than a day (partitions are dropped a day later), so a
+# cached record is never served past the point where the API stops returning it
+RECORD_TTL = 24 * 60 * 60
+# Days of sentiment_scores partitions searched by known_scores()
+REUSE_DAYS = 1
+# Hashes per known_scores() query, to keep PostgREST URLs short
+LOOKUP_CHUNK = 200
+
+
+def headline_hash(headline: str) -> str:
+    return hashlib.blake2b(headline.encode(), digest_size=8).hexdigest()
+
+
+def to_row(record: dict) -> dict:
+    # API record -> put_sentiment_results() row; items are index-aligned with headlines
+    hashes = [headline_hash(h) for h in record["headlines"]]
+    scores = {}
+    for h, hash_, item in zip(record["headlines"], hashes, record["items"]):
+        scores.setdefault(hash_, {"headline_hash": hash_, "headline": h,
+                                  "label": LABEL_IDS[item["label"]], "score": float(item["score"])})
+    return {
+        "id": record["id"],
+        "ticker": record["ticker"],
+        "model_used": record["model_used"],
+        "summary": record["summary"],
+        "min_confidence": record["min_confidence"],
+        "headline_hashes": hashes,
+        "cluster_sizes": [item.get("cluster_size", 1) for item in record["items"]],
+        "scores": list(scores.values()),
+    }
+
+
+def from_row(row: dict) -> dict:
+    # get_sentiment_result() row -> API record; high_confidence follows the stored threshold
+    min_confidence = float(row["min_confidence"])
+    items = [
+        {"headline": h, "label": LABELS[label], "score": float(score),
+         "high_confidence": float(score) >= min_confidence, "model_used": row["model_used"],
+         "cluster_size": cluster_size}
+        for h, label, score, cluster_size in row["items"]
+    ]
+    record = {
+        "id": row["id"],
+        "ticker": row["ticker"],
+        "model_used": row["model_used"],
+        "headlines": [it["headline"] for it in items],
+        "items": items,
+        "summary": row["summary"],
+        "min_confidence": min_confidence,
+    }
+    if row.get("created_at") is not None:
+        record["created_at"] = str(row["created_at"])
+    return record
+
+
+# ------------------------
+# Read-through cache
+# ------------------------
+class TTLCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = RECORD_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[object, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            return entry[1] if entry else None
+
+    def pop_matching(self, match: Callable[[object], bool]) -> list:
+        # Removes the entries whose value matches; returns their keys
+        with self.lock:
+            keys = [k for k, (_, value) in self.entries.items() if match(value)]
+            for k in keys:
+                del self.entries[k]
+            return keys
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# ------------------------
+# Cross-worker invalidation
+# ------------------------
+class SharedInvalidations:
+    # Append-only log of replaced and deleted results, one JSON line each,
+    # shared by the workers on a host. Writers append under an exclusive lock;
+    # readers stat the file before each cached read and apply only the lines
+    # added since. Once the log passes max_bytes the next writer truncates it
+    # and starts a new generation header, and readers that see a different
+    # header drop their whole cache, since they may have missed lines.
+    def __init__(self, path: str, max_bytes: int = 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.header: Optional[bytes] = None
+        self.offset = 0
+        self.seen = (0, 0)  # (size, mtime_ns) at the last poll
+        self.lock = threading.Lock()
+        # Earlier lines predate this process's cache
+        try:
+            with open(self.path, "rb") as f:
+                self.header = f.readline()
+                f.seek(0, os.SEEK_END)
+                self.offset = f.tell()
+            st = os.stat(self.path)
+            self.seen = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+
+    def publish(self, entries: List[dict]):
+        if not entries:
+            return
+        data = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries).encode()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                size = os.fstat(fd).st_size
+                if size == 0 or size > self.max_bytes:
+                    os.ftruncate(fd, 0)
+                    data = f"generation {os.urandom(8).hex()}\n".encode() + data
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"sentiment cache invalidation not shared: {e}")
+
+    def poll(self) -> Optional[List[dict]]:
+        # Entries published since the last poll; None when the log was rotated
+        # past this reader and the whole cache must go
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        with self.lock:
+            if (st.st_size, st.st_mtime_ns) == self.seen:
+                return []
+            self.seen = (st.st_size, st.st_mtime_ns)
+            with open(self.path, "rb") as f:
+                header = f.readline()
+                # No log (or an empty one, still being created) when this reader
+                # started: nothing cached can have been missed
+                rotated = bool(self.header) and (header != self.header or st.st_size < self.offset)
+                if header != self.header or st.st_size < self.offset:
+                    self.header, self.offset = header, len(header)
+                f.seek(self.offset)
+                data = f.read()
+            # Only complete lines; a partial one is read again next time
+            data = data[:data.rfind(b"\n") + 1]
+            self.offset += len(data)
+        if rotated:
+            return None
+        entries = []
+        for line in data.splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+
+# ------------------------
+# Backends
+# ------------------------
+class SupabaseBackend:
+    def __init__(self, client_factory):
+        # The client is built on first use, after gunicorn has forked the worker
+        self.client_factory = client_factory
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self.client_factory()
+        return self._client
+
+    def warm(self):
+        return self.client is not None
+
+    def upsert_many(self, rows: List[dict]):
+        self.client.rpc("put_sentiment_results", {"p_rows": rows}).execute()
+
+    def get(self, id: str) -> Optional[dict]:
+        res = self.client.rpc("get_sentiment_result", {"p_id": id}).execute()
+        return res.data or None
+
+    def latest(self, ticker: str, model_used: str) -> Optional[dict]:
+        since = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - RECORD_TTL))
+        res = (self.client.table(REQUESTS_TABLE).select(",".join(LATEST_COLUMNS))
+               .eq("ticker", ticker).eq("model_used", model_used).gt("created_at", since)
+               .order("created_at", desc=True).limit(1).execute())
+        return res.data[0] if res.data else None
+
+    def known_scores(self, model_used: str, hashes: List[str]) -> Dict[str, tuple]:
+        since = (date.today() - timedelta(days=REUSE_DAYS)).isoformat()
+        found = {}
+        for i in range(0, len(hashes), LOOKUP_CHUNK):
+            res = (self.client.table(SCORES_TABLE).select("headline_hash,label,score")
+                   .eq("model_used", model_used).gte("scored_on", since)
+                   .in_("headline_hash", hashes[i:i + LOOKUP_CHUNK]).execute())
+            for r in res.data:
+                found[r["headline_hash"]] = (r["label"], float(r["score"]))
+        return found
+
+    def delete(self, id: str) -> bool:
+        # PostgREST returns the deleted rows, so no select is needed up front.
+        # Scores stay until their partition is dropped: other requests may share them.
+        res = self.client.table(REQUESTS_TABLE).delete().eq("id", id).execute()
+        return bool(res.data)
+
+
+class PostgresBackend:
+    def __init__(self, dsn: str):
+        import psycopg  # optional: only needed for a local Postgres
+        from psycopg.types.json import Jsonb
+
+        self.psycopg = psycopg
+        self.Jsonb = Jsonb
+        self.dsn = dsn
+        self._conn = None
+        self.lock = threading.Lock()
+
+    @property
+    def conn(self):
+        # Connected lazily so a preloading master never hands a socket to its workers
+        if self._conn is None:
+            self._conn = self.psycopg.connect(self.dsn, autocommit=True)
+        return self._conn
+
+    def warm(self):
+        with self.lock:
+            return self.conn is not None
+
+    def upsert_many(self, rows: List[dict]):
+        with self.lock:
+            self.conn.execute("select put_sentiment_results(%s)", (self.Jsonb(rows),))
+
+    def get(self, id: str) -> Optional[dict]:
+        with self.lock:
+            row = self.conn.execute("select get_sentiment_result(%s)", (id,)).fetchone()
+        return row[0] if row else None
+
+    def latest(self, ticker: str, model_used: str) -> Optional[dict]:
+        with self.lock:
+            cur = self.conn.execute(
+                f"select {', '.join(LATEST_COLUMNS)} from {REQUESTS_TABLE} "
+                "where ticker = %s and model_used = %s and created_at > now() - interval '1 day' "
+                "order by created_at desc limit 1",
+                (ticker, model_used))
+            row = cur.fetchone()
+        if row is None:
+            return None
+        record = dict(zip(LATEST_COLUMNS, row))
+        record["min_confidence"] = float(record["min_confidence"])
+        record["created_at"] = str(record["created_at"])
+        return record
+
+    def known_scores(self, model_used: str, hashes: List[str]) -> Dict[str, tuple]:
+        with self.lock:
+            cur = self.conn.execute(
+                f"select headline_hash, label, score from {SCORES_TABLE} "
+                "where model_used = %s and scored_on >= current_date - %s and headline_hash = any(%s)",
+                (model_used, REUSE_DAYS, hashes))
+            return {h: (label, float(score)) for h, label, score in cur.fetchall()}
+
+    def delete(self, id: str) -> bool:
+        with self.lock:
+            cur = self.conn.execute(f"delete from {REQUESTS_TABLE} where id = %s returning id", (id,))
+            return cur.fetchone() is not None
+
+
+class MemoryBackend:
+    # Same normalized layout as the SQL tables, without expiry
+    def __init__(self):
+        self.scores: Dict[tuple, tuple] = {}  # (model_used, hash) -> (headline, label, score)
+        self.rows: Dict[str, dict] = {}
+        self.by_key: Dict[tuple, str] = {}
+        self.lock = threading.Lock()
+
+    def warm(self):
+        return True
+
+    def upsert_many(self, rows: List[dict]):
+        with self.lock:
+            for r in rows:
+                for s in r["scores"]:
+                    self.scores.setdefault((r["model_used"], s["headline_hash"]),
+                                           (s["headline"], s["label"], s["score"]))
+                old_id = self.by_key.get((r["ticker"], r["model_used"]))
+                if old_id is not None:
+                    self.rows.pop(old_id, None)
+                # Round-trip through JSON so callers never share mutable state with the store
+                row = json.loads(json.dumps({k: v for k, v in r.items() if k != "scores"}))
+                row["created_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+                self.rows[r["id"]] = row
+                self.by_key[(r["ticker"], r["model_used"])] = r["id"]
+
+    def get(self, id: str) -> Optional[dict]:
+        with self.lock:
+            row = self.rows.get(id)
+            if row is None:
+                return None
+            items = [list(self.scores[(row["model_used"], h)]) + [size]
+                     for h, size in zip(row["headline_hashes"], row["cluster_sizes"])]
+            return {**{k: row[k] for k in LATEST_COLUMNS}, "items": items}
+
+    def latest(self, ticker: str, model_used: str) -> Optional[dict]:
+        with self.lock:
+            row = self.rows.get(self.by_key.get((ticker, model_used)))
+            return {k: row.get(k) for k in LATEST_COLUMNS} if row else None
+
+    def known_scores(self, model_used: str, hashes: List[str]) -> Dict[str, tuple]:
+        with self.lock:
+            found = {h: self.scores.get((model_used, h)) for h in hashes}
+            return {h: (v[1], v[2]) for h, v in found.items() if v is not None}
+
+    def delete(self, id: str) -> bool:
+        with self.lock:
+            row = self.rows.pop(id, None)
+            if row is None:
+                return False
+            self.by_key.pop((row["ticker"], row["model_used"]), None)
+            return True
+
+
+# ------------------------
+# Write-behind queue
+# ------------------------
+class WriteBehindStore:
+    def __init__(self, backend, max_pending: int = 1000, batch_size: int = 100,
+                 flush_interval: float = 0.05, max_retries: int = 5,
+                 cache: Optional[TTLCache] = None, latest_cache: Optional[TTLCache] = None,
+                 invalidations: Optional[SharedInvalidations] = None):
+        self.backend = backend
+        self.invalidations = invalidations
+        self.cache = cache or TTLCache()
+        # Other workers can replace a ticker's row, so this one is kept short-lived
+        self.latest_cache = latest_cache or TTLCache(ttl=60)
+        self.key_ids: Dict[tuple, str] = {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.queue: "queue.Queue[List[dict]]" = queue.Queue(maxsize=max_pending)
+        self.pending: Dict[str, dict] = {}
+        self.deleted: set = set()
+        # old id -> id of the queued record whose upsert will replace it
+        self.superseded: Dict[str, str] = {}
+        self.writing = 0  # batches whose write or invalidations are not finished
+        self.lock = threading.Lock()
+        self.worker: Optional[threading.Thread] = None
+
+    def warm(self):
+        return self.backend.warm()
+
+    def _ensure_worker(self):
+        # Started lazily so the thread is created in the serving process, not before a fork
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._run, name="sentiment-write-behind", daemon=True)
+            self.worker.start()
+
+    def put(self, record: dict, replaces: Optional[str] = None):
+        # `replaces`: the id this record updates, which may not be cached here
+        self.put_many([record], {replaces: record["id"]} if replaces else None)
+
+    def put_many(self, records: List[dict], replaces: Optional[Dict[str, str]] = None):
+        with self.lock:
+            for old_id, new_id in (replaces or {}).items():
+                if old_id != new_id:
+                    self.cache.pop(old_id)
+                    self.superseded[old_id] = new_id
+            for r in records:
+                self.pending[r["id"]] = r
+                # The upsert replaces whatever row held this (ticker, model_used)
+                key = (r["ticker"], r["model_used"])
+                old_ids = set(self.cache.pop_matching(lambda c, r=r: _same_key(c, r) and c["id"] != r["id"]))
+                if self.key_ids.get(key) is not None:
+                    old_ids.add(self.key_ids[key])
+                for old_id in old_ids - {r["id"]}:
+                    self.cache.pop(old_id)
+                    self.superseded[old_id] = r["id"]
+                self.key_ids[key] = r["id"]
+                self.cache.set(r["id"], r)
+                self.latest_cache.pop(key)
+        self._ensure_worker()
+        try:
+            self.queue.put(list(records), timeout=1.0)
+        except queue.Full:
+            # Queue is saturated: apply backpressure by writing on the caller's thread
+            self._write(list(records))
+
+    def sync(self):
+        # Applies deletes and replacements published by other workers
+        if self.invalidations is None:
+            return
+        entries = self.invalidations.poll()
+        if entries is None:
+            self.cache.clear()
+            self.latest_cache.clear()
+            return
+        for e in entries:
+            if e.get("op") == "delete":
+                self.cache.pop(e["id"])
+                self.latest_cache.pop_matching(lambda c, e=e: c.get("id") == e["id"])
+            elif e.get("op") == "replace":
+                self._replaced(e["ticker"], e["model_used"], e["id"])
+
+    def _replaced(self, ticker: str, model_used: str, id: str):
+        # The row of (ticker, model_used) is now `id`: anything else cached for it is gone
+        current = {"ticker": ticker, "model_used": model_used}
+        self.cache.pop_matching(lambda c: _same_key(c, current) and c["id"] != id)
+        self.latest_cache.pop((ticker, model_used))
+
+    def get(self, id: str) -> Optional[dict]:
+        self.sync()
+        record = self.cache.get(id)
+        if record is not None:
+            return record
+        with self.lock:
+            if id in self.deleted or id in self.superseded:
+                return None
+            record = self.pending.get(id)
+        if record is not None:
+            return record
+        row = self.backend.get(id)
+        if row is None:
+            return None
+        record = from_row(row)
+        self.cache.set(id, record)
+        return record
+
+    def latest(self, ticker: str, model_used: str) -> Optional[dict]:
+        self.sync()
+        key = (ticker, model_used)
+        record = self.latest_cache.get(key)
+        if record is not None:
+            return record
+        with self.lock:
+            pending = self.pending.get(self.key_ids.get(key))
+        if pending is not None:
+            return {k: pending.get(k) for k in LATEST_COLUMNS}
+        record = self.backend.latest(ticker, model_used)
+        if record is not None:
+            self.latest_cache.set(key, record)
+        return record
+
+    def known_scores(self, model_used: str, headlines: List[str]) -> Dict[str, tuple]:
+        # {headline: (label, score)} for headlines already scored recently by any
+        # worker. Best effort: a failed lookup only means those headlines get scored.
+        hashes = {headline_hash(h): h for h in headlines}
+        if not hashes:
+            return {}
+        try:
+            found = self.backend.known_scores(model_used, list(hashes))
+        except Exception as e:
+            print(f"sentiment score lookup failed: {e}")
+            return {}
+        return {hashes[h]: (LABELS[label], score) for h, (label, score) in found.items()}
+
+    def delete(self, id: str) -> bool:
+        record = self.cache.pop(id)
+        with self.lock:
+            was_pending = self.pending.pop(id, None) is not None
+            if was_pending:
+                self.deleted.add(id)
+            for key, key_id in list(self.key_ids.items()):
+                if key_id == id:
+                    del self.key_ids[key]
+                    self.latest_cache.pop(key)
+        if record is not None:
+            self.latest_cache.pop((record["ticker"], record["model_used"]))
+        deleted = self.backend.delete(id) or was_pending
+        if self.invalidations is not None:
+            self.invalidations.publish([{"op": "delete", "id": id}])
+        return deleted
+
+    def flush(self, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                if not self.pending and self.queue.empty() and not self.writing:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.extend(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: List[dict]):
+        with self.lock:
+            self.writing += 1
+        try:
+            self._write_batch(batch)
+        finally:
+            with self.lock:
+                self.writing -= 1
+
+    def _write_batch(self, batch: List[dict]):
+        with self.lock:
+            live = [r for r in batch if r["id"] not in self.deleted]
+        # One multi-row upsert cannot touch the same conflict key twice; keep the newest
+        latest: Dict[tuple, dict] = {}
+        for r in live:
+            latest[(r["ticker"], r["model_used"])] = r
+        rows = list(latest.values())
+
+        if rows:
+            metrics.observe("store_write_rows", len(rows), buckets=SIZE_BUCKETS)
+        written = False
+        for attempt in range(self.max_retries):
+            try:
+                if rows:
+                    with stage("store_write"):
+                        self.backend.upsert_many([to_row(r) for r in rows])
+                written = True
+                break
+            except Exception as e:
+                print(f"sentiment results write failed (attempt {attempt + 1}): {e}")
+                if attempt + 1 < self.max_retries:
+                    metrics.inc("retries", operation="store_write")
+                    time.sleep(min(0.1 * 2 ** attempt, 5.0))
+        else:
+            print(f"dropping {len(rows)} sentiment results after {self.max_retries} attempts")
+            metrics.inc("store_dropped_rows", len(rows))
+
+        with self.lock:
+            for r in batch:
+                if self.pending.get(r["id"]) is r:
+                    del self.pending[r["id"]]
+            # Rows deleted while their write was in flight still need removing
+            raced = [r["id"] for r in live if r["id"] in self.deleted]
+            for r in batch:
+                self.deleted.discard(r["id"])
+            batch_ids = {r["id"] for r in batch}
+            for old_id, new_id in list(self.superseded.items()):
+                if new_id in batch_ids:
+                    del self.superseded[old_id]
+        for id in raced:
+            self.backend.delete(id)
+        if written and rows:
+            # The rows these replaced may be cached here from the backend, or by other workers
+            for r in rows:
+                self._replaced(r["ticker"], r["model_used"], r["id"])
+            if self.invalidations is not None:
+                self.invalidations.publish([{"op": "replace", "ticker": r["ticker"], "model_used": r["model_used"],
+                                             "id": r["id"]} for r in rows])
+
+
+def _same_key(a: dict, b: dict) -> bool:
+    return a.get("ticker") == b["ticker"] and a.get("model_used") == b["model_used"]
+
+
+def create_store(supabase_factory=None) -> WriteBehindStore:
+    kind = os.environ.get("SENTIMENT_STORE", "supabase")
+    if kind == "memory":
+        backend = MemoryBackend()
+    elif kind == "postgres":
+        backend = PostgresBackend(os.environ["SENTIMENT_DATABASE_URL"])
+    else:
+        backend = SupabaseBackend(supabase_factory)
+    invalidation_log = os.environ.get("SENTIMENT_INVALIDATION_LOG", "/tmp/sentiment_invalidations.log")
+    return WriteBehindStore(
+        backend,
+        max_pending=int(os.environ.get("SENTIMENT_WRITE_QUEUE_SIZE", "1000")),
+        batch_size=int(os.environ.get("SENTIMENT_WRITE_BATCH_SIZE", "100")),
+        cache=TTLCache(
+            max_entries=int(os.environ.get("SENTIMENT_CACHE_SIZE", "1024")),
+            ttl=float(os.environ.get("SENTIMENT_CACHE_TTL", str(RECORD_TTL))),
+        ),
+        latest_cache=TTLCache(
+            max_entries=int(os.environ.get("SENTIMENT_CACHE_SIZE", "1024")),
+            ttl=float(os.environ.get("SENTIMENT_LATEST_TTL", "60")),
+        ),
+        # Shared by the workers on this host; empty for a single process
+        invalidations=SharedInvalidations(invalidation_log) if invalidation_log else None,
+    )
@@ -0,0 +1,283 @@
+# Request timing and counters for the Sentiment API (/metrics, Server-Timing).
+#
+# Every request gets a trace: the trace id of an incoming W3C traceparent (or
+# X-Request-ID, or a new one) and the stages timed while serving it. A stage
+# is a block wrapped in `with stage("inference"):`; it lands in the per-stage
+# latency histogram and in the response's Server-Timing header, with "total"
+# for the whole request. Time the route spends outside any stage (request
+# parsing and validation, dependency resolution, response_model validation
+# and serialization) is recorded as the "framework" stage by TimedRoute.
+# The trace id is returned as X-Trace-Id and sent on to Hugging Face as a
+# traceparent (see trace_headers), so a slow request can be followed upstream.
+#
+# Histograms, counters and gauges are per worker process, like the caches and
+# queues they describe: /metrics answers for the worker that served it (pid),
+# and a scraper sums across workers. ?format=prometheus returns the text
+# exposition format.
+
+import contextvars
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+PREFIX = "sentiment_"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        cumulative, seen = {}, 0
+        for bound, n in zip(list(self.buckets) + ["+Inf"], self.counts):
+            seen += n
+            cumulative[f"{bound:g}" if bound != "+Inf" else bound] = seen
+        return {"count": self.count, "sum": round(self.sum, 3),
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99),
+                "buckets": cumulative}
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[str, Callable[[], dict]] = {}
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS_MS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, n: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def gauge(self, name: str, read: Callable[[], dict]):
+        # read() -> {label value or "": number}, evaluated when metrics are read
+        self.gauges[name] = read
+
+    def read_gauges(self) -> Dict[str, dict]:
+        values = {}
+        for name, read in self.gauges.items():
+            try:
+                values[name] = read()
+            except Exception as e:
+                values[name] = {"error": str(e)}
+        return values
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            histograms, counters = {}, {}
+            for (name, labels), h in sorted(self.histograms.items()):
+                histograms.setdefault(name, []).append({"labels": dict(labels), **h.snapshot()})
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return {"histograms": histograms, "counters": counters, "gauges": self.read_gauges()}
+
+    def prometheus(self) -> str:
+        lines: List[str] = []
+        with self.lock:
+            typed = set()
+            for (name, labels), h in sorted(self.histograms.items()):
+                metric = PREFIX + name
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                seen = 0
+                for bound, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    seen += n
+                    le = bound if bound == "+Inf" else f"{bound:g}"
+                    lines.append(f"{metric}_bucket{_labels(labels + (('le', le),))} {seen}")
+                lines.append(f"{metric}_sum{_labels(labels)} {h.sum:.6g}")
+                lines.append(f"{metric}_count{_labels(labels)} {h.count}")
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = PREFIX + name + "_total"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{_labels(labels)} {value:g}")
+        for name, values in sorted(self.read_gauges().items()):
+            metric = PREFIX + name
+            numbers = {k: v for k, v in values.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+            if not numbers:
+                continue
+            lines.append(f"# TYPE {metric} gauge")
+            for key, value in sorted(numbers.items()):
+                lines.append(f"{metric}{_labels((('name', key),) if key else ())} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                          for k, v in labels) + "}"
+
+
+metrics = Metrics()
+
+
+# ------------------------
+# Traces
+# ------------------------
+TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+
+class Trace:
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        self.stages: Dict[str, List[float]] = {}  # name -> [ms, calls]
+        self.route: Optional[str] = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_headers(cls, headers) -> "Trace":
+        # W3C traceparent first, then X-Request-ID (used as the trace id when it is one)
+        values = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in headers}
+        match = TRACEPARENT.match(values.get("traceparent", "").strip().lower())
+        if match and match.group(1) != "0" * 32:
+            return cls(match.group(1))
+        request_id = values.get("x-request-id", "").strip().lower().replace("-", "")
+        if re.fullmatch(r"[0-9a-f]{32}", request_id):
+            return cls(request_id)
+        return cls(os.urandom(16).hex())
+
+    def add(self, name: str, ms: float):
+        with self.lock:
+            entry = self.stages.setdefault(name, [0.0, 0])
+            entry[0] += ms
+            entry[1] += 1
+
+    def staged_ms(self) -> float:
+        with self.lock:
+            return sum(ms for ms, _ in self.stages.values())
+
+    def server_timing(self) -> str:
+        with self.lock:
+            parts = [f'{name};dur={ms:.1f}' + (f';desc="{calls} calls"' if calls > 1 else "")
+                     for name, (ms, calls) in self.stages.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+current: "contextvars.ContextVar[Optional[Trace]]" = contextvars.ContextVar("sentiment_trace", default=None)
+
+
+def record(name: str, ms: float):
+    # An already measured stage of the current request
+    metrics.observe("stage_ms", ms, stage=name)
+    trace = current.get()
+    if trace is not None:
+        trace.add(name, ms)
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - started) * 1000)
+
+
+def trace_headers() -> dict:
+    # For upstream calls: the current trace id under a fresh span id
+    trace = current.get()
+    if trace is None:
+        return {}
+    return {"traceparent": f"00-{trace.trace_id}-{os.urandom(8).hex()}-01"}
+
+
+class TelemetryMiddleware:
+    # Outermost ASGI middleware: starts the trace, adds X-Trace-Id and
+    # Server-Timing to the response, and records request latency per route
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = Trace.from_headers(scope.get("headers", []))
+        token = current.set(trace)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Trace-Id", trace.trace_id)
+                headers.append("Server-Timing", trace.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current.reset(token)
+            # Route templates, not paths: ids in paths would make a series per record
+            route = trace.route or "unmatched"
+            ms = (time.perf_counter() - trace.started) * 1000
+            metrics.observe("request_ms", ms, route=route, method=scope["method"])
+            metrics.inc("requests", route=route, method=scope["method"], status=str(status))
+
+
+class TimedRoute(APIRoute):
+    # Records time the route handler spends outside the endpoint's own stages
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        path = self.path
+
+        async def timed_handler(request):
+            trace = current.get()
+            started = time.perf_counter()
+            staged = trace.staged_ms() if trace is not None else 0.0
+            if trace is not None:
+                trace.route = path
+            try:
+                return await handler(request)
+            finally:
+                ms = (time.perf_counter() - started) * 1000
+                if trace is not None:
+                    ms -= trace.staged_ms() - staged
+                record("framework", max(ms, 0.0))
+
+        return timed_handler
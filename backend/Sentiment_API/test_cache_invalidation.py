@@ -0,0 +1,131 @@
+# Replaced and deleted results must stop resolving, in the worker that wrote
+# them and in the others. Run from backend/Sentiment_API: python -m pytest -q
+import os
+import tempfile
+import uuid
+
+os.environ.setdefault("SENTIMENT_STORE", "memory")
+os.environ.setdefault("SENTIMENT_API_KEY", "test-key")
+os.environ.setdefault("HF_API_TOKEN", "unused")
+os.environ.setdefault("SENTIMENT_WARM_UP", "0")
+os.environ.setdefault("SENTIMENT_RATE_LIMIT_DB", "")
+os.environ.setdefault("SENTIMENT_INVALIDATION_LOG", "")
+os.environ.setdefault("SENTIMENT_INDEX_DIR", tempfile.mkdtemp())
+os.environ.setdefault("SENTIMENT_BREAKER_DIR", tempfile.mkdtemp())
+
+from fastapi.testclient import TestClient
+
+import main
+from store import MemoryBackend, SharedInvalidations, WriteBehindStore
+
+HEADERS = {"x-api-key": "test-key"}
+
+
+def make_record(ticker="AAPL", headlines=("Apple stock jumps",)):
+    return {"id": str(uuid.uuid4()), "ticker": ticker, "model_used": "finbert-tone",
+            "headlines": list(headlines),
+            "items": [{"headline": h, "label": "positive", "score": 0.9, "high_confidence": True,
+                       "model_used": "finbert-tone", "cluster_size": 1} for h in headlines],
+            "summary": {"counts": {"positive": len(headlines), "neutral": 0, "negative": 0},
+                        "percentages": {"positive": 100.0, "neutral": 0.0, "negative": 0.0},
+                        "total": len(headlines)},
+            "min_confidence": 0.7}
+
+
+def test_put_replacing_a_backend_loaded_id():
+    backend = MemoryBackend()
+    first = WriteBehindStore(backend)
+    old = make_record()
+    first.put(old)
+    assert first.flush()
+
+    # After a restart the old record is only known from the backend
+    restarted = WriteBehindStore(backend)
+    assert restarted.get(old["id"]) is not None
+    new = make_record()
+    restarted.put(new, replaces=old["id"])
+    assert restarted.get(old["id"]) is None
+    assert restarted.flush()
+    assert restarted.get(old["id"]) is None
+    assert restarted.get(new["id"])["id"] == new["id"]
+
+
+def test_other_workers_drop_replaced_and_deleted_ids(tmp_path):
+    backend = MemoryBackend()
+    log = str(tmp_path / "invalidations.log")
+    writer = WriteBehindStore(backend, invalidations=SharedInvalidations(log))
+    reader = WriteBehindStore(backend, invalidations=SharedInvalidations(log))
+
+    old = make_record()
+    writer.put(old)
+    assert writer.flush()
+    assert reader.get(old["id"]) is not None  # now cached by the reader
+
+    # A create for the same ticker replaces the row without naming the old id
+    new = make_record()
+    writer.put(new)
+    assert writer.flush()
+    assert reader.get(old["id"]) is None
+
+    assert reader.get(new["id"]) is not None
+    assert writer.delete(new["id"])
+    assert reader.get(new["id"]) is None
+
+
+def test_failed_write_keeps_the_replaced_id(tmp_path):
+    backend = MemoryBackend()
+    log = str(tmp_path / "invalidations.log")
+    writer = WriteBehindStore(backend, invalidations=SharedInvalidations(log), max_retries=2)
+    reader = WriteBehindStore(backend, invalidations=SharedInvalidations(log))
+
+    old = make_record()
+    writer.put(old)
+    assert writer.flush()
+    assert reader.get(old["id"]) is not None
+
+    def unavailable(rows):
+        raise ConnectionError("backend unavailable")
+
+    backend.upsert_many = unavailable
+    writer.put(make_record())
+    assert writer.flush()
+    # The new row was dropped: the old one is still the stored result and
+    # nothing was published to evict it
+    reader.sync()
+    assert old["id"] in reader.cache.entries
+
+
+def test_rotated_log_clears_the_reader_cache(tmp_path):
+    backend = MemoryBackend()
+    log = str(tmp_path / "invalidations.log")
+    writer = WriteBehindStore(backend, invalidations=SharedInvalidations(log, max_bytes=1))
+    reader = WriteBehindStore(backend, invalidations=SharedInvalidations(log, max_bytes=1))
+
+    kept = make_record(ticker="MSFT")
+    writer.put(kept)
+    assert writer.flush()
+    assert reader.get(kept["id"]) is not None
+    writer.put(make_record(ticker="NVDA"))
+    assert writer.flush()  # the log is over max_bytes: a new generation starts
+    reader.sync()
+    assert reader.cache.entries == {}
+
+
+def test_api_put_after_restart_unpublishes_the_old_id(monkeypatch):
+    old = make_record(ticker="TSLA", headlines=["Tesla deliveries beat estimates"])
+    backend = MemoryBackend()
+    seeded = WriteBehindStore(backend)
+    seeded.put(old)
+    assert seeded.flush()
+    monkeypatch.setattr(main, "store", WriteBehindStore(backend))
+
+    client = TestClient(main.app)
+    assert client.get(f"/api/sentiment/{old['id']}", headers=HEADERS).status_code == 200
+    # Same headlines: the stored scores are reused and no inference is needed
+    updated = client.put(f"/api/sentiment/{old['id']}", headers=HEADERS,
+                         json={"headlines": old["headlines"], "min_confidence": 0.8})
+    assert updated.status_code == 200
+    assert client.get(f"/api/sentiment/{old['id']}", headers=HEADERS).status_code == 404
+    assert main.store.flush()
+    assert client.get(f"/api/sentiment/{old['id']}", headers=HEADERS).status_code == 404
+    assert client.get(f"/api/sentiment/{updated.json()['id']}", headers=HEADERS).status_code == 200
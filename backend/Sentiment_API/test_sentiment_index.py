@@ -0,0 +1,60 @@
+# The shared sentiment index log is compacted into a snapshot without any
+# worker losing or double counting records. Run from backend/Sentiment_API:
+# python -m pytest -q
+import os
+
+import sentiment_index
+from sentiment_index import RECORD, SentimentIndex
+
+NOW = 1_700_000_000.0
+
+
+def record(index, ticker, n, start=0):
+    for i in range(start, start + n):
+        index.record(ticker, [f"{ticker} headline {i}"], ["positive" if i % 3 else "negative"], [0.9],
+                     ts=NOW + i)
+
+
+def windows(index, ticker):
+    return index.query(ticker, now=NOW + 1000)["windows"]
+
+
+def test_compaction_bounds_the_log(tmp_path):
+    writer = SentimentIndex(str(tmp_path), snapshot_every=10)
+    reader = SentimentIndex(str(tmp_path), snapshot_every=10)
+    record(writer, "AAPL", 15)
+    reader.sync()
+    record(writer, "AAPL", 30, start=15)  # the reader misses two compactions
+
+    assert os.path.getsize(writer.log_path) < 10 * RECORD.size + sentiment_index.HEADER_SIZE
+    fresh = SentimentIndex(str(tmp_path), snapshot_every=10)
+    unbounded = SentimentIndex(str(tmp_path / "unbounded"), snapshot_every=10 ** 6)
+    record(unbounded, "AAPL", 45)
+    assert windows(writer, "AAPL") == windows(reader, "AAPL") == windows(fresh, "AAPL") \
+        == windows(unbounded, "AAPL")
+    assert windows(fresh, "AAPL")["7d"]["weight"] > 44.5
+
+
+def test_compaction_stopped_before_truncating(tmp_path, monkeypatch):
+    index = SentimentIndex(str(tmp_path), snapshot_every=10)
+    record(index, "MSFT", 9)
+
+    # The snapshot is written, then the process dies before truncating the log
+    write_snapshot = SentimentIndex._write_snapshot
+
+    def die(self, positions):
+        write_snapshot(self, positions)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(SentimentIndex, "_write_snapshot", die)
+    try:
+        record(index, "MSFT", 1, start=9)
+    except KeyboardInterrupt:
+        pass
+    monkeypatch.undo()
+
+    restarted = SentimentIndex(str(tmp_path), snapshot_every=10)
+    record(restarted, "MSFT", 3, start=10)
+    unbounded = SentimentIndex(str(tmp_path / "unbounded"), snapshot_every=10 ** 6)
+    record(unbounded, "MSFT", 13)
+    assert windows(restarted, "MSFT") == windows(unbounded, "MSFT")
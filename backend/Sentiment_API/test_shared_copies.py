@@ -0,0 +1,32 @@
+# Helpers both services carry a copy of must not drift apart.
+# Run from backend/Sentiment_API: python -m pytest -q
+import importlib.util
+import inspect
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load(service, module):
+    path = os.path.join(HERE, "..", service, module + ".py")
+    spec = importlib.util.spec_from_file_location(f"{service.lower()}_{module}", path)
+    loaded = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = loaded  # inspect finds a class's source through its module
+    spec.loader.exec_module(loaded)
+    return loaded
+
+
+def assert_same_source(module, names):
+    hmm, sentiment = load("HMM_API", module), load("Sentiment_API", module)
+    for name in names:
+        assert inspect.getsource(getattr(hmm, name)) == inspect.getsource(getattr(sentiment, name)), \
+            f"{module}.{name} differs between HMM_API and Sentiment_API"
+
+
+def test_compressed_helpers_match():
+    assert_same_source("compressed", ["_available", "compress", "choose"])
+
+
+def test_breakers_match():
+    assert_same_source("breaker", ["BreakerOpen", "CircuitBreaker", "run_with_deadline"])
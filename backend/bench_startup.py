@@ -0,0 +1,69 @@
+# Startup benchmark for the backend services.
+#
+# Usage: python bench_startup.py HMM_API [--top 25] [--depth 1] [--preload]
+#
+# Imports the service's main module in a fresh interpreter with
+# `python -X importtime` and prints the cumulative import time of the slowest
+# modules, the total time to import main, and (with --preload) the time to
+# import the heavy modules a preloading master would load.
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+def run_import(service_dir: str, statement: str, env: dict):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=service_dir, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.exit(proc.stderr.strip().splitlines()[-1])
+    return elapsed, parse_importtime(proc.stderr)
+
+
+def parse_importtime(stderr: str):
+    # Lines look like "import time:   self_us |   cumulative_us |   <indent>module",
+    # where the indent grows by two spaces per nesting level
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_part, cumulative_part, raw_name = line.split("|")
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        rows.append((raw_name.strip(), depth, int(self_part.split(":")[1]), int(cumulative_part)))
+    return rows
+
+
+def report(title: str, elapsed: float, rows, top: int, max_depth: int):
+    print(f"\n{title}: {elapsed * 1000:.0f} ms wall (incl. interpreter start)")
+    shown = [r for r in rows if r[1] <= max_depth]
+    print(f"{'module':<45}{'cumulative ms':>15}{'self ms':>10}")
+    for name, depth, self_us, cumulative_us in sorted(shown, key=lambda r: -r[3])[:top]:
+        print(f"{'  ' * depth + name:<45}{cumulative_us / 1000:>15.1f}{self_us / 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("service", help="service directory, e.g. HMM_API or Sentiment_API")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--depth", type=int, default=1, help="nesting depth of modules to list (0 = top level)")
+    parser.add_argument("--preload", action="store_true", help="also time the preloaded heavy modules")
+    args = parser.parse_args()
+
+    service_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), args.service)
+    env = {**os.environ, "GUNICORN_PRELOAD": "0"}
+
+    elapsed, rows = run_import(service_dir, "import main", env)
+    report(f"{args.service}: import main", elapsed, rows, args.top, args.depth)
+
+    if args.preload:
+        elapsed, rows = run_import(service_dir, "import main; main.preload_modules()", env)
+        report(f"{args.service}: import main + preload_modules()", elapsed, rows, args.top, args.depth)
+
+
+if __name__ == "__main__":
+    main()
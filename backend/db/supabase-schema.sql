@@ -48,20 +48,124 @@ CREATE INDEX idx_playbook_setups_user_id
 ON playbook_setups(user_id);
 
 
-create table if not exists sentiment_results (
-  id text primary key,                       -- cryptographic id generated in FastAPI
-  ticker text not null,                      -- stock ticker
-  model_used text not null,                  -- sentiment model used
-  headlines jsonb not null,                  -- array of input headlines
-  items jsonb not null,                      -- structured items returned by model
-  summary jsonb not null,                    -- sentiment summary
-  min_confidence numeric NOT NULL DEFAULT 0.7 -- min confidence level
-  created_at timestamptz default now()
-);
-
--- Ensure that ticker + model_used is unique (only one record per pair)
-create unique index if not exists sentiment_results_ticker_model_idx
-on sentiment_results (ticker, model_used);
+-- Sentiment results (Sentiment_API), partitioned by day.
+--
+-- sentiment_scores holds one row per scored headline per day, keyed by a hash
+-- of the headline text, so requests that repeat a headline share its row.
+-- sentiment_requests is the light per-request row: summary, settings and
+-- the ordered headline hashes. A request only references scores from its own
+-- day partition (put_sentiment_results re-inserts reused scores into today's
+-- partition), so both tables expire together by dropping whole partitions.
+create table if not exists sentiment_scores (
+  scored_on date not null default current_date,   -- partition key
+  model_used text not null,
+  headline_hash text not null,                    -- blake2b-64 hex of the headline text
+  headline text not null,
+  label smallint not null,                        -- 0 positive, 1 neutral, 2 negative
+  score double precision not null,
+  primary key (scored_on, model_used, headline_hash)
+) partition by range (scored_on);
+
+create table if not exists sentiment_requests (
+  created_on date not null default current_date,  -- partition key
+  id text not null,                               -- id generated in FastAPI
+  ticker text not null,
+  model_used text not null,
+  headline_hashes text[] not null,                -- request order, into sentiment_scores
+  cluster_sizes int[],                            -- near-duplicate cluster size per headline
+  summary jsonb not null,
+  min_confidence double precision not null default 0.7,
+  created_at timestamptz not null default now(),
+  primary key (created_on, id)
+) partition by range (created_on);
+
+-- GET /api/sentiment/{id} and DELETE look rows up by id alone
+create index if not exists sentiment_requests_id_idx on sentiment_requests (id);
+-- GET /api/sentiment/latest and the one-row-per-(ticker, model) replacement on write
+create index if not exists sentiment_requests_ticker_model_idx
+on sentiment_requests (ticker, model_used, created_at desc);
+
+-- Creates today's and the next p_ahead_days partitions and drops those older
+-- than p_keep_days. Expiry is a catalog operation, whatever the row count.
+create or replace function sentiment_maintain_partitions(p_keep_days int default 1, p_ahead_days int default 3)
+returns void language plpgsql as $$
+declare
+  d date;
+  part record;
+begin
+  for d in select generate_series(current_date, current_date + p_ahead_days, interval '1 day')::date loop
+    execute format('create table if not exists %I partition of sentiment_scores for values from (%L) to (%L)',
+                   'sentiment_scores_' || to_char(d, 'YYYYMMDD'), d, d + 1);
+    execute format('create table if not exists %I partition of sentiment_requests for values from (%L) to (%L)',
+                   'sentiment_requests_' || to_char(d, 'YYYYMMDD'), d, d + 1);
+  end loop;
+  for part in
+    select c.relname
+    from pg_inherits i
+    join pg_class c on c.oid = i.inhrelid
+    join pg_class p on p.oid = i.inhparent
+    where p.relname in ('sentiment_scores', 'sentiment_requests')
+      and to_date(right(c.relname, 8), 'YYYYMMDD') < current_date - p_keep_days
+  loop
+    execute format('drop table if exists %I', part.relname);
+  end loop;
+end;
+$$;
+
+select sentiment_maintain_partitions();
+select cron.schedule('sentiment-partitions', '5 0 * * *', 'select sentiment_maintain_partitions();');
+
+-- Writes a batch of results: [{id, ticker, model_used, summary, min_confidence,
+-- headline_hashes, cluster_sizes, scores: [{headline_hash, headline, label, score}]}].
+-- Keeps one request row per (ticker, model_used), as the API always has.
+create or replace function put_sentiment_results(p_rows jsonb)
+returns void language plpgsql as $$
+begin
+  insert into sentiment_scores (model_used, headline_hash, headline, label, score)
+  select r->>'model_used', s->>'headline_hash', s->>'headline', (s->>'label')::smallint, (s->>'score')::double precision
+  from jsonb_array_elements(p_rows) r
+  cross join lateral jsonb_array_elements(r->'scores') s
+  on conflict do nothing;
+
+  delete from sentiment_requests q
+  using jsonb_array_elements(p_rows) r
+  where q.ticker = r->>'ticker' and q.model_used = r->>'model_used';
+
+  insert into sentiment_requests (id, ticker, model_used, headline_hashes, cluster_sizes, summary, min_confidence)
+  select r->>'id', r->>'ticker', r->>'model_used',
+         array(select e from jsonb_array_elements_text(r->'headline_hashes') with ordinality t(e, i) order by i),
+         array(select e::int from jsonb_array_elements_text(r->'cluster_sizes') with ordinality t(e, i) order by i),
+         r->'summary', (r->>'min_confidence')::double precision
+  from jsonb_array_elements(p_rows) r;
+end;
+$$;
+
+-- One request with its items, joined from the same day's scores partition.
+-- Rows older than a day are hidden, as before, until their partition is dropped.
+create or replace function get_sentiment_result(p_id text)
+returns jsonb language sql stable as $$
+  select jsonb_build_object(
+    'id', q.id,
+    'ticker', q.ticker,
+    'model_used', q.model_used,
+    'summary', q.summary,
+    'min_confidence', q.min_confidence,
+    'created_at', q.created_at,
+    'items', jsonb_agg(jsonb_build_array(s.headline, s.label, s.score, coalesce(q.cluster_sizes[t.ord], 1))
+                       order by t.ord)
+  )
+  from sentiment_requests q
+  cross join lateral unnest(q.headline_hashes) with ordinality t(hash, ord)
+  join sentiment_scores s
+    on s.scored_on = q.created_on and s.model_used = q.model_used and s.headline_hash = t.hash
+  where q.id = p_id and q.created_at > now() - interval '1 day'
+  group by q.created_on, q.id;
+$$;
+
+-- Migration from the single-table layout
+-- select cron.unschedule(jobid) from cron.job where command like '%clean_old_sentiment_results%';
+-- drop function if exists clean_old_sentiment_results();
+-- drop table if exists sentiment_results;
 
 
 CREATE TABLE sp500_tickers (
@@ -0,0 +1,58 @@
+# Fake bar feed for HMM_API load tests.
+#
+# Usage: python fake_bars.py <directory> [--symbols 20]
+#
+# Writes <SYMBOL>.csv daily archives derived from HMM_API/temp_data.csv for
+# the files data source (HMM_DATA_SOURCE=files, see HMM_API/sources.py). Each
+# symbol gets its own seeded price path (rescaled blocks of the SPY returns),
+# so fits differ between symbols but are reproducible run to run.
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+BLOCK = 60
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "HMM_API", "temp_data.csv")
+
+
+def symbol_names(n: int):
+    return [f"FAKE{i:03d}" for i in range(n)]
+
+
+def build_data_dir(directory: str, n_symbols: int):
+    os.makedirs(directory, exist_ok=True)
+    base = pd.read_csv(TEMPLATE, index_col="Date", parse_dates=["Date"])
+    returns = base["Close"].pct_change().fillna(0).to_numpy()
+    symbols = symbol_names(n_symbols)
+    for i, symbol in enumerate(symbols):
+        rng = np.random.default_rng(i)
+        # Block bootstrap of the real returns: keeps realistic regime persistence
+        # (white noise would flip regimes every few bars)
+        starts = rng.integers(0, len(returns) - BLOCK, size=len(returns) // BLOCK + 1)
+        path_returns = np.concatenate([returns[s:s + BLOCK] for s in starts])[:len(returns)] * rng.uniform(0.5, 2.0)
+        close = rng.uniform(20, 500) * np.exp(np.cumsum(np.log1p(path_returns)))
+        spread = np.abs(rng.normal(0, 0.004, len(close))) * close
+        df = pd.DataFrame({
+            "Close": close,
+            "High": close + spread,
+            "Low": close - spread,
+            "Open": np.roll(close, 1),
+            "Volume": base["Volume"].to_numpy() * rng.uniform(0.1, 3.0),
+        }, index=base.index)
+        df.iloc[0, df.columns.get_loc("Open")] = close[0]
+        df.to_csv(os.path.join(directory, f"{symbol}.csv"), index_label="Date")
+    return symbols
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write fake daily bar archives")
+    parser.add_argument("directory")
+    parser.add_argument("--symbols", type=int, default=20)
+    args = parser.parse_args()
+    symbols = build_data_dir(args.directory, args.symbols)
+    print(f"wrote {len(symbols)} symbols to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
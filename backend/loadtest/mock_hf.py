@@ -0,0 +1,77 @@
+# Local stand-in for the Hugging Face FinBERT inference API.
+#
+# Usage: python mock_hf.py [--port 8090] [--latency-ms 150] [--jitter-ms 50]
+#                          [--per-item-ms 2] [--error-rate 0.01] [--error-status 503]
+#
+# Answers POST / with one list of label scores per input, as the real API does.
+# Labels are derived from a hash of each headline, so repeated runs score the
+# same text the same way. Latency (fixed + jitter + per headline) and the share
+# of failed responses are configurable to model a slow or degraded upstream.
+import argparse
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LABELS = ["positive", "neutral", "negative"]
+
+
+def score(headline: str):
+    digest = hashlib.blake2b(headline.encode(), digest_size=8).digest()
+    top = digest[0] % 3
+    confidence = 0.5 + digest[1] / 255 * 0.49
+    rest = (1 - confidence) / 2
+    return [{"label": label, "score": confidence if i == top else rest} for i, label in enumerate(LABELS)]
+
+
+def make_handler(args):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            inputs = json.loads(body or b"{}").get("inputs", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            delay = args.latency_ms + random.uniform(0, args.jitter_ms) + args.per_item_ms * len(inputs)
+            time.sleep(delay / 1000)
+            if random.random() < args.error_rate:
+                self._send(args.error_status, {"error": "Model is currently loading", "estimated_time": 20.0})
+            else:
+                self._send(200, [score(h) for h in inputs])
+
+        def _send(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *_):
+            pass
+
+    return Handler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Hugging Face inference server")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--per-item-ms", type=float, default=2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args))
+    print(f"mock HF listening on 127.0.0.1:{args.port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+# Load-test driver for the backend services.
+#
+# Usage: python run.py HMM_API [--scenario plot-cached] [--workers 1,2,4]
+#                      [--concurrency 16] [--duration 30] [--symbols 20]
+#        python run.py Sentiment_API [--scenario analyze] [--workers 1,2,4]
+#                      [--hf-latency-ms 150] [--hf-error-rate 0.01]
+#                      [--store memory|postgres --database-url postgres://...]
+#
+# For each worker count, starts the service under gunicorn with every external
+# dependency replaced by a local stand-in: HMM_API reads a fake bar feed
+# (fake_bars.py) through the files data source with the scheduler and
+# refresher off, and Sentiment_API scores against mock_hf.py and keeps records
+# in the in-memory (or a local Postgres) store with rate limits disabled. The
+# scenario then runs for --duration seconds from --concurrency client threads,
+# and throughput, p50/p99 latency and the error rate are reported per worker
+# count (and written as JSON with --output).
+#
+# Scenarios:
+#   HMM_API        plot-cold    /api/hmmplot over distinct symbols and starts (fits)
+#                  plot-cached  /api/hmmplot over a few keys (result store hits)
+#                  multi        /api/hmmplot/multi over a few symbols
+#                  screener     /api/screener after a warm-up over every symbol
+#   Sentiment_API  analyze      POST /api/sentiment, fresh headlines each time
+#                  repeat       POST /api/sentiment, a fixed set of headlines
+#                  bulk         POST /api/sentiment/bulk, 5 tickers per request
+#                  latest       GET /api/sentiment/latest after a warm-up
+#
+# The memory store is per process, so scenarios never read a record back by id;
+# use --store postgres to exercise a shared table.
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+
+import fake_bars
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.dirname(HERE)
+API_KEY = "loadtest"
+
+WORDS = ["stock", "jumps", "falls", "after", "earnings", "beat", "miss", "guidance", "raised", "cut",
+         "record", "sales", "supply", "chain", "worries", "analysts", "upgrade", "downgrade", "shares", "rally"]
+TICKERS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOG", "META", "TSLA", "AMD", "NFLX", "JPM"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def headline(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(8)) + f" {rng.getrandbits(32):08x}"
+
+
+# ------------------------
+# Scenarios
+# ------------------------
+# Each returns a factory producing (method, path, body) for request number i.
+def hmm_scenario(name: str, symbols):
+    starts = ["2021-01-01", "2022-01-01", "2023-01-01"]
+    if name == "plot-cold":
+        keys = list(itertools.product(symbols, starts))
+        return lambda i, rng: ("GET", "/api/hmmplot?" + urlencode(
+            {"symbol": keys[i % len(keys)][0], "start": keys[i % len(keys)][1]}), None)
+    if name == "plot-cached":
+        return lambda i, rng: ("GET", "/api/hmmplot?" + urlencode({"symbol": rng.choice(symbols[:3])}), None)
+    if name == "multi":
+        return lambda i, rng: ("GET", "/api/hmmplot/multi?" + urlencode(
+            {"symbol": rng.choice(symbols[:3]), "intervals": "1d,1wk"}), None)
+    if name == "screener":
+        return lambda i, rng: ("GET", "/api/screener?" + urlencode(
+            {"regime": rng.choice(["Bearish", "Neutral", "Bullish"]), "sort": "probability",
+             "descending": "true"}), None)
+    raise SystemExit(f"unknown HMM_API scenario {name!r}")
+
+
+def sentiment_scenario(name: str, headlines_per_request: int):
+    fixed = [headline(random.Random(i)) for i in range(headlines_per_request)]
+    if name == "analyze":
+        return lambda i, rng: ("POST", "/api/sentiment", {
+            "ticker": rng.choice(TICKERS), "headlines": [headline(rng) for _ in range(headlines_per_request)]})
+    if name == "repeat":
+        return lambda i, rng: ("POST", "/api/sentiment", {"ticker": rng.choice(TICKERS), "headlines": fixed})
+    if name == "bulk":
+        return lambda i, rng: ("POST", "/api/sentiment/bulk", {"groups": [
+            {"ticker": t, "headlines": [headline(rng) for _ in range(headlines_per_request)]}
+            for t in rng.sample(TICKERS, 5)]})
+    if name == "latest":
+        return lambda i, rng: ("GET", "/api/sentiment/latest?" + urlencode({"ticker": rng.choice(TICKERS)}), None)
+    raise SystemExit(f"unknown Sentiment_API scenario {name!r}")
+
+
+WARM_UP = {
+    # Requests issued once before timing, so read scenarios have data
+    "screener": lambda symbols: [("GET", "/api/hmmplot?" + urlencode({"symbol": s}), None) for s in symbols],
+    "latest": lambda symbols: [("POST", "/api/sentiment", {"ticker": t, "headlines": [headline(random.Random(t))]})
+                               for t in TICKERS],
+}
+
+
+# ------------------------
+# Service lifecycle
+# ------------------------
+def service_env(args, workdir: str, port: int, workers: int, hf_url: str):
+    env = {**os.environ, "PORT": str(port), "WEB_CONCURRENCY": str(workers), "GUNICORN_PRELOAD": "1"}
+    if args.service == "HMM_API":
+        env.update({
+            "HMM_DATA_SOURCE": "files",
+            "HMM_DATA_DIR": os.path.join(workdir, "data"),
+            "HMM_BAR_DIR": os.path.join(workdir, "bars"),
+            "HMM_RESULT_DIR": os.path.join(workdir, "results"),
+            "HMM_BAR_REFRESHER": "0",
+            "HMM_PRECOMPUTE": "0",
+        })
+    else:
+        env.update({
+            "HF_API_URL": hf_url,
+            "HF_API_TOKEN": "loadtest",
+            "SENTIMENT_API_KEYS": API_KEY,
+            "SENTIMENT_STORE": args.store,
+            "SENTIMENT_RATE_LIMIT_DB": os.path.join(workdir, "ratelimit.db"),
+            "SENTIMENT_RATE_REQUESTS_PER_MIN": "0",
+            "SENTIMENT_RATE_HEADLINES_PER_MIN": "0",
+            "SENTIMENT_INDEX_DIR": os.path.join(workdir, "index"),
+        })
+        if args.database_url:
+            env["SENTIMENT_DATABASE_URL"] = args.database_url
+    return env
+
+
+def wait_ready(port: int, proc, timeout: float):
+    # /ready is answered by whichever worker accepts, so require a run of 200s
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("service exited before becoming ready")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/ready")
+            status = conn.getresponse().status
+            conn.close()
+        except OSError:
+            status = None
+        streak = streak + 1 if status == 200 else 0
+        if streak >= 10:
+            return
+        time.sleep(0.2 if status == 200 else 0.5)
+    raise SystemExit(f"service not ready after {timeout:.0f}s")
+
+
+def start_service(args, env):
+    cwd = os.path.join(BACKEND, args.service)
+    log = open(os.path.join(env.get("LOADTEST_DIR", tempfile.gettempdir()), "service.log"), "ab")
+    return subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+                            cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def stop(proc):
+    if proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ------------------------
+# Driver
+# ------------------------
+def send(conn, method: str, path: str, body):
+    headers = {"X-API-Key": API_KEY}
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode()
+        headers["Content-Type"] = "application/json"
+    conn.request(method, path, body=data, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def run_load(port: int, make_request, concurrency: int, duration: float, timeout: float):
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    counter = itertools.count()
+    deadline = time.monotonic() + duration
+
+    def client(seed: int):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        local_latencies, local_statuses = [], []
+        while time.monotonic() < deadline:
+            method, path, body = make_request(next(counter), rng)
+            started = time.perf_counter()
+            try:
+                status = send(conn, method, path, body)
+            except (OSError, http.client.HTTPException):
+                status = 0
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses.append(status)
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.extend(local_statuses)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    latencies = np.array(latencies) * 1000
+    statuses = np.array(statuses)
+    errors = int((statuses == 0).sum() + (statuses >= 400).sum())
+    return {
+        "requests": len(statuses),
+        "errors": errors,
+        "error_rate": round(errors / len(statuses), 4) if len(statuses) else 0.0,
+        "throughput_rps": round(len(statuses) / elapsed, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+        "p99_ms": round(float(np.percentile(latencies, 99)), 1) if len(latencies) else None,
+        "status_counts": {str(k): int(v) for k, v in zip(*np.unique(statuses, return_counts=True))},
+    }
+
+
+def report(rows):
+    print(f"\n{'workers':>8}{'requests':>10}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'err %':>8}")
+    for row in rows:
+        print(f"{row['workers']:>8}{row['requests']:>10}{row['throughput_rps']:>10.1f}"
+              f"{row['p50_ms'] or 0:>10.1f}{row['p99_ms'] or 0:>10.1f}{row['errors']:>8}{row['error_rate'] * 100:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a backend service against local stand-ins")
+    parser.add_argument("service", choices=["HMM_API", "Sentiment_API"])
+    parser.add_argument("--scenario", help="default: plot-cached (HMM_API) or analyze (Sentiment_API)")
+    parser.add_argument("--workers", default="1,2,4", help="comma separated gunicorn worker counts")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout in seconds")
+    parser.add_argument("--ready-timeout", type=float, default=180)
+    parser.add_argument("--symbols", type=int, default=20, help="fake symbols in the bar feed")
+    parser.add_argument("--headlines", type=int, default=10, help="headlines per sentiment request")
+    parser.add_argument("--hf-latency-ms", type=float, default=150)
+    parser.add_argument("--hf-jitter-ms", type=float, default=50)
+    parser.add_argument("--hf-error-rate", type=float, default=0.0)
+    parser.add_argument("--store", choices=["memory", "postgres"], default="memory")
+    parser.add_argument("--database-url")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    if args.store == "postgres" and not args.database_url:
+        parser.error("--store postgres needs --database-url")
+
+    scenario = args.scenario or ("plot-cached" if args.service == "HMM_API" else "analyze")
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    symbols = fake_bars.build_data_dir(os.path.join(workdir, "data"), args.symbols)
+    if args.service == "HMM_API":
+        make_request = hmm_scenario(scenario, symbols)
+    else:
+        make_request = sentiment_scenario(scenario, args.headlines)
+
+    mock = None
+    hf_url = None
+    if args.service == "Sentiment_API":
+        hf_port = free_port()
+        mock = subprocess.Popen([sys.executable, os.path.join(HERE, "mock_hf.py"), "--port", str(hf_port),
+                                 "--latency-ms", str(args.hf_latency_ms), "--jitter-ms", str(args.hf_jitter_ms),
+                                 "--error-rate", str(args.hf_error_rate)])
+        hf_url = f"http://127.0.0.1:{hf_port}/"
+
+    rows = []
+    try:
+        for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+            # A fresh directory per run, so no run starts with another's bars or results
+            run_dir = os.path.join(workdir, f"workers-{workers}")
+            os.makedirs(run_dir)
+            os.symlink(os.path.join(workdir, "data"), os.path.join(run_dir, "data"))
+            port = free_port()
+            env = service_env(args, run_dir, port, workers, hf_url)
+            env["LOADTEST_DIR"] = run_dir
+            proc = start_service(args, env)
+            try:
+                wait_ready(port, proc, args.ready_timeout)
+                if scenario in WARM_UP:
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=args.timeout)
+                    for method, path, body in WARM_UP[scenario](symbols):
+                        send(conn, method, path, body)
+                    conn.close()
+                print(f"{args.service} {scenario}: {workers} workers, {args.concurrency} clients, {args.duration:.0f}s")
+                result = run_load(port, make_request, args.concurrency, args.duration, args.timeout)
+            finally:
+                stop(proc)
+            rows.append({"service": args.service, "scenario": scenario, "workers": workers,
+                         "concurrency": args.concurrency, **result})
+    finally:
+        if mock is not None:
+            stop(mock)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report(rows)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+// app/api/hmmplot/jobs/[id]/events/route.ts
+import { NextResponse } from "next/server";
+import { proxiedJobEvents } from "@/lib/hmmJobs";
+
+export async function GET(_req: Request, { params }: { params: Promise<{ id: string }> }) {
+  const { id } = await params;
+
+  try {
+    const res = await fetch(`${process.env.HMM_API_URL}/api/jobs/${encodeURIComponent(id)}/events`, {
+      cache: "no-store",
+    });
+    if (!res.ok || !res.body) {
+      const data = await res.json();
+      return NextResponse.json(data, { status: res.status });
+    }
+
+    // Server-sent progress events pass through as they arrive, with result links rewritten
+    return new Response(proxiedJobEvents(res.body), {
+      status: 200,
+      headers: { "Content-Type": "text/event-stream", "Cache-Control": "no-cache", "X-Accel-Buffering": "no" },
+    });
+  } catch (error) {
+    let message = "Failed to subscribe to regime job";
+    if (error instanceof Error) {
+      message = error.message;
+    }
+    return NextResponse.json({ error: message }, { status: 500 });
+  }
+}
@@ -0,0 +1,24 @@
+// app/api/hmmplot/jobs/[id]/result/route.ts
+import { NextResponse } from "next/server";
+
+// One symbol's finished plot, the same body /api/hmmplot returns
+export async function GET(req: Request, { params }: { params: Promise<{ id: string }> }) {
+  const { id } = await params;
+  const { searchParams } = new URL(req.url);
+  const symbol = searchParams.get("symbol") || "";
+
+  try {
+    const query = new URLSearchParams({ symbol });
+
+    const res = await fetch(`${process.env.HMM_API_URL}/api/jobs/${encodeURIComponent(id)}/result?${query.toString()}`);
+    const data = await res.json();
+
+    return NextResponse.json(data, { status: res.status, headers: { ETag: res.headers.get("etag") ?? "" } });
+  } catch (error) {
+    let message = "Failed to fetch regime job result";
+    if (error instanceof Error) {
+      message = error.message;
+    }
+    return NextResponse.json({ error: message }, { status: 500 });
+  }
+}
@@ -0,0 +1,32 @@
+// app/api/hmmplot/jobs/[id]/route.ts
+import { NextResponse } from "next/server";
+import { proxiedJob } from "@/lib/hmmJobs";
+
+type Params = { params: Promise<{ id: string }> };
+
+async function forward(method: "GET" | "DELETE", id: string) {
+  try {
+    const res = await fetch(`${process.env.HMM_API_URL}/api/jobs/${encodeURIComponent(id)}`, {
+      method,
+      cache: "no-store",
+    });
+    const data = await res.json();
+
+    return NextResponse.json(proxiedJob(data), { status: res.status });
+  } catch (error) {
+    let message = method === "GET" ? "Failed to fetch regime job" : "Failed to cancel regime job";
+    if (error instanceof Error) {
+      message = error.message;
+    }
+    return NextResponse.json({ error: message }, { status: 500 });
+  }
+}
+
+// Status, progress and per-symbol result links
+export async function GET(_req: Request, { params }: Params) {
+  return forward("GET", (await params).id);
+}
+
+export async function DELETE(_req: Request, { params }: Params) {
+  return forward("DELETE", (await params).id);
+}
@@ -0,0 +1,27 @@
+// app/api/hmmplot/jobs/route.ts
+import { NextResponse } from "next/server";
+import { proxiedJob } from "@/lib/hmmJobs";
+
+// Submits a regime fit job (long intraday ranges, many symbols) instead of
+// waiting on /api/hmmplot; poll jobs/[id] or subscribe to jobs/[id]/events
+export async function POST(req: Request) {
+  const { searchParams } = new URL(req.url);
+  const symbols = searchParams.get("symbols") || "SPY";
+  const interval = searchParams.get("interval") || "1d";
+  const start = searchParams.get("start") || "2021-01-01";
+
+  try {
+    const query = new URLSearchParams({ symbols, interval, start });
+
+    const res = await fetch(`${process.env.HMM_API_URL}/api/jobs?${query.toString()}`, { method: "POST" });
+    const data = await res.json();
+
+    return NextResponse.json(proxiedJob(data), { status: res.status });
+  } catch (error) {
+    let message = "Failed to submit regime job";
+    if (error instanceof Error) {
+      message = error.message;
+    }
+    return NextResponse.json({ error: message }, { status: 500 });
+  }
+}
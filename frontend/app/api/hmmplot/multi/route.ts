@@ -0,0 +1,24 @@
+// app/api/hmmplot/multi/route.ts
+import { NextResponse } from "next/server";
+
+export async function GET(req: Request) {
+  const { searchParams } = new URL(req.url);
+  const symbol = searchParams.get("symbol") || "SPY";
+  const intervals = searchParams.get("intervals") || "1d,1h,15m";
+  const start = searchParams.get("start") || "2021-01-01";
+
+  try {
+    const query = new URLSearchParams({ symbol, intervals, start });
+
+    const res = await fetch(`${process.env.HMM_API_URL}/api/hmmplot/multi?${query.toString()}`);
+    const data = await res.json();
+
+    return NextResponse.json(data, { status: res.status });
+  } catch (error) {
+    let message = "Failed to fetch multi-timeframe regimes";
+    if (error instanceof Error) {
+      message = error.message;
+    }
+    return NextResponse.json({ error: message }, { status: 500 });
+  }
+}
@@ -6,14 +6,34 @@ export async function GET(req: Request) {
   const symbol = searchParams.get("symbol") || "SPY";
   const interval = searchParams.get("interval") || "1d";
   const start = searchParams.get("start") || "2021-01-01";
+  const since = searchParams.get("since");
 
   try {
     const query = new URLSearchParams({ symbol, interval, start });
+    if (since) query.set("since", since);
 
-    const res = await fetch(`${process.env.HMM_API_URL}/api/hmmplot?${query.toString()}`);
+    // The browser's If-None-Match goes through, so an unchanged plot is a 304
+    const ifNoneMatch = req.headers.get("if-none-match");
+    const res = await fetch(`${process.env.HMM_API_URL}/api/hmmplot?${query.toString()}`, {
+      headers: ifNoneMatch ? { "If-None-Match": ifNoneMatch } : {},
+      cache: "no-store",
+    });
+    const headers: Record<string, string> = {
+      ETag: res.headers.get("etag") ?? "",
+      "Cache-Control": "no-cache",
+    };
+    // Set when the API could not refresh the market data and served stored bars
+    const stale = res.headers.get("x-data-stale");
+    if (stale) {
+      headers["X-Data-Stale"] = stale;
+      headers["X-Data-Age"] = res.headers.get("x-data-age") ?? "";
+    }
+    if (res.status === 304) {
+      return new NextResponse(null, { status: 304, headers });
+    }
     const data = await res.json() as { figure: object; regime_stats: object; curr_regime: string };
 
-    return NextResponse.json(data, { status: 200 });
+    return NextResponse.json(data, { status: res.ok ? 200 : res.status, headers });
   } catch (error) {
     let message = "Failed to fetch plot data";
     if (error instanceof Error) {
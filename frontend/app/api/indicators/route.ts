@@ -0,0 +1,20 @@
+// app/api/indicators/route.ts
+import { NextResponse } from "next/server";
+
+export async function GET(req: Request) {
+  const { searchParams } = new URL(req.url);
+
+  try {
+    // Symbols, interval and indicator specs pass through; HMM_API validates them
+    const res = await fetch(`${process.env.HMM_API_URL}/api/indicators?${searchParams.toString()}`);
+    const data = await res.json();
+
+    return NextResponse.json(data, { status: res.status });
+  } catch (error) {
+    let message = "Failed to fetch indicators";
+    if (error instanceof Error) {
+      message = error.message;
+    }
+    return NextResponse.json({ error: message }, { status: 500 });
+  }
+}
@@ -0,0 +1,41 @@
+// app/api/sentiment/bulk/route.ts
+import { NextResponse } from "next/server";
+
+type SentimentGroup = { ticker: string; headlines: string[] };
+
+export async function POST(req: Request) {
+  try {
+    console.log("Sentiment Bulk API HIT!");
+    const { groups, min_confidence } = await req.json() as { groups: SentimentGroup[]; min_confidence?: number };
+
+    if (!groups || !Array.isArray(groups) || groups.length === 0) {
+      return NextResponse.json({ error: "No ticker groups provided" }, { status: 400 });
+    }
+    if (groups.some((g) => !g.ticker || !Array.isArray(g.headlines) || g.headlines.length === 0)) {
+      return NextResponse.json({ error: "Every group needs a ticker and headlines" }, { status: 400 });
+    }
+
+    // One backend call for the whole watchlist instead of one per ticker
+    const response = await fetch(`${process.env.SENTIMENT_API_URL}/api/sentiment/bulk`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        "x-api-key": process.env.SENTIMENT_API_KEY || ""
+      },
+      body: JSON.stringify({
+        groups,
+        min_confidence: min_confidence ?? 0.7
+      }),
+    });
+
+    if (!response.ok) {
+      throw new Error(`Backend error: ${response.statusText}`);
+    }
+
+    const data = await response.json();
+    return NextResponse.json(data);
+  } catch (err: unknown) {
+    const message = err instanceof Error ? err.message : String(err);
+    return NextResponse.json({ error: message }, { status: 500 });
+  }
+}
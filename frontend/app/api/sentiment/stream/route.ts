@@ -0,0 +1,42 @@
+// app/api/sentiment/stream/route.ts
+import { NextResponse } from "next/server";
+
+export async function POST(req: Request) {
+  try {
+    console.log("Sentiment Stream API HIT!");
+    const { headlines, ticker, min_confidence } = await req.json();
+
+    if (!headlines || !Array.isArray(headlines) || headlines.length === 0) {
+      return NextResponse.json({ error: "No headlines provided" }, { status: 400 });
+    }
+    if (!ticker || typeof ticker !== "string") {
+      return NextResponse.json({ error: "Ticker is required" }, { status: 400 });
+    }
+
+    const response = await fetch(`${process.env.SENTIMENT_API_URL}/api/sentiment/stream`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        "x-api-key": process.env.SENTIMENT_API_KEY || ""
+      },
+      body: JSON.stringify({
+        headlines,
+        ticker,
+        min_confidence: min_confidence ?? 0.7
+      }),
+    });
+
+    if (!response.ok || !response.body) {
+      throw new Error(`Backend error: ${response.statusText}`);
+    }
+
+    // Pass the NDJSON body straight through so the client sees each line as it arrives
+    return new Response(response.body, {
+      status: 200,
+      headers: { "Content-Type": "application/x-ndjson", "Cache-Control": "no-cache" },
+    });
+  } catch (err: unknown) {
+    const message = err instanceof Error ? err.message : String(err);
+    return NextResponse.json({ error: message }, { status: 500 });
+  }
+}
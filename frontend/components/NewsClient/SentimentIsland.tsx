@@ -85,27 +85,62 @@ export default function SentimentIsland({ ticker, headlines }: SentimentIslandPr
         }
 
         console.log(foundMatch);
-        // 2️⃣ If no match, call API as before
+        // 2️⃣ If no match, stream scores and redraw as each batch lands
         if (!foundMatch) {
-          const res = await fetch("/api/sentiment", {
+          const res = await fetch("/api/sentiment/stream", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify({ headlines, ticker, min_confidence: 0.7 }),
             signal: controller.signal,
           });
 
-          if (!res.ok) throw new Error(`HTTP ${res.status}`);
-          const data = await res.json();
-          console.log("API RETURN", data);
-
-          const percentages: SentimentItem[] = Object.entries(
-            data.summary?.percentages ?? {}
-          ).map(([name, value]) => ({ name, value: Number(value) }));
+          if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+          const counts: Record<string, number> = { positive: 0, neutral: 0, negative: 0 };
+          const toPercentages = (source: Record<string, number>): SentimentItem[] => {
+            const total = Object.values(source).reduce((a, b) => a + b, 0) || 1;
+            return Object.entries(source).map(([name, value]) => ({
+              name,
+              value: Math.round((value * 1000) / total) / 10,
+            }));
+          };
+
+          const reader = res.body.getReader();
+          const decoder = new TextDecoder();
+          let buffer = "";
+
+          while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            const lines = buffer.split("\n");
+            buffer = lines.pop() ?? "";
+            let changed = false;
+
+            for (const line of lines) {
+              if (!line.trim()) continue;
+              const msg = JSON.parse(line);
+              if (msg.type === "item" && msg.high_confidence && msg.label in counts) {
+                counts[msg.label] += 1;
+                changed = true;
+              } else if (msg.type === "summary") {
+                console.log("API RETURN", msg);
+                const percentages: SentimentItem[] = Object.entries(
+                  msg.summary?.percentages ?? {}
+                ).map(([name, value]) => ({ name, value: Number(value) }));
+                if (!cancelled) setSentiment(percentages);
+                changed = false;
+              } else if (msg.type === "error") {
+                throw new Error(msg.detail);
+              }
+            }
 
-          if (!cancelled) {
-            setSentiment(percentages);
-            setLoadingSentiment(false);
+            if (changed && !cancelled) setSentiment(toPercentages(counts));
+            if (!cancelled) setLoadingSentiment(false);
           }
+
+          if (!cancelled) setLoadingSentiment(false);
         }
       } catch (err) {
         if (!cancelled) {
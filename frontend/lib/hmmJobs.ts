@@ -0,0 +1,61 @@
+// Regime job bodies name their result links by HMM API path
+// (/api/jobs/{id}/result?symbol=...); the browser reaches them through the
+// app/api/hmmplot/jobs proxy routes instead.
+const BACKEND_PREFIX = "/api/jobs/";
+const PROXY_PREFIX = "/api/hmmplot/jobs/";
+
+type JobResult = { url?: string; [key: string]: unknown };
+type JobStatus = { results?: Record<string, JobResult>; [key: string]: unknown };
+
+function proxyUrl(url: string) {
+  return url.startsWith(BACKEND_PREFIX) ? PROXY_PREFIX + url.slice(BACKEND_PREFIX.length) : url;
+}
+
+export function proxiedJob<T>(data: T): T {
+  const job = data as JobStatus;
+  if (!job || typeof job !== "object" || !job.results) {
+    return data;
+  }
+  const results: Record<string, JobResult> = {};
+  for (const [symbol, entry] of Object.entries(job.results)) {
+    results[symbol] = entry.url ? { ...entry, url: proxyUrl(entry.url) } : entry;
+  }
+  return { ...job, results } as T;
+}
+
+// The same rewrite for a text/event-stream of job statuses, one "data:" line per event
+export function proxiedJobEvents(body: ReadableStream<Uint8Array>) {
+  const decoder = new TextDecoder();
+  const encoder = new TextEncoder();
+  let pending = "";
+
+  const rewrite = (line: string) => {
+    if (!line.startsWith("data: ")) {
+      return line;
+    }
+    try {
+      return "data: " + JSON.stringify(proxiedJob(JSON.parse(line.slice(6))));
+    } catch {
+      return line;
+    }
+  };
+
+  return body.pipeThrough(
+    new TransformStream<Uint8Array, Uint8Array>({
+      transform(chunk, controller) {
+        pending += decoder.decode(chunk, { stream: true });
+        const lines = pending.split("\n");
+        pending = lines.pop() ?? "";
+        if (lines.length) {
+          controller.enqueue(encoder.encode(lines.map(rewrite).join("\n") + "\n"));
+        }
+      },
+      flush(controller) {
+        pending += decoder.decode();
+        if (pending) {
+          controller.enqueue(encoder.encode(rewrite(pending)));
+        }
+      },
+    })
+  );
+}